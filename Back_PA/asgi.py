@@ -3,6 +3,14 @@ ASGI config for Back_PA project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Le flux temps réel /dashboard/api/evenements/ (server-sent events) n'est servi
+en continu que par ce point d'entrée, par exemple :
+
+    uvicorn Back_PA.asgi:application
+
+Avec le broker en mémoire (EVENTS_BROKER par défaut), n'utiliser qu'un seul
+processus : les événements ne traversent pas les processus.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
@@ -14,3 +22,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Back_PA.settings')
 
 application = get_asgi_application()
+
+# Le broker est créé au démarrage, avant les premières requêtes concurrentes
+from dashboard.services.events import get_broker  # noqa: E402
+
+get_broker()
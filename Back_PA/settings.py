@@ -25,6 +25,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # Pour les requêtes cross-origin
+    'dashboard.middleware.RequestProfilingMiddleware',  # Inactif sauf si REQUEST_PROFILING_ENABLED
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -51,8 +52,88 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Pagination par curseur (taille modifiable via ?page_size=, plafonnée à 100)
+    'DEFAULT_PAGINATION_CLASS': 'dashboard.api.pagination.DefaultCursorPagination',
+    'PAGE_SIZE': 25,
 }
 
+# Cache (mémoire locale par défaut, remplaçable par Redis/Memcached via l'environnement)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'ecodeli'),
+    }
+}
+
+# Cache des KPI de la page d'accueil (alias de CACHES et durée de vie en secondes)
+KPI_CACHE_ALIAS = 'default'
+KPI_CACHE_TIMEOUT = 300
+
+# Profilage des requêtes (nombre/temps SQL, doublons, temps Python, taille) par nom d'URL.
+# Un taux d'échantillonnage de 0.01 garde le surcoût sous 1 %.
+REQUEST_PROFILING_ENABLED = os.environ.get('DJANGO_REQUEST_PROFILING', '') == '1'
+REQUEST_PROFILING_SAMPLE_RATE = float(os.environ.get('DJANGO_REQUEST_PROFILING_SAMPLE_RATE', '1.0'))
+REQUEST_PROFILING_WINDOW = 1000  # Mesures conservées par URL pour les percentiles
+REQUEST_PROFILING_DIR = os.environ.get('DJANGO_REQUEST_PROFILING_DIR') or None
+REQUEST_PROFILING_DUMP_EVERY = 100
+
+# PDF des factures : file d'attente traitée par `manage.py factures_pdf --loop`,
+# ou génération synchrone après commit si False
+FACTURE_PDF_ASYNC = True
+# Export admin en PDF unique : reportlab sérialise le document en fin de rendu
+# (~0,5 ms par page) ; au-delà, l'export est refusé au profit du ZIP diffusé en flux
+FACTURES_EXPORT_PDF_MAX = 5000
+
+# Notifications push : file EnvoiPush vidée par `manage.py dispatch_push`.
+# MemoryPushBackend (faux fournisseur en mémoire) pour le développement et les tests.
+PUSH_BACKEND = os.environ.get('DJANGO_PUSH_BACKEND', 'dashboard.services.push_backends.OneSignalBackend')
+PUSH_CONCURRENCE = 10  # Requêtes simultanées au fournisseur (taille du pool de connexions)
+PUSH_MAX_TENTATIVES = 5  # Au-delà, l'envoi est abandonné (dead-letter)
+PUSH_DELAI_BASE = 30  # Secondes avant la 1re nouvelle tentative, doublées ensuite
+ONESIGNAL_APP_ID = os.environ.get('ONESIGNAL_APP_ID', '')
+ONESIGNAL_REST_API_KEY = os.environ.get('ONESIGNAL_REST_API_KEY', '')
+
+# Flux temps réel (SSE, /dashboard/api/evenements/) servi par Back_PA.asgi.
+# MemoryBroker ne relie que les requêtes d'un même processus.
+EVENTS_BROKER = os.environ.get('DJANGO_EVENTS_BROKER', 'dashboard.services.events.MemoryBroker')
+EVENTS_HEARTBEAT = 15  # Secondes entre deux commentaires de maintien de connexion
+EVENTS_DUREE_MAX = 3600  # Durée d'un flux avant fermeture (le client se reconnecte)
+EVENTS_ATTENTE_WSGI = 25  # Sous WSGI, le flux devient une requête longue (long polling)
+MESSAGES_ATTENTE_MAX = 25  # Attente maximale de /api/messages/updates/ sans nouveau message (s)
+
+# Rétention : `manage.py appliquer_retention` supprime ou archive (JSONL compressé)
+# les lignes plus anciennes que `jours`. Notifications : une règle par
+# type_notification, '*' pour les autres types ; `jours: None` conserve tout.
+RETENTION = {
+    'notification': {
+        '*': {'jours': 90, 'action': 'supprimer'},
+        'warning': {'jours': 180, 'action': 'archiver'},
+        'error': {'jours': 365, 'action': 'archiver'},
+    },
+    'logconnexion': {
+        '*': {'jours': 180, 'action': 'archiver'},
+    },
+}
+RETENTION_ARCHIVE_DIR = os.path.join(BASE_DIR, 'archives')
+
+# Géocodage hors ligne (dashboard/services/geo.py) : le fichier livré couvre les
+# préfectures et grandes villes ; la base officielle des codes postaux de La Poste
+# (CSV « ; » avec coordonnees_gps) peut lui être substituée telle quelle.
+GEO_COMMUNES = os.environ.get('DJANGO_GEO_COMMUNES', os.path.join(BASE_DIR, 'dashboard', 'data', 'communes.csv'))
+GEO_RAYON_DEFAUT = 30  # km autour d'un point pour /api/annonces/proximite/
+GEO_RAYON_MAX = 200
+GEO_RAYON_ZONE = 20  # km couverts autour de chaque zone de livraison d'un livreur
+
+# Vues d'annonces : comptées dans un tampon (VUES_COMPTEUR) et ajoutées en base
+# par lot toutes les VUES_FLUSH_INTERVAL secondes ou dès VUES_FLUSH_MAX annonces
+# en attente. Les tendances portent sur les vues des VUES_TENDANCE_FENETRE
+# dernières secondes, par tranches de VUES_TENDANCE_PAS secondes.
+VUES_COMPTEUR = os.environ.get('DJANGO_VUES_COMPTEUR', 'dashboard.services.vues.MemoryCompteur')
+VUES_FLUSH_INTERVAL = 30
+VUES_FLUSH_MAX = 1000
+VUES_TENDANCE_FENETRE = 3600
+VUES_TENDANCE_PAS = 60
+
 ROOT_URLCONF = 'Back_PA.urls'
 
 TEMPLATES = [
@@ -69,6 +150,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'dashboard.context_processors.notifications',
             ],
         },
     },
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
 
 # Register your models here.
@@ -7,20 +8,36 @@ from .models import (
     User, DemandeValidationLivreur, Livreur, Commercant, Prestataire, Annonce, Livraison, 
     Paiement, Facture, Service, Entrepot, BoxStockage, Abonnement,
     Notification, Evaluation, PieceJustificative, Contrat, LogConnexion,
-    CalendrierDisponibilite
+    CalendrierDisponibilite, MouvementPortefeuille, TacheFacturePDF, EnvoiPush, ZoneLivreur
 )
 
+from dashboard.services.recherche_texte import filtre as filtre_recherche
+
 # Configuration de base
 admin.site.site_header = "Administration EcoDeli"
 admin.site.site_title = "Portail d'administration EcoDeli"
 admin.site.index_title = "Bienvenue sur le portail d'administration d'EcoDeli"
 
+class RechercheTexteMixin:
+    """
+    Recherche de la liste via l'index plein texte `index_recherche`
+    (services.recherche_texte) plutôt que des icontains sur search_fields,
+    qui reste nécessaire à l'affichage du champ de recherche.
+    """
+    index_recherche = None
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return queryset.filter(filtre_recherche(self.index_recherche, search_term)), False
+
 # Utilisateurs et Profils
 @admin.register(User)
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(RechercheTexteMixin, admin.ModelAdmin):
     list_display = ('username', 'email', 'user_type', 'date_joined', 'is_active')
     list_filter = ('user_type', 'is_active')
     search_fields = ('username', 'email', 'phone')
+    index_recherche = 'user'
     fieldsets = (
         ('Informations personnelles', {'fields': ('username', 'email', 'password', 'first_name', 'last_name', 'user_type')}),
         ('Coordonnées', {'fields': ('phone', 'address', 'date_naissance', 'pays')}),
@@ -28,11 +45,23 @@ class UserAdmin(admin.ModelAdmin):
         ('Dates importantes', {'fields': ('last_login', 'date_joined')}),
     )
 
+# Zones géocodées à partir de zones_livraison : consultation seule
+class ZoneLivreurInline(admin.TabularInline):
+    model = ZoneLivreur
+    extra = 0
+    fields = ('libelle', 'latitude', 'longitude')
+    readonly_fields = fields
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
 @admin.register(Livreur)
 class LivreurAdmin(admin.ModelAdmin):
     list_display = ('user', 'verified', 'rating', 'disponible')
     list_filter = ('verified', 'disponible')
     search_fields = ('user__username', 'user__email')
+    inlines = [ZoneLivreurInline]
 
 @admin.register(Commercant)
 class CommercantAdmin(admin.ModelAdmin):
@@ -48,10 +77,11 @@ class PrestataireAdmin(admin.ModelAdmin):
 
 # Opérations principales
 @admin.register(Annonce)
-class AnnonceAdmin(admin.ModelAdmin):
+class AnnonceAdmin(RechercheTexteMixin, admin.ModelAdmin):
     list_display = ('titre', 'created_by', 'depart', 'arrivee', 'date_depart', 'prix', 'status')
     list_filter = ('status', 'type_annonce')
     search_fields = ('titre', 'description', 'created_by__username')
+    index_recherche = 'annonce'
     date_hierarchy = 'created_at'
 
 @admin.register(Livraison)
@@ -62,10 +92,11 @@ class LivraisonAdmin(admin.ModelAdmin):
     date_hierarchy = 'date_prise_en_charge'
 
 @admin.register(Service)
-class ServiceAdmin(admin.ModelAdmin):
+class ServiceAdmin(RechercheTexteMixin, admin.ModelAdmin):
     list_display = ('nom', 'type_service', 'prestataire', 'prix', 'disponible')
     list_filter = ('type_service', 'disponible')
     search_fields = ('nom', 'description', 'prestataire__username')
+    index_recherche = 'service'
 
 # Finances
 @admin.register(Paiement)
@@ -82,6 +113,33 @@ class FactureAdmin(admin.ModelAdmin):
     search_fields = ('reference',)
     date_hierarchy = 'date_emission'
 
+@admin.register(TacheFacturePDF)
+class TacheFacturePDFAdmin(admin.ModelAdmin):
+    list_display = ('facture', 'status', 'tentatives', 'date_creation', 'date_traitement')
+    list_filter = ('status',)
+    search_fields = ('facture__reference',)
+    raw_id_fields = ('facture',)
+    actions = ['remettre_en_attente']
+
+    def remettre_en_attente(self, request, queryset):
+        TacheFacturePDF.planifier(queryset.values_list('facture_id', flat=True))
+    remettre_en_attente.short_description = "Remettre en attente"
+
+@admin.register(MouvementPortefeuille)
+class MouvementPortefeuilleAdmin(admin.ModelAdmin):
+    list_display = ('user', 'sens', 'motif', 'montant', 'solde_apres', 'paiement', 'date_creation')
+    list_filter = ('sens', 'motif')
+    search_fields = ('user__username', 'paiement__reference')
+    date_hierarchy = 'date_creation'
+    raw_id_fields = ('user', 'paiement')
+
+    # Journal en ajout seul : consultation uniquement
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 # Infrastructure
 @admin.register(Entrepot)
 class EntrepotAdmin(admin.ModelAdmin):
@@ -110,6 +168,20 @@ class NotificationAdmin(admin.ModelAdmin):
     search_fields = ('titre', 'message', 'user__username')
     date_hierarchy = 'date_creation'
 
+@admin.register(EnvoiPush)
+class EnvoiPushAdmin(admin.ModelAdmin):
+    list_display = ('titre', 'user', 'status', 'tentatives', 'prochaine_tentative', 'date_envoi')
+    list_filter = ('status',)
+    search_fields = ('titre', 'user__username')
+    raw_id_fields = ('user', 'notification')
+    actions = ['relancer']
+
+    def relancer(self, request, queryset):
+        queryset.exclude(status='envoye').update(
+            status='en_attente', tentatives=0, prochaine_tentative=timezone.now()
+        )
+    relancer.short_description = "Relancer les envois sélectionnés"
+
 @admin.register(Evaluation)
 class EvaluationAdmin(admin.ModelAdmin):
     list_display = ('evaluateur', 'evalue', 'note', 'date_evaluation')
@@ -0,0 +1,15 @@
+# dashboard/api/filters.py
+from rest_framework.filters import BaseFilterBackend
+
+from dashboard.services.recherche_texte import filtre
+
+
+class RechercheTexteFilter(BaseFilterBackend):
+    """`?q=` : restreint la liste par l'index plein texte `recherche_index` de la vue."""
+    parametre = 'q'
+
+    def filter_queryset(self, request, queryset, view):
+        texte = request.query_params.get(self.parametre, '')
+        if not texte.strip():
+            return queryset
+        return queryset.filter(filtre(view.recherche_index, texte))
@@ -0,0 +1,104 @@
+# dashboard/api/pagination.py
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, LimitOffsetPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from dashboard.pagination import _field_name, decode_cursor, encode_cursor, seek_filter
+
+
+class DefaultCursorPagination(CursorPagination):
+    """
+    Pagination par curseur utilisée par défaut sur toute l'API.
+
+    La clé de tri est déclarée par chaque ViewSet via l'attribut
+    `cursor_ordering` (ex. '-created_at'), '-id' à défaut.
+    """
+    page_size = 25
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-id'
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if ordering:
+            return (ordering,) if isinstance(ordering, str) else tuple(ordering)
+        return super().get_ordering(request, queryset, view)
+
+
+class KeysetCursorPagination(DefaultCursorPagination):
+    """
+    Curseur portant les valeurs de toutes les colonnes de tri (seek), pour les
+    tris dont la première colonne a beaucoup d'ex æquo (score, booléen) : le
+    curseur DRF, fondé sur la première colonne et un décalage, y relirait des
+    pages entières. Pagination vers l'avant uniquement ; les colonnes peuvent
+    être des annotations.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.display_page_controls = False
+
+        queryset = queryset.order_by(*self.ordering)
+        curseur = request.query_params.get(self.cursor_query_param)
+        if curseur:
+            valeurs = decode_cursor(curseur, queryset.model, self.ordering)
+            if valeurs is None:
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(seek_filter(self.ordering, valeurs))
+
+        lignes = list(queryset[:self.page_size + 1])
+        self.has_next = len(lignes) > self.page_size
+        self.page = lignes[:self.page_size]
+        self.next_cursor = encode_cursor(
+            [getattr(self.page[-1], _field_name(champ)) for champ in self.ordering]
+        ) if self.has_next else None
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param, self.next_cursor)
+
+    def get_previous_link(self):
+        return None
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'previous': None, 'results': data})
+
+
+class AdminOffsetPagination(LimitOffsetPagination):
+    """Pagination par décalage (avec total) pour les écrans d'administration."""
+    default_limit = 50
+    max_limit = 500
+
+
+class AdminPagination(DefaultCursorPagination):
+    """
+    Curseur par défaut, avec un mode décalage optionnel pour l'administration.
+
+    Le mode décalage est activé par `?offset=` ou `?limit=` ; il fournit le
+    nombre total de lignes et permet d'accéder directement à une page.
+    """
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if 'offset' in params or 'limit' in params:
+            self._offset = AdminOffsetPagination()
+            ordering = self.get_ordering(request, queryset, view)
+            return self._offset.paginate_queryset(queryset.order_by(*ordering), request, view)
+        self._offset = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self._offset is not None:
+            return self._offset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def to_html(self):
+        if self._offset is not None:
+            return self._offset.to_html()
+        return super().to_html()
@@ -1,92 +1,211 @@
+import functools
+import time
+from decimal import Decimal
 from io import BytesIO
-from django.http import HttpResponse
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import letter
+from reportlab import rl_config
 from reportlab.lib import colors
-from reportlab.platypus import Table, TableStyle
-from django.conf import settings
-import os
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.pdfgen import canvas
+
+# Flux binaires compressés, sans l'encodage ASCII85 par défaut : un tiers du
+# temps de rendu d'une facture et des fichiers plus gros d'un dixième
+rl_config.useA85 = 0
+
+PAGE_WIDTH, PAGE_HEIGHT = letter
+# Colonnes du tableau : (libellé, x, largeur)
+COLONNES = (("Description", 50, 200), ("Quantité", 250, 100), ("Prix unitaire", 350, 100), ("Total", 450, 100))
+HAUT_TABLEAU = PAGE_HEIGHT - 160
+HAUTEUR_ENTETE = 24
+HAUTEUR_LIGNE = 18
+LIGNES_PAR_PAGE = 25
+
+
+def _lignes(paiement):
+    """
+    Une ligne par élément facturé (livraison, service) ; à défaut, le paiement
+    seul. Pas de ligne d'abonnement : Paiement n'est relié à aucun Abonnement,
+    un paiement d'abonnement apparaît comme « Paiement <référence> ».
+    """
+    livraison = paiement.livraison
+    service = paiement.service if paiement.service_id else None
+    if livraison is not None and service is not None and service.prix <= paiement.montant:
+        return [
+            [f"Livraison {livraison.reference}", 1, str(paiement.montant - service.prix)],
+            [f"Service {service.nom}", 1, str(service.prix)],
+        ]
+    if livraison is not None:
+        return [[f"Livraison {livraison.reference}", 1, str(paiement.montant)]]
+    if service is not None:
+        return [[f"Service {service.nom}", 1, str(paiement.montant)]]
+    return [[f"Paiement {paiement.reference}", 1, str(paiement.montant)]]
+
+
+def invoice_data(facture):
+    """
+    Extrait les données affichées sur la facture, sous forme sérialisable.
+
+    Le rendu ne dépend que de ce dictionnaire : il peut être fait dans un autre
+    processus et son empreinte détermine s'il faut régénérer le PDF.
+    """
+    paiement = facture.paiement
+    payeur = paiement.payeur
+    return {
+        'reference': facture.reference,
+        'date_emission': facture.date_emission.strftime('%d/%m/%Y'),
+        'client_nom': payeur.get_full_name() or payeur.username,
+        'client_email': payeur.email,
+        'lignes': _lignes(paiement),
+        'total': str(facture.montant_total),
+    }
+
+
+def _tronquer(valeur, largeur, taille):
+    if stringWidth(valeur, 'Helvetica', taille) <= largeur:
+        return valeur
+    # Recherche dichotomique du plus long préfixe qui tient avec « … »
+    bas, haut = 0, len(valeur)
+    while bas < haut:
+        milieu = (bas + haut + 1) // 2
+        if stringWidth(valeur[:milieu] + '…', 'Helvetica', taille) <= largeur:
+            bas = milieu
+        else:
+            haut = milieu - 1
+    return valeur[:bas] + '…'
+
+
+def _partie_statique():
+    """
+    Parties fixes de la page (coordonnées EcoDeli, pied de page, en-tête du
+    tableau) : appels au canvas reportlab, calculés une fois par processus.
+    """
+    bas = HAUT_TABLEAU - HAUTEUR_ENTETE
+    appels = [
+        ('setFont', 'Helvetica', 12),
+        ('drawString', 50, PAGE_HEIGHT - 80, "EcoDeli"),
+        ('drawString', 50, PAGE_HEIGHT - 95, "110, rue de Flandre"),
+        ('drawString', 50, PAGE_HEIGHT - 110, "75019 Paris"),
+        ('setFont', 'Helvetica', 10),
+        ('drawString', 50, 50, "EcoDeli - SIRET: 123456789 - TVA: FR123456789"),
+        # En-tête du tableau : fond gris, libellés blancs centrés
+        ('setFillColor', colors.grey),
+        ('rect', 50, bas, 500, HAUTEUR_ENTETE, 1, 1),
+        ('setFillColor', colors.white),
+        ('setFont', 'Helvetica-Bold', 10),
+    ]
+    appels += [('drawCentredString', x + largeur / 2, bas + 8, libelle) for libelle, x, largeur in COLONNES]
+    appels += [('line', x, bas, x, HAUT_TABLEAU) for _, x, _ in COLONNES[1:]]
+    return tuple(appels)
+
+
+class InvoiceTemplate:
+    """
+    Mise en page précompilée des factures, rendue avec reportlab.
+
+    Les parties fixes sont préparées une fois par processus (_partie_statique)
+    et dessinées une fois par document dans un form XObject reportlab
+    (beginForm/doForm) : chaque page ne dessine que son contenu variable.
+    """
+    # À incrémenter à chaque changement de mise en page : invalide les PDF en cache
+    VERSION = 3
+    FORME = 'statique'
+
+    def __init__(self):
+        self.statique = _partie_statique()
+
+    def _canvas(self, fichier):
+        p = canvas.Canvas(fichier, pagesize=letter, pageCompression=1)
+        p.beginForm(self.FORME)
+        p.saveState()
+        for methode, *arguments in self.statique:
+            getattr(p, methode)(*arguments)
+        p.restoreState()
+        p.endForm()
+        return p
+
+    def _pages(self, p, data):
+        """Dessine une facture, sur plusieurs pages au-delà de LIGNES_PAR_PAGE lignes. Retourne le nombre de pages."""
+        lignes = data['lignes'] or [["", 0, "0"]]
+        lots = [lignes[i:i + LIGNES_PAR_PAGE] for i in range(0, len(lignes), LIGNES_PAR_PAGE)]
+        for numero, lot in enumerate(lots):
+            p.doForm(self.FORME)
+            p.setFont("Helvetica-Bold", 18)
+            p.drawString(50, PAGE_HEIGHT - 50, f"FACTURE N° {data['reference']}" + (" (suite)" if numero else ""))
+            p.setFont("Helvetica", 12)
+            p.drawString(350, PAGE_HEIGHT - 80, f"Client: {data['client_nom']}")
+            p.drawString(350, PAGE_HEIGHT - 95, f"Email: {data['client_email']}")
+            p.drawString(50, PAGE_HEIGHT - 140, f"Date d'émission: {data['date_emission']}")
+
+            p.setFont("Helvetica", 10)
+            y = HAUT_TABLEAU - HAUTEUR_ENTETE
+            for description, quantite, prix in lot:
+                y -= HAUTEUR_LIGNE
+                total = (Decimal(prix) * quantite).quantize(Decimal('0.01'))
+                p.drawString(55, y + 5, _tronquer(description, 190, 10))
+                p.drawRightString(345, y + 5, str(quantite))
+                p.drawRightString(445, y + 5, f"{prix}€")
+                p.drawRightString(545, y + 5, f"{total}€")
+                p.rect(50, y, 500, HAUTEUR_LIGNE)
+            for _, x, _ in COLONNES[1:]:
+                p.line(x, y, x, HAUT_TABLEAU - HAUTEUR_ENTETE)
+            if numero == len(lots) - 1:
+                p.setFont("Helvetica-Bold", 14)
+                p.drawString(350, y - 30, f"Total: {data['total']}€")
+            p.showPage()
+        return len(lots)
+
+    def render(self, data):
+        """PDF complet d'une facture (octets)."""
+        buffer = BytesIO()
+        self.write([data], buffer)
+        return buffer.getvalue()
+
+    def write(self, factures, fichier, vide=None):
+        """
+        Dessine les factures (données de invoice_data) à la suite dans un seul
+        PDF. reportlab sérialise le document à la fin, d'un bloc, dans `fichier`
+        (pas besoin qu'il soit positionnable). Retourne le nombre de pages.
+        """
+        p = self._canvas(fichier)
+        pages = 0
+        for data in factures:
+            pages += self._pages(p, data)
+        if not pages:
+            p.doForm(self.FORME)
+            p.setFont("Helvetica", 12)
+            p.drawString(50, PAGE_HEIGHT - 50, vide or "")
+            p.showPage()
+            pages = 1
+        p.save()
+        return pages
+
+
+@functools.lru_cache(maxsize=None)
+def invoice_template():
+    """Gabarit compilé, construit une fois par processus."""
+    return InvoiceTemplate()
+
+
+def render_invoice_pdf(data):
+    """Génère le PDF d'une facture à partir de invoice_data() et retourne ses octets."""
+    return invoice_template().render(data)
+
+
+def render_invoice_pdf_timed(data):
+    """render_invoice_pdf() et sa durée en secondes (mesurée dans le processus de rendu)."""
+    debut = time.perf_counter()
+    contenu = render_invoice_pdf(data)
+    return contenu, time.perf_counter() - debut
+
 
 def generate_invoice_pdf(facture):
     """Génère un PDF de facture"""
-    buffer = BytesIO()
-    p = canvas.Canvas(buffer, pagesize=letter)
-    width, height = letter
-    
-    # Titre
-    p.setFont("Helvetica-Bold", 18)
-    p.drawString(50, height - 50, f"FACTURE N° {facture.reference}")
-    
-    # Infos société
-    p.setFont("Helvetica", 12)
-    p.drawString(50, height - 80, "EcoDeli")
-    p.drawString(50, height - 95, "110, rue de Flandre")
-    p.drawString(50, height - 110, "75019 Paris")
-    
-    # Infos client
-    p.drawString(350, height - 80, f"Client: {facture.paiement.payeur.get_full_name()}")
-    p.drawString(350, height - 95, f"Email: {facture.paiement.payeur.email}")
-    
-    # Date
-    p.drawString(50, height - 140, f"Date d'émission: {facture.date_emission.strftime('%d/%m/%Y')}")
-    
-    # Tableau des détails
-    data = [
-        ["Description", "Quantité", "Prix unitaire", "Total"],
-        [
-            f"Livraison {facture.paiement.livraison.reference}",
-            "1",
-            f"{facture.paiement.montant}€",
-            f"{facture.paiement.montant}€"
-        ],
-    ]
-    
-    table = Table(data, colWidths=[200, 100, 100, 100])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (3, 0), colors.grey),
-        ('TEXTCOLOR', (0, 0), (3, 0), colors.white),
-        ('ALIGN', (0, 0), (3, 0), 'CENTER'),
-        ('FONTNAME', (0, 0), (3, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (3, 0), 12),
-        ('BACKGROUND', (0, 1), (3, 1), colors.white),
-        ('BOX', (0, 0), (-1, -1), 1, colors.black),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
-    
-    table.wrapOn(p, width, height)
-    table.drawOn(p, 50, height - 230)
-    
-    # Total
-    p.setFont("Helvetica-Bold", 14)
-    p.drawString(350, height - 260, f"Total: {facture.paiement.montant}€")
-    
-    # Pied de page
-    p.setFont("Helvetica", 10)
-    p.drawString(50, 50, "EcoDeli - SIRET: 123456789 - TVA: FR123456789")
-    
-    p.showPage()
-    p.save()
-    
-    buffer.seek(0)
-    return buffer
+    return BytesIO(render_invoice_pdf(invoice_data(facture)))
+
 
 def save_invoice_pdf(facture):
     """Enregistre le PDF de facture dans le système de fichiers"""
-    buffer = generate_invoice_pdf(facture)
-    
-    # Créer le chemin du fichier
-    filename = f"facture_{facture.reference}.pdf"
-    filepath = os.path.join(settings.MEDIA_ROOT, 'factures', filename)
-    
-    # Assurez-vous que le répertoire existe
-    os.makedirs(os.path.join(settings.MEDIA_ROOT, 'factures'), exist_ok=True)
-    
-    # Enregistrez le fichier
-    with open(filepath, 'wb') as f:
-        f.write(buffer.read())
-    
-    # Mettez à jour le chemin du fichier dans l'instance de facture
-    facture.pdf_file.name = os.path.join('factures', filename)
-    facture.save()
-    
-    return facture.pdf_file.url
\ No newline at end of file
+    from dashboard.services.invoice_pdf import ensure_invoice_pdf
+
+    ensure_invoice_pdf(facture, force=True)
+    return facture.pdf_file.url
@@ -0,0 +1,108 @@
+# dashboard/api/query_plans.py
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+# Plans déduits, mis en cache par classe de serializer
+_PLANS = {}
+
+
+class QueryPlan:
+    """Plan de chargement d'un queryset : jointures, préchargements et colonnes."""
+
+    def __init__(self, select_related=(), prefetch_related=(), only=()):
+        self.select_related = tuple(select_related)
+        self.prefetch_related = tuple(prefetch_related)
+        self.only = tuple(only)
+
+    def apply(self, queryset):
+        if self.select_related:
+            queryset = queryset.select_related(*self.select_related)
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*self.prefetch_related)
+        if self.only:
+            queryset = queryset.only(*self.only)
+        return queryset
+
+    def __repr__(self):
+        return (f"QueryPlan(select_related={self.select_related}, "
+                f"prefetch_related={self.prefetch_related}, only={self.only})")
+
+
+def _relation(model, name):
+    """Retourne le champ relationnel `name` du modèle, ou None."""
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field if field.is_relation else None
+
+
+def _walk(serializer, model, prefix, in_prefetch, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+
+        nested = isinstance(field, serializers.BaseSerializer)
+        many = isinstance(field, (serializers.ListSerializer, serializers.ManyRelatedField))
+        parts = field.source.split('.')
+        # Pour un champ simple, seul le dernier attribut est lu sur l'objet lié
+        attrs = parts if (nested or many) else parts[:-1]
+
+        current, path, prefetched = model, [], in_prefetch
+        for attr in attrs:
+            rel = _relation(current, attr)
+            if rel is None:
+                break
+            path.append(attr)
+            lookup = prefix + '__'.join(path)
+            if rel.many_to_many or rel.one_to_many:
+                prefetched = True
+            (prefetch if prefetched else select).add(lookup)
+            current = rel.related_model
+        else:
+            if not nested or not path:
+                continue
+            child = field.child if isinstance(field, serializers.ListSerializer) else field
+            _walk(child, current, prefix + '__'.join(path) + '__', prefetched, select, prefetch)
+
+
+def derive_query_plan(serializer_class):
+    """
+    Déduit un plan de chargement des champs déclarés par un ModelSerializer.
+
+    Les sources pointées (`created_by.username`) et les serializers imbriqués
+    sur une clé étrangère donnent des select_related, les relations multiples
+    des prefetch_related. Les SerializerMethodField ne sont pas analysés.
+
+    `only` n'est jamais déduit : les vues, permissions et méthodes de modèle
+    lisent des colonnes absentes du serializer (created_by_id, client_id…),
+    et chaque colonne différée lue coûterait une requête par objet. Il se
+    déclare à la main dans un `query_plan` explicite.
+    """
+    select, prefetch = set(), set()
+    _walk(serializer_class(), serializer_class.Meta.model, '', False, select, prefetch)
+    return QueryPlan(select_related=sorted(select), prefetch_related=sorted(prefetch))
+
+
+class QueryPlanMixin:
+    """
+    Applique automatiquement un plan de chargement aux querysets d'un ViewSet.
+
+    Le plan est déclaré via `query_plan` ou, à défaut, déduit du serializer
+    (jointures et préchargements seulement, voir derive_query_plan).
+    Il est appliqué dans `filter_queryset`, utilisé par list, retrieve,
+    update et destroy ; les actions personnalisées doivent aussi y passer.
+    """
+    query_plan = None
+
+    def get_query_plan(self):
+        if self.query_plan is not None:
+            return self.query_plan
+        serializer_class = self.get_serializer_class()
+        plan = _PLANS.get(serializer_class)
+        if plan is None:
+            plan = _PLANS[serializer_class] = derive_query_plan(serializer_class)
+        return plan
+
+    def filter_queryset(self, queryset):
+        return self.get_query_plan().apply(super().filter_queryset(queryset))
@@ -1,6 +1,8 @@
 # api/serializers.py
 from rest_framework import serializers
-from dashboard.models import User, Annonce, Livraison, Commercant, Prestataire, Livreur, Paiement, Message
+from dashboard.models import (
+    User, Annonce, Livraison, Commercant, Prestataire, Livreur, Paiement, Message, Notification, ParticipantConversation
+)
 
 
 #By Oceane
@@ -8,6 +10,41 @@ class MessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = Message
         fields = '__all__'
+        # L'expéditeur est l'utilisateur connecté ; la conversation est déduite
+        read_only_fields = ['sender', 'conversation', 'timestamp']
+        extra_kwargs = {'annonce': {'required': True, 'allow_null': False}}
+
+    def validate_receiver(self, receiver):
+        request = self.context.get('request')
+        if request is not None and receiver == request.user:
+            raise serializers.ValidationError("Impossible de s'envoyer un message.")
+        return receiver
+
+
+class ConversationSerializer(serializers.ModelSerializer):
+    """Conversation vue par un participant (ligne de sa boîte de réception)."""
+    id = serializers.IntegerField(source='conversation_id')
+    annonce = serializers.IntegerField(source='conversation.annonce_id', allow_null=True)
+    interlocuteurs = serializers.SerializerMethodField()
+    dernier_message = serializers.IntegerField(source='conversation.dernier_message_id', allow_null=True)
+    apercu = serializers.CharField(source='conversation.apercu')
+    date_dernier_message = serializers.DateTimeField(source='conversation.date_dernier_message')
+    nombre_messages = serializers.IntegerField(source='conversation.nombre_messages')
+
+    class Meta:
+        model = ParticipantConversation
+        fields = [
+            'id', 'annonce', 'interlocuteurs', 'dernier_message', 'apercu',
+            'date_dernier_message', 'nombre_messages', 'non_lus', 'date_lecture'
+        ]
+        read_only_fields = fields
+
+    def get_interlocuteurs(self, obj):
+        return [
+            {'id': participation.user_id, 'username': participation.user.username}
+            for participation in obj.conversation.participations.all()
+            if participation.user_id != obj.user_id
+        ]
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -20,25 +57,39 @@ class UserSerializer(serializers.ModelSerializer):
         }
 
 class AnnonceSerializer(serializers.ModelSerializer):
-    created_by_username = serializers.SerializerMethodField()
-    
+    # Source pointée plutôt que SerializerMethodField : le plan de chargement
+    # en déduit le select_related('created_by')
+    created_by_username = serializers.CharField(source='created_by.username', read_only=True, allow_null=True)
+
     class Meta:
         model = Annonce
         fields = ['id', 'titre', 'description', 'depart', 'arrivee',
                   'date_depart', 'date_arrivee', 'prix', 'status',
                   'type_annonce', 'poids', 'dimensions', 'created_at',
                   'updated_at', 'est_urgente', 'vues', 'created_by',
-                  'created_by_username']
+                  'created_by_username', 'depart_latitude', 'depart_longitude',
+                  'arrivee_latitude', 'arrivee_longitude']
         read_only_fields = ['created_by', 'created_at', 'updated_at', 'vues']
-    
-    def get_created_by_username(self, obj):
-        return obj.created_by.username if obj.created_by else None
+
+class AnnonceProcheSerializer(AnnonceSerializer):
+    """Annonce retournée par une recherche de proximité, avec sa distance au point."""
+    distance_km = serializers.FloatField(read_only=True)
+
+    class Meta(AnnonceSerializer.Meta):
+        fields = AnnonceSerializer.Meta.fields + ['distance_km']
+
+class AnnonceTendanceSerializer(AnnonceSerializer):
+    """Annonce en tendance, avec ses vues sur la fenêtre glissante."""
+    vues_recentes = serializers.IntegerField(read_only=True)
+
+    class Meta(AnnonceSerializer.Meta):
+        fields = AnnonceSerializer.Meta.fields + ['vues_recentes']
 
 class LivraisonSerializer(serializers.ModelSerializer):
     # Permet d’envoyer juste l’ID lors du POST, et l’objet complet lors du GET
     annonce = serializers.PrimaryKeyRelatedField(queryset=Annonce.objects.all(), write_only=True)
     annonce_details = AnnonceSerializer(source='annonce', read_only=True)
-    livreur_username = serializers.SerializerMethodField()              # Ajouter by Oceane
+    livreur_username = serializers.CharField(source='livreur.username', read_only=True, allow_null=True)  # Ajouter by Oceane
 
     class Meta:
         model = Livraison
@@ -54,9 +105,6 @@ class LivraisonSerializer(serializers.ModelSerializer):
         if 'livreur' not in validated_data:
             validated_data['livreur'] = self.context['request'].user
         return super().create(validated_data)
-    
-    def get_livreur_username(self, obj):     # Ajouter by Oceane
-        return obj.livreur.username if obj.livreur else None
 
 
 class LivreurSerializer(serializers.ModelSerializer):
@@ -66,6 +114,15 @@ class LivreurSerializer(serializers.ModelSerializer):
                  'zones_livraison', 'nombre_livraisons']
         read_only_fields = ['verified', 'rating', 'nombre_livraisons']
 
+class LivreurCandidatSerializer(LivreurSerializer):
+    """Livreur proposé pour une annonce : distance du départ à sa zone la plus proche."""
+    username = serializers.CharField(source='user.username', read_only=True)
+    distance_km = serializers.FloatField(read_only=True)
+    zone = serializers.CharField(read_only=True)
+
+    class Meta(LivreurSerializer.Meta):
+        fields = ['id', 'username'] + LivreurSerializer.Meta.fields + ['distance_km', 'zone']
+
 class CommercantSerializer(serializers.ModelSerializer):
     class Meta:
         model = Commercant
@@ -90,6 +147,15 @@ class PaiementSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ['date', 'reference_transaction']
 
+class NotificationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Notification
+        fields = ['id', 'titre', 'message', 'lue', 'date_creation', 'type_notification', 'lien']
+        read_only_fields = fields
+
+class NotificationsLuesSerializer(serializers.Serializer):
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=1000)
+
 # Serializers pour les modèles manquants (à implémenter lorsque les modèles seront créés)
 try:
     from dashboard.models import Contrat, Service, PieceJustificative
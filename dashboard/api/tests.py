@@ -1,3 +1,1562 @@
-from django.test import TestCase
+import asyncio
+import datetime
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+import zipfile
+import zlib
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.db.models import F, Sum
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from dashboard.models import (
+    User, Paiement, StatPaiementJour, Notification, Annonce, Livraison, Facture,
+    MouvementPortefeuille, TacheFacturePDF, DemandeValidationLivreur, PieceJustificative, EnvoiPush,
+    LogConnexion, Message, Conversation, Entrepot, ZoneLivreur, Service, StatLivraisonJour
+)
+from dashboard.api.notifications_utils import send_push_notification
+from dashboard.pagination import paginate_keyset
+from dashboard.api.pdf_utils import LIGNES_PAR_PAGE, invoice_data, render_invoice_pdf
+from dashboard.services.invoice_pdf import (
+    DELAI_TACHE_BLOQUEE, _reserver, invoice_pdf_path, process_invoice_jobs, requeue_stale_jobs
+)
+from dashboard.services.dataset_service import generate_dataset, purge_dataset
+from dashboard.services.kpi_cache import get_home_kpis, get_kpi_cache_stats
+from dashboard.services import push_backends
+from dashboard.services.events import canal_utilisateur, get_broker
+from dashboard.services.geo import gazetteer, haversine
+from dashboard.services.push_service import (
+    DELAI_ENVOI_BLOQUE, PushDispatcher, _reserver as reserver_envois, requeue_stale_pushes
+)
+from dashboard.services.affectation_service import affecter_en_masse
+from dashboard.services.vues import MemoryCompteur, ecrire_vues, get_compteur
+from dashboard.services.recherche_texte import filtre as filtre_recherche
+from dashboard.services.retention import appliquer_retention, politiques
+from dashboard.services.profiling import ProfileStore, percentile, store as profile_store
+from dashboard.services.rollup_service import rebuild_daily_rollups
+from dashboard.services.stats_service import get_time_series, get_yearly_series
+from dashboard.services.wallet_service import reconcile_wallets
+
+
+def make_user(username, user_type='client'):
+    user = User.objects.create_user(
+        username=username,
+        email=f"{username}@example.com",
+        password='test1234',
+        user_type=user_type
+    )
+    # Recharger pour obtenir des Decimal plutôt que les valeurs par défaut en mémoire
+    return User.objects.get(pk=user.pk)
+
+
+def make_annonce(user, titre='Annonce', **kwargs):
+    depart = timezone.now() + datetime.timedelta(days=1)
+    defaults = {
+        'titre': titre,
+        'description': 'Colis à livrer',
+        'depart': 'Paris',
+        'arrivee': 'Lyon',
+        'date_depart': depart,
+        'date_arrivee': depart + datetime.timedelta(hours=5),
+        'prix': Decimal('20.00'),
+    }
+    defaults.update(kwargs)
+    return Annonce.objects.create(created_by=user, **defaults)
+
+
+def make_livraison(livreur, client, annonce):
+    return Livraison.objects.create(
+        annonce=annonce, livreur=livreur, client=client,
+        description_colis='Colis', poids=Decimal('1.00'),
+        date_prise_en_charge=annonce.date_depart,
+        date_livraison_prevue=annonce.date_arrivee,
+    )
+
+
+def aware(year, month, day):
+    return timezone.make_aware(datetime.datetime(year, month, day, 12, 0))
+
+
+def pdf_contents(pdf):
+    """
+    Vérifie la structure d'un PDF (chaque entrée de la table xref pointe sur
+    son objet) et retourne ses flux décompressés, pour contrôler le texte dessiné.
+    """
+    debut = int(re.search(rb'startxref\s+(\d+)', pdf).group(1))
+    entete = re.match(rb'xref\s+0 (\d+)\s+', pdf[debut:])
+    assert entete, "table xref introuvable"
+    offsets = re.findall(rb'(\d{10}) \d{5} n', pdf[debut:debut + entete.end() + 20 * int(entete.group(1))])
+    for numero, offset in enumerate(offsets, start=1):
+        assert pdf.startswith(b'%d 0 obj' % numero, int(offset)), f"objet {numero} absent à l'offset {int(offset)}"
+    return [zlib.decompressobj().decompress(pdf[m.end():]) for m in re.finditer(rb'\nstream\r?\n', pdf)]
+
+
+class TimeSeriesTests(TestCase):
+    def setUp(self):
+        self.payeur = make_user('payeur')
+        self.beneficiaire = make_user('beneficiaire', 'commercant')
+
+    def _paiement(self, montant, when, status='reussi'):
+        paiement = Paiement.objects.create(
+            montant=Decimal(montant),
+            payeur=self.payeur,
+            beneficiaire=self.beneficiaire,
+            status=status
+        )
+        Paiement.objects.filter(pk=paiement.pk).update(date_paiement=when)
+        return paiement
+
+    def test_monthly_revenue_is_gap_filled(self):
+        self._paiement('10.00', aware(2024, 1, 5))
+        self._paiement('5.50', aware(2024, 1, 20))
+        self._paiement('7.00', aware(2024, 3, 2))
+        self._paiement('99.00', aware(2024, 3, 3), status='echoue')
+        rebuild_daily_rollups(['paiements'])
+
+        with self.assertNumQueries(1):
+            series = get_yearly_series('revenue', 2024)
+
+        self.assertEqual(len(series), 12)
+        self.assertEqual(series[0], {'periode': datetime.date(2024, 1, 1), 'valeur': Decimal('15.50')})
+        self.assertEqual(series[1]['valeur'], 0)
+        self.assertEqual(series[2]['valeur'], Decimal('7.00'))
+
+    def test_weekly_buckets_start_on_monday(self):
+        self._paiement('3.00', aware(2024, 1, 10))
+        rebuild_daily_rollups(['paiements'])
+
+        series = get_time_series(
+            'paiements', 'week',
+            start=datetime.date(2024, 1, 3),
+            end=datetime.date(2024, 1, 20)
+        )
+
+        self.assertEqual([p['periode'] for p in series], [
+            datetime.date(2024, 1, 1),
+            datetime.date(2024, 1, 8),
+            datetime.date(2024, 1, 15),
+        ])
+        self.assertEqual([p['valeur'] for p in series], [0, 1, 0])
+
+    def test_source_and_rollups_agree(self):
+        self._paiement('4.00', aware(2024, 6, 1))
+        self._paiement('6.00', aware(2024, 6, 30))
+        rebuild_daily_rollups(['paiements'])
+
+        self.assertEqual(
+            get_yearly_series('revenue', 2024),
+            get_yearly_series('revenue', 2024, use_rollups=False)
+        )
+
+    def test_unknown_metric_raises(self):
+        with self.assertRaises(ValueError):
+            get_time_series('inconnue')
+
+
+class DailyRollupTests(TestCase):
+    def setUp(self):
+        self.payeur = make_user('payeur')
+        self.beneficiaire = make_user('beneficiaire', 'commercant')
+
+    def _cumul(self, status):
+        return StatPaiementJour.objects.filter(
+            jour=timezone.localdate(), status=status, mode_paiement='carte'
+        ).values('nombre', 'montant_total').first()
+
+    def test_status_change_moves_payment_between_rollups(self):
+        paiement = Paiement.objects.create(
+            montant=Decimal('12.00'), payeur=self.payeur, beneficiaire=self.beneficiaire
+        )
+        self.assertEqual(self._cumul('en_attente'), {'nombre': 1, 'montant_total': Decimal('12.00')})
+
+        paiement = Paiement.objects.get(pk=paiement.pk)
+        paiement.status = 'reussi'
+        paiement.save()
+
+        self.assertEqual(self._cumul('en_attente'), {'nombre': 0, 'montant_total': Decimal('0.00')})
+        self.assertEqual(self._cumul('reussi'), {'nombre': 1, 'montant_total': Decimal('12.00')})
+
+        paiement.delete()
+        self.assertEqual(self._cumul('reussi')['nombre'], 0)
+
+    def test_rebuild_matches_incremental_rollups(self):
+        for montant in ('1.00', '2.50'):
+            Paiement.objects.create(
+                montant=Decimal(montant), payeur=self.payeur,
+                beneficiaire=self.beneficiaire, status='reussi'
+            )
+        incremental = self._cumul('reussi')
+
+        rebuild_daily_rollups()
+
+        self.assertEqual(self._cumul('reussi'), incremental)
+        self.assertEqual(incremental, {'nombre': 2, 'montant_total': Decimal('3.50')})
+
+
+class HomeKpiCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.payeur = make_user('payeur')
+        self.beneficiaire = make_user('beneficiaire', 'commercant')
+
+    def test_second_read_is_served_from_cache(self):
+        get_home_kpis()
+        with self.assertNumQueries(0):
+            kpis = get_home_kpis()
+
+        self.assertEqual(kpis['stats']['total_commercants'], 1)
+        stats = get_kpi_cache_stats()
+        self.assertEqual((stats['hits'], stats['misses']), (3, 3))
+
+    def test_payment_invalidates_stats_and_recent_payments(self):
+        get_home_kpis()
+        with self.captureOnCommitCallbacks(execute=True):
+            Paiement.objects.create(
+                montant=Decimal('8.00'), payeur=self.payeur,
+                beneficiaire=self.beneficiaire, status='reussi'
+            )
+            # Avant le COMMIT, une lecture ne remet pas en cache un état périmé
+            self.assertEqual(get_home_kpis()['stats']['paiements_aujourd_hui'], 0)
+
+        kpis = get_home_kpis()
+
+        self.assertEqual(kpis['stats']['paiements_aujourd_hui'], 1)
+        self.assertEqual(len(kpis['paiements_recents']), 1)
+
+    def test_login_does_not_invalidate_stats(self):
+        get_home_kpis()
+        self.payeur.date_derniere_connexion = timezone.now()
+        self.payeur.save(update_fields=['date_derniere_connexion'])
+
+        with self.assertNumQueries(0):
+            get_home_kpis()
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('lecteur')
+        self.notifications = [
+            Notification.objects.create(user=self.user, titre=f"n{i}", message='m', lue=i % 2 == 0)
+            for i in range(7)
+        ]
+        # Dates identiques pour vérifier le départage par id
+        Notification.objects.update(date_creation=aware(2024, 1, 1))
+        self.factory = RequestFactory()
+
+    def _page(self, **params):
+        request = self.factory.get('/dashboard/notifications/', params)
+        return paginate_keyset(
+            request, Notification.objects.all(),
+            ordering=['-date_creation', '-id'],
+            filters={'lue': 'lue', 'user': 'user_id', 'depuis': 'date_creation__gte', 'email': 'user__email'}
+        )
+
+    def test_forward_and_backward_traversal(self):
+        ids = sorted((n.id for n in self.notifications), reverse=True)
+
+        first = self._page(page_size=3)
+        second = self._page(page_size=3, after=first.next_cursor)
+        third = self._page(page_size=3, after=second.next_cursor)
+        back = self._page(page_size=3, before=third.previous_cursor)
+
+        self.assertEqual([n.id for n in first], ids[:3])
+        self.assertEqual([n.id for n in second], ids[3:6])
+        self.assertEqual([n.id for n in third], ids[6:])
+        self.assertEqual([n.id for n in back], ids[3:6])
+        self.assertFalse(first.has_previous)
+        self.assertTrue(second.has_previous and second.has_next)
+        self.assertFalse(third.has_next)
+        self.assertEqual(first.total_count, 7)
+
+    def test_filters_and_cached_count(self):
+        self._page(lue='false')
+        with self.assertNumQueries(1):
+            page = self._page(lue='false')
+
+        self.assertEqual(page.total_count, 3)
+        self.assertTrue(all(not n.lue for n in page))
+
+    def test_malformed_filter_values_are_ignored(self):
+        self.assertEqual(self._page(user=str(self.user.pk)).filters, {'user': self.user.pk})
+        self.assertEqual(self._page(user='abc').total_count, 7)
+        self.assertEqual(self._page(user='1.5', depuis='hier').filters, {})
+        self.assertEqual(self._page(email='lecteur@example.com').total_count, 7)
+
+    def test_invalid_cursor_restarts_from_first_page(self):
+        page = self._page(page_size=3, after='pas-un-curseur')
+        self.assertEqual(len(page), 3)
+        self.assertFalse(page.has_previous)
+
+
+class ApiPaginationTests(TestCase):
+    def setUp(self):
+        self.client_user = make_user('client')
+        self.admin = make_user('admin', 'admin')
+        self.admin.is_staff = True
+        self.admin.save()
+        for i in range(5):
+            make_annonce(self.client_user, titre=f"Annonce {i}")
+        self.api = APIClient()
+
+    def test_annonces_are_cursor_paginated(self):
+        self.api.force_authenticate(self.client_user)
+
+        first = self.api.get('/dashboard/api/annonces/', {'page_size': 2}).json()
+        second = self.api.get(first['next']).json()
+
+        self.assertEqual([a['titre'] for a in first['results']], ['Annonce 4', 'Annonce 3'])
+        self.assertEqual([a['titre'] for a in second['results']], ['Annonce 2', 'Annonce 1'])
+        self.assertIsNotNone(second['previous'])
+
+    def test_page_size_is_capped(self):
+        self.api.force_authenticate(self.client_user)
+        response = self.api.get('/dashboard/api/annonces/', {'page_size': 10000})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_admin_offset_mode_reports_total(self):
+        self.api.force_authenticate(self.admin)
+
+        data = self.api.get('/dashboard/api/admin/users/', {'limit': 1, 'offset': 1}).json()
+
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(len(data['results']), 1)
+        self.assertIn('next', self.api.get('/dashboard/api/admin/users/').json())
+
+
+class QueryCountAssertionsMixin:
+    """Vérifie qu'un endpoint de liste n'effectue pas de requêtes N+1."""
+
+    def count_queries(self, url, **params):
+        with CaptureQueriesContext(connection) as context:
+            response = self.api.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertQueriesDoNotScale(self, url, add_rows, rows=3, **params):
+        """Échoue si le nombre de requêtes croît avec le nombre de lignes listées."""
+        add_rows(rows)
+        avant = self.count_queries(url, **params)
+        add_rows(rows)
+        apres = self.count_queries(url, **params)
+        self.assertEqual(
+            avant, apres,
+            f"{url} : {avant} requêtes pour {rows} lignes, {apres} pour {2 * rows}"
+        )
+
+
+class QueryPlanTests(QueryCountAssertionsMixin, TestCase):
+    def setUp(self):
+        self.livreur = make_user('livreur', 'livreur')
+        self.api = APIClient()
+        self.api.force_authenticate(self.livreur)
+
+    def _annonces(self, n):
+        for _ in range(n):
+            make_annonce(make_user(f"auteur{Annonce.objects.count()}"))
+
+    def _livraisons(self, n):
+        for _ in range(n):
+            client = make_user(f"client{Livraison.objects.count()}")
+            make_livraison(self.livreur, client, make_annonce(client))
+
+    def test_livreur_livraisons_list_has_constant_queries(self):
+        self.assertQueriesDoNotScale('/dashboard/api/livreur/livraisons/', self._livraisons)
+
+    def test_available_annonces_have_constant_queries(self):
+        self.assertQueriesDoNotScale('/dashboard/api/annonces/available/', self._annonces)
+
+    def test_client_annonces_list_has_constant_queries(self):
+        client = make_user('client')
+        self.api.force_authenticate(client)
+        self.assertQueriesDoNotScale(
+            '/dashboard/api/client/annonces/',
+            lambda n: [make_annonce(client) for _ in range(n)]
+        )
+
+
+@override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_SAMPLE_RATE=1.0, REQUEST_PROFILING_DIR=None)
+class RequestProfilingTests(TestCase):
+    def setUp(self):
+        profile_store.reset()
+        self.admin = make_user('admin', 'admin')
+        self.admin.is_staff = True
+        self.admin.save()
+        make_annonce(self.admin)
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def test_requests_are_recorded_per_url_name(self):
+        for _ in range(3):
+            self.api.get('/dashboard/api/annonces/')
+
+        stats = self.api.get('/dashboard/api/admin/request-profile/').json()['urls']
+
+        self.assertEqual(stats['api:annonce-list']['requests'], 3)
+        self.assertGreater(stats['api:annonce-list']['queries']['p50'], 0)
+        self.assertGreater(stats['api:annonce-list']['size']['max'], 0)
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0.0)
+    def test_unsampled_requests_are_not_recorded(self):
+        self.api.get('/dashboard/api/annonces/')
+        self.assertEqual(profile_store.summary(), {})
+
+    def test_window_and_percentiles(self):
+        local = ProfileStore(window=3)
+        for n in range(5):
+            local.record('vue', {'queries': n, 'sql_ms': 0, 'duplicates': 0, 'python_ms': 0, 'size': 0})
+
+        self.assertEqual(local.snapshot()['vue']['samples']['queries'], [2, 3, 4])
+        self.assertEqual(local.summary()['vue']['requests'], 5)
+        self.assertEqual(percentile([1, 2, 3, 4], 50), 2)
+
+
+class SyntheticDatasetTests(TestCase):
+    def test_generated_dataset_is_consistent(self):
+        counts = generate_dataset(scale=0.01, seed=42)
+
+        self.assertEqual(counts['users'], User.objects.count())
+        self.assertEqual(counts['factures'], Paiement.objects.filter(status='reussi').count())
+        self.assertEqual(Facture.objects.count(), counts['factures'])
+        self.assertEqual(
+            StatPaiementJour.objects.aggregate(n=Sum('nombre'))['n'], counts['paiements']
+        )
+        credits = Paiement.objects.filter(status='reussi').aggregate(t=Sum('montant'))['t']
+        self.assertEqual(User.objects.aggregate(t=Sum('portefeuille_solde'))['t'], credits)
+
+        purge_dataset()
+        self.assertFalse(User.objects.exists())
+
+
+class PaymentIngestionTests(TestCase):
+    def setUp(self):
+        self.admin = make_user('admin', 'admin')
+        self.admin.is_staff = True
+        self.admin.save()
+        self.payeur = make_user('payeur')
+        self.livreur = make_user('livreur', 'livreur')
+        self.api = APIClient()
+        self.api.force_authenticate(self.admin)
+
+    def test_csv_upload_creates_payments_invoices_and_credits(self):
+        contenu = (
+            "reference,payeur,beneficiaire,montant,status,date_paiement\n"
+            "IMP-1,payeur,livreur,10.00,reussi,2024-03-01T10:00:00\n"
+            f"IMP-2,{self.payeur.pk},livreur@example.com,5.50,reussi,2024-03-01T11:00:00\n"
+            "IMP-3,payeur,livreur,7.00,echoue,\n"
+        ).encode()
+        fichier = SimpleUploadedFile('paiements.csv', contenu, content_type='text/csv')
+
+        response = self.api.post('/dashboard/api/admin/paiements/import/', {'fichier': fichier}, format='multipart')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['crees'], 3)
+        self.assertEqual(Facture.objects.count(), 2)
+        self.assertEqual(User.objects.get(pk=self.livreur.pk).portefeuille_solde, Decimal('15.50'))
+        cumul = StatPaiementJour.objects.get(jour=datetime.date(2024, 3, 1), status='reussi')
+        self.assertEqual((cumul.nombre, cumul.montant_total), (2, Decimal('15.50')))
+
+    def test_invalid_row_rolls_back_whole_batch(self):
+        lignes = [
+            {'reference': 'OK-1', 'payeur': 'payeur', 'beneficiaire': 'livreur', 'montant': '3'},
+            {'reference': 'KO-1', 'payeur': 'inconnu', 'beneficiaire': 'livreur', 'montant': '-1'},
+        ]
+
+        response = self.api.post('/dashboard/api/admin/paiements/import/', lignes, format='json')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['lignes'][0]['ligne'], 2)
+        self.assertFalse(Paiement.objects.exists())
+
+    def _erreurs(self, lignes):
+        response = self.api.post('/dashboard/api/admin/paiements/import/', lignes, format='json')
+        self.assertEqual(response.status_code, 400, response.content)
+        self.assertFalse(Paiement.objects.exists())
+        return {erreur['ligne']: erreur['erreurs'] for erreur in response.json()['lignes']}
+
+    def test_rows_that_are_not_objects_are_line_errors(self):
+        ok = {'reference': 'OK-1', 'payeur': 'payeur', 'beneficiaire': 'livreur', 'montant': '3'}
+
+        erreurs = self._erreurs([ok, 'IMP-1', ['payeur', 'livreur', '3'], 12])
+
+        self.assertEqual(sorted(erreurs), [2, 3, 4])
+        self.assertIn('objet attendu', erreurs[3][0])
+
+    def test_nested_reference_fields_are_line_errors(self):
+        base = {'payeur': 'payeur', 'beneficiaire': 'livreur', 'montant': '3'}
+
+        erreurs = self._erreurs([
+            dict(base, reference=['R-1']),
+            dict(base, reference='R-2', livraison={'reference': 'LIV'}),
+            dict(base, reference='R-3', status=['reussi']),
+        ])
+
+        self.assertEqual(sorted(erreurs), [1, 2, 3])
+        self.assertIn('reference invalide', erreurs[1][0])
+        self.assertIn('livraison invalide', erreurs[2][0])
+
+    def test_unparsable_ids_and_dates_are_line_errors(self):
+        base = {'payeur': 'payeur', 'beneficiaire': 'livreur', 'montant': '3'}
+
+        erreurs = self._erreurs([
+            dict(base, reference='R-1', payeur='²'),
+            dict(base, reference='R-2', service='³'),
+            dict(base, reference='R-3', date_paiement='2024-02-30T10:00:00'),
+        ])
+
+        self.assertEqual(sorted(erreurs), [1, 2, 3])
+        self.assertIn('payeur inconnu', erreurs[1][0])
+        self.assertIn('service inconnu', erreurs[2][0])
+        self.assertIn('date invalide', erreurs[3][0])
+
+    def test_reimport_is_idempotent(self):
+        lignes = [{'reference': 'R-1', 'payeur': 'payeur', 'beneficiaire': 'livreur', 'montant': '4'}]
+        self.api.post('/dashboard/api/admin/paiements/import/', lignes, format='json')
+
+        data = self.api.post('/dashboard/api/admin/paiements/import/', lignes, format='json').json()
+
+        self.assertEqual((data['crees'], data['ignores']), (0, 1))
+        self.assertEqual(User.objects.get(pk=self.livreur.pk).portefeuille_solde, Decimal('4.00'))
+
+
+class WalletLedgerTests(TestCase):
+    def setUp(self):
+        self.payeur = make_user('payeur')
+        self.livreur = make_user('livreur', 'livreur')
+
+    def _solde(self):
+        return User.objects.get(pk=self.livreur.pk).portefeuille_solde
+
+    def test_successful_payment_credits_through_ledger(self):
+        paiement = Paiement.objects.create(
+            montant=Decimal('9.90'), payeur=self.payeur, beneficiaire=self.livreur, status='reussi'
+        )
+
+        mouvement = MouvementPortefeuille.objects.get(paiement=paiement)
+        self.assertEqual((mouvement.sens, mouvement.solde_apres), ('credit', Decimal('9.90')))
+        self.assertEqual(self._solde(), Decimal('9.90'))
+
+        # Crédit idempotent pour un même paiement
+        MouvementPortefeuille.crediter_paiement(paiement)
+        self.assertEqual(self._solde(), Decimal('9.90'))
+
+    def test_refund_debits_the_beneficiary(self):
+        paiement = Paiement.objects.create(
+            montant=Decimal('5.00'), payeur=self.payeur, beneficiaire=self.livreur, status='reussi'
+        )
+        paiement = Paiement.objects.get(pk=paiement.pk)
+        paiement.status = 'rembourse'
+        paiement.save()
+
+        self.assertEqual(self._solde(), Decimal('0.00'))
+        self.assertEqual(
+            list(MouvementPortefeuille.objects.order_by('pk').values_list('sens', 'solde_apres')),
+            [('credit', Decimal('5.00')), ('debit', Decimal('0.00'))]
+        )
+
+    def test_ledger_rows_are_append_only(self):
+        mouvement = MouvementPortefeuille.enregistrer(self.livreur, '3.00', 'credit', 'ajustement')
+        mouvement.montant = Decimal('30.00')
+        with self.assertRaises(ValueError):
+            mouvement.save()
+
+    def test_reconciliation_detects_and_fixes_drift(self):
+        MouvementPortefeuille.enregistrer(self.livreur, '4.00', 'credit', 'ajustement')
+        User.objects.filter(pk=self.livreur.pk).update(portefeuille_solde=Decimal('10.00'))
+
+        ecarts = reconcile_wallets(fix=True)
+
+        self.assertEqual([(e['user'], e['ecart']) for e in ecarts], [(self.livreur.pk, Decimal('6.00'))])
+        self.assertEqual(self._solde(), Decimal('4.00'))
+        self.assertEqual(reconcile_wallets(), [])
+
+
+class InvoicePdfTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media, FACTURE_PDF_ASYNC=True)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.payeur = make_user('payeur')
+        self.livreur = make_user('livreur', 'livreur')
+        with self.captureOnCommitCallbacks(execute=True):
+            paiement = Paiement.objects.create(
+                montant=Decimal('12.50'), payeur=self.payeur, beneficiaire=self.livreur, status='reussi'
+            )
+        self.facture = Facture.objects.get(paiement=paiement)
+
+    def test_invoice_creation_enqueues_a_job(self):
+        tache = TacheFacturePDF.objects.get(facture=self.facture)
+        self.assertEqual(tache.status, 'en_attente')
+        self.assertFalse(self.facture.pdf_file)
+
+    def test_worker_renders_once_until_content_changes(self):
+        resultat = process_invoice_jobs()
+
+        self.assertEqual((resultat['rendues'], resultat['echecs']), (1, 0))
+        self.assertGreater(resultat['rendu_ms']['max'], 0)
+        facture = Facture.objects.get(pk=self.facture.pk)
+        self.assertTrue(os.path.exists(invoice_pdf_path(facture)))
+        self.assertEqual(len(facture.pdf_hash), 64)
+        self.assertEqual(TacheFacturePDF.objects.get(facture=facture).status, 'terminee')
+
+        # Contenu identique : pas de nouveau rendu
+        self.assertFalse(facture.generer_pdf())
+        Facture.objects.filter(pk=facture.pk).update(montant_total=Decimal('15.00'))
+        self.assertTrue(Facture.objects.get(pk=facture.pk).generer_pdf())
+
+    def test_reservation_returns_only_claimed_jobs(self):
+        tache = TacheFacturePDF.objects.get(facture=self.facture)
+        maintenant = timezone.now
+
+        def concurrent():
+            # Un autre worker réserve la tâche entre la sélection et l'UPDATE
+            TacheFacturePDF.objects.filter(pk=tache.pk).update(status='en_cours', jeton='autre')
+            return maintenant()
+
+        with mock.patch('dashboard.services.invoice_pdf.timezone.now', side_effect=concurrent):
+            self.assertEqual(_reserver(10), [])
+        self.assertEqual(TacheFacturePDF.objects.get(pk=tache.pk).jeton, 'autre')
+
+        TacheFacturePDF.objects.filter(pk=tache.pk).update(status='en_attente')
+        self.assertEqual(_reserver(10), [tache.pk])
+        self.assertEqual(_reserver(10), [])
+
+    def test_invoice_with_broken_data_fails_alone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            autre = Paiement.objects.create(
+                montant=Decimal('4.00'), payeur=self.payeur, beneficiaire=self.livreur, status='reussi'
+            )
+
+        def donnees(facture):
+            if facture.pk == self.facture.pk:
+                raise AttributeError("'NoneType' object has no attribute 'get_full_name'")
+            return invoice_data(facture)
+
+        with mock.patch('dashboard.services.invoice_pdf.invoice_data', side_effect=donnees):
+            resultat = process_invoice_jobs()
+
+        self.assertEqual((resultat['rendues'], resultat['echecs']), (1, 1))
+        self.assertEqual(TacheFacturePDF.objects.get(facture__paiement=autre).status, 'terminee')
+        tache = TacheFacturePDF.objects.get(facture=self.facture)
+        self.assertEqual(tache.status, 'en_attente')
+        self.assertIn('get_full_name', tache.derniere_erreur)
+
+    def test_jobs_of_deleted_invoices_are_dropped(self):
+        tache = TacheFacturePDF.objects.get(facture=self.facture)
+        TacheFacturePDF.objects.filter(pk=tache.pk).update(
+            status='en_cours', date_traitement=timezone.now() - 2 * DELAI_TACHE_BLOQUEE
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM dashboard_facture WHERE id = %s", [self.facture.pk])
+
+        self.assertEqual(requeue_stale_jobs(), 0)
+        self.assertFalse(TacheFacturePDF.objects.exists())
+
+    def test_compiled_template_paginates_multi_line_invoices(self):
+        data = invoice_data(self.facture)
+        data['lignes'] = [[f"Article {i}", 2, '1.50'] for i in range(LIGNES_PAR_PAGE + 1)]
+
+        pdf = render_invoice_pdf(data)
+
+        self.assertTrue(pdf.startswith(b'%PDF-1.4'))
+        self.assertIn(b'/Count 2', pdf)
+        # Parties fixes partagées : un seul form XObject pour toutes les pages
+        self.assertEqual(pdf.count(b'/Subtype /Form'), 1)
+        forme, *pages = pdf_contents(pdf)
+        self.assertIn(b'(EcoDeli)', forme)
+        self.assertEqual(len(pages), 2)
+        self.assertTrue(all(b'/FormXob.statique Do' in page for page in pages))
+        self.assertIn(b'\\(suite\\)', pages[1])
+        self.assertIn(f"(Article {LIGNES_PAR_PAGE})".encode(), pages[1])
+
+    def test_pdf_endpoint_serves_file_to_payer_only(self):
+        client = APIClient()
+        client.force_authenticate(self.payeur)
+        response = client.get(reverse('api:facture-pdf', args=[self.facture.pk]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+        client.force_authenticate(make_user('autre'))
+        response = client.get(reverse('api:facture-pdf', args=[self.facture.pk]))
+        self.assertEqual(response.status_code, 403)
+
+
+class InvoiceExportTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.admin = make_user('admin', 'admin')
+        self.admin.is_staff = True
+        self.admin.save()
+        livreur = make_user('livreur', 'livreur')
+        self.payeurs = [make_user('payeur1'), make_user('payeur2')]
+        for payeur in self.payeurs + self.payeurs[:1]:
+            Paiement.objects.create(montant=Decimal('8.00'), payeur=payeur, beneficiaire=livreur, status='reussi')
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.url = reverse('api:admin-factures-export')
+        self.mois = timezone.localdate().strftime('%Y-%m')
+
+    def test_zip_export_streams_and_renders_missing_pdfs(self):
+        response = self.client.get(self.url, {'mois': self.mois, 'payeur': self.payeurs[0].pk})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        attendues = Facture.objects.filter(paiement__payeur=self.payeurs[0])
+        self.assertEqual(sorted(archive.namelist()), sorted(f"facture_{f.reference}.pdf" for f in attendues))
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(Facture.objects.exclude(pdf_hash='').count(), 2)
+
+    def test_merged_pdf_export_and_validation(self):
+        response = self.client.get(self.url, {'mois': self.mois, 'type': 'pdf'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertIn('attachment', response['Content-Disposition'])
+        contenu = b''.join(response.streaming_content)
+        self.assertTrue(contenu.startswith(b'%PDF'))
+        self.assertIn(b'/Count 3', contenu)
+        self.assertEqual(sum(b'FACTURE' in flux for flux in pdf_contents(contenu)), 3)
+
+        with override_settings(FACTURES_EXPORT_PDF_MAX=2):
+            self.assertEqual(self.client.get(self.url, {'mois': self.mois, 'type': 'pdf'}).status_code, 400)
+            self.assertEqual(self.client.get(self.url, {'mois': self.mois}).status_code, 200)
+            # Même limite pour la commande : le PDF unique est rendu en mémoire
+            with self.assertRaisesMessage(CommandError, "PDF unique limité à 2"):
+                call_command('export_factures', '--mois', self.mois, '--format', 'pdf',
+                             '--output', os.path.join(self.media, 'export.pdf'))
+
+        self.assertEqual(self.client.get(self.url, {'mois': '2026-13'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'mois': self.mois, 'type': 'xls'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'mois': self.mois, 'commercant': 'abc'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'mois': self.mois, 'payeur': '1.5'}).status_code, 400)
+
+
+class BulkNotifyTests(TestCase):
+    def setUp(self):
+        self.livreurs = [make_user(f'livreur{i}', 'livreur') for i in range(5)]
+        self.admins = [make_user(f'admin{i}', 'admin') for i in range(2)]
+
+    def test_segment_broadcast_inserts_in_batches(self):
+        with CaptureQueriesContext(connection) as ctx:
+            total = Notification.bulk_notify(None, "Alerte", "Message", user_type='livreur', batch_size=2)
+
+        self.assertEqual(total, 5)
+        self.assertEqual(
+            set(Notification.objects.values_list('user_id', flat=True)), {u.pk for u in self.livreurs}
+        )
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+
+    def test_users_list_and_queryset(self):
+        self.assertEqual(Notification.bulk_notify(self.admins, "A", "B"), 2)
+        self.assertEqual(
+            Notification.bulk_notify(User.objects.filter(username__startswith='livreur1'), "A", "B"), 1
+        )
+        with self.assertRaises(ValueError):
+            Notification.bulk_notify(self.admins, "A", "B", user_type='admin')
+
+    def test_on_commit_defers_insert(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.assertIsNone(Notification.bulk_notify(self.admins, "A", "B", on_commit=True))
+            self.assertFalse(Notification.objects.exists())
+        # Insertion, puis publication des événements temps réel qu'elle planifie
+        self.assertEqual(len(callbacks), 2)
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_validated_documents_notify_every_admin_once(self):
+        livreur = self.livreurs[0]
+        demande = DemandeValidationLivreur.objects.create(user=livreur)
+        pieces = [
+            PieceJustificative.objects.create(user=livreur, type_piece=type_piece, fichier='x.pdf',
+                                              demande_validation=demande)
+            for type_piece in ('id_card', 'driving_license')
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            for piece in pieces:
+                piece.valider(self.admins[0])
+
+        self.assertEqual(
+            Notification.objects.filter(titre="Nouvelle demande livreur à examiner").count(), len(self.admins)
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            demande.valider(self.admins[0])
+            demande.save()
+        self.assertEqual(Notification.objects.filter(user=livreur, titre="Demande de livreur acceptée").count(), 1)
+
+
+@override_settings(PUSH_DELAI_BASE=0, PUSH_MAX_TENTATIVES=3)
+class PushDispatcherTests(TestCase):
+    def setUp(self):
+        push_backends.outbox.clear()
+        self.users = [make_user(f'livreur{i}', 'livreur') for i in range(3)]
+
+    def _dispatch(self, backend, **kwargs):
+        return async_to_sync(PushDispatcher(backend, **kwargs).run)()
+
+    def test_send_push_only_enqueues(self):
+        envoi = send_push_notification(self.users[0].pk, "Titre", "Message", "/annonces/")
+        self.assertEqual(envoi.status, 'en_attente')
+        self.assertEqual(push_backends.outbox, [])
+
+    def test_same_message_is_batched_per_backend_limit(self):
+        Notification.bulk_notify(self.users, "Nouvelle annonce", "Paris → Lyon", push=True)
+        backend = push_backends.MemoryPushBackend()
+        backend.taille_lot = 2
+
+        total = self._dispatch(backend)
+
+        self.assertEqual((total['traites'], total['envoyes']), (3, 3))
+        self.assertEqual(sorted(len(push['user_ids']) for push in push_backends.outbox), [1, 2])
+        self.assertFalse(EnvoiPush.objects.exclude(status='envoye').exists())
+        self.assertEqual(EnvoiPush.objects.exclude(notification=None).count(), 3)
+
+    def test_transient_failures_are_retried_with_backoff(self):
+        envoi = send_push_notification(self.users[0].pk, "Titre", "Message")
+
+        total = self._dispatch(push_backends.MemoryPushBackend(echecs=2))
+
+        envoi.refresh_from_db()
+        self.assertEqual((envoi.status, envoi.tentatives), ('envoye', 3))
+        self.assertEqual(total['reportes'], 2)
+
+    def test_dead_letter_after_max_attempts_or_permanent_error(self):
+        transitoire = send_push_notification(self.users[0].pk, "A", "B")
+        self._dispatch(push_backends.MemoryPushBackend(echecs=10))
+        transitoire.refresh_from_db()
+        self.assertEqual((transitoire.status, transitoire.tentatives), ('abandonne', 3))
+
+        definitif = send_push_notification(self.users[1].pk, "C", "D")
+        self._dispatch(push_backends.MemoryPushBackend(echecs=1, retry=False))
+        definitif.refresh_from_db()
+        self.assertEqual((definitif.status, definitif.tentatives), ('abandonne', 1))
+        self.assertEqual(push_backends.outbox, [])
+
+    def test_reservation_returns_only_claimed_pushes(self):
+        envoi = send_push_notification(self.users[0].pk, "Titre", "Message")
+        def concurrent(*args):
+            # Un autre dispatcher réserve l'envoi entre la sélection et l'UPDATE
+            EnvoiPush.objects.filter(pk=envoi.pk).update(status='en_cours', jeton='autre')
+            return F(*args)
+
+        with mock.patch('dashboard.services.push_service.F', side_effect=concurrent):
+            self.assertEqual(reserver_envois(10), [])
+
+        EnvoiPush.objects.filter(pk=envoi.pk).update(status='en_attente')
+        self.assertEqual([e['pk'] for e in reserver_envois(10)], [envoi.pk])
+        self.assertEqual(reserver_envois(10), [])
+
+    def test_stale_pushes_count_toward_max_attempts(self):
+        envois = [send_push_notification(user.pk, "Titre", "Message") for user in self.users[:2]]
+        for envoi, tentatives in zip(envois, (1, 3)):
+            EnvoiPush.objects.filter(pk=envoi.pk).update(
+                status='en_cours', tentatives=tentatives, date_traitement=timezone.now() - 2 * DELAI_ENVOI_BLOQUE
+            )
+
+        self.assertEqual(requeue_stale_pushes(max_tentatives=3), 1)
+        self.assertEqual(
+            [EnvoiPush.objects.get(pk=envoi.pk).status for envoi in envois], ['en_attente', 'abandonne']
+        )
+
+
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        self.user = make_user('destinataire')
+        self.autre = make_user('autre')
+        Notification.bulk_notify([self.user, self.autre], "Bienvenue", "Message")
+        for i in range(3):
+            Notification.creer_notification(self.user, f"n{i}", "m")
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+
+    def _compteur(self, user):
+        return User.objects.get(pk=user.pk).notifications_non_lues
+
+    def test_counter_follows_creation_read_and_delete(self):
+        self.assertEqual((self._compteur(self.user), self._compteur(self.autre)), (4, 1))
+
+        notification = Notification.objects.filter(user=self.user).first()
+        notification.lue = True
+        notification.save()
+        self.assertEqual(self._compteur(self.user), 3)
+
+        Notification.objects.filter(user=self.user, lue=False).first().delete()
+        self.assertEqual(self._compteur(self.user), 2)
+
+        User.objects.filter(pk=self.user.pk).update(notifications_non_lues=99)
+        Notification.recompter_non_lues()
+        self.assertEqual(self._compteur(self.user), 2)
+
+    def test_inbox_lists_only_own_notifications(self):
+        response = self.client.get(reverse('api:notification-list'), {'page_size': 2})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+        suivante = self.client.get(response.data['next'])
+        ids = [n['id'] for n in response.data['results'] + suivante.data['results']]
+        self.assertEqual(sorted(ids), sorted(Notification.objects.filter(user=self.user).values_list('pk', flat=True)))
+
+    def test_bulk_mark_read_uses_single_update(self):
+        ids = list(Notification.objects.filter(user=self.user).values_list('pk', flat=True)[:2])
+        ids.append(Notification.objects.get(user=self.autre).pk)
+
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post(reverse('api:notification-marquer-lues'), {'ids': ids}, format='json')
+
+        self.assertEqual(response.data, {'marquees': 2, 'non_lues': 2})
+        updates = [q for q in ctx.captured_queries if q['sql'].startswith('UPDATE "dashboard_notification"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self._compteur(self.autre), 1)
+
+        response = self.client.post(reverse('api:notification-tout-marquer-lu'))
+        self.assertEqual(response.data, {'marquees': 2, 'non_lues': 0})
+        self.client.force_authenticate(User.objects.get(pk=self.user.pk))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(reverse('api:notification-non-lues')).data, {'non_lues': 0})
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        get_broker.cache_clear()
+        self.addCleanup(get_broker.cache_clear)
+        self.client_user = make_user('sse_client')
+        self.livreur = make_user('sse_livreur', 'livreur')
+        self.token = Token.objects.create(user=self.client_user)
+
+    def _evenements(self, user, depuis=0):
+        """Événements publiés sur le canal de `user`, rejoués depuis l'historique du broker."""
+        async def lire():
+            with get_broker().subscribe([canal_utilisateur(user.pk)], depuis) as abonnement:
+                evenements = []
+                while (evenement := abonnement.get_nowait()) is not None:
+                    evenements.append(evenement)
+                return evenements
+        return async_to_sync(lire)()
+
+    def test_signals_publish_after_commit(self):
+        annonce = make_annonce(self.client_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            livraison = make_livraison(self.livreur, self.client_user, annonce)
+            Notification.creer_notification(self.client_user, "Bonjour", "Message")
+            self.assertEqual(self._evenements(self.client_user), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            livraison = Livraison.objects.get(pk=livraison.pk)
+            livraison.status = 'en_cours'
+            livraison.save()
+            livraison.save()  # Sans changement de statut : rien de plus
+
+        evenements = self._evenements(self.client_user)
+        self.assertEqual([e['type'] for e in evenements], ['livraison', 'notification', 'livraison'])
+        self.assertEqual(evenements[-1]['donnees']['ancien_status'], 'en_attente')
+        self.assertEqual(len(self._evenements(self.livreur)), 2)
+        self.assertEqual(self._evenements(self.client_user, depuis=evenements[1]['id']), evenements[2:])
+
+    async def test_stream_pushes_published_events(self):
+        response = await self.async_client.get(
+            reverse('api:evenements'), headers={'Authorization': f'Token {self.token.key}'}
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        flux = aiter(response.streaming_content)
+        self.assertEqual(await anext(flux), b'retry: 3000\n\n')
+
+        get_broker().publish([
+            (canal_utilisateur(self.livreur.pk), 'notification', {'titre': 'Autre'}),
+            (canal_utilisateur(self.client_user.pk), 'notification', {'titre': 'Bonjour'}),
+        ])
+        trame = (await anext(flux)).decode()
+        self.assertIn('event: notification\ndata: {"titre": "Bonjour"}\n\n', trame)
+
+        # Déconnexion du client : le serveur ASGI annule la lecture en cours
+        lecture = asyncio.ensure_future(anext(flux))
+        await asyncio.sleep(0)
+        lecture.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await lecture
+        self.assertEqual(get_broker().nombre_abonnes(), 0)
+
+    @override_settings(EVENTS_ATTENTE_WSGI=0.01)
+    def test_wsgi_fallback_long_polls_and_replays(self):
+        self.assertEqual(self.client.get(reverse('api:evenements')).status_code, 401)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Notification.bulk_notify([self.client_user], "Promo", "Message")
+        dernier = self._evenements(self.client_user)[-1]['id']
+        url = reverse('api:evenements')
+        response = self.client.get(url, {'token': self.token.key, 'depuis': dernier - 1})
+        self.assertIn(f'id: {dernier}\nevent: notification', response.content.decode())
+        response = self.client.get(url, HTTP_LAST_EVENT_ID=str(dernier), HTTP_AUTHORIZATION=f'Token {self.token.key}')
+        self.assertEqual(response.content, b'retry: 500\n\n')
+
+
+class RetentionTests(TestCase):
+    CONFIG = {
+        'notification': {
+            '*': {'jours': 30, 'action': 'supprimer'},
+            'error': {'jours': 60, 'action': 'archiver'},
+            'warning': {'jours': None},
+        },
+        'logconnexion': {'*': {'jours': 90, 'action': 'archiver'}},
+    }
+
+    def setUp(self):
+        self.archive_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.archive_dir, ignore_errors=True)
+        self.user = make_user('retention')
+        self.autre = make_user('retention_autre')
+
+    def _notification(self, user, jours, type_notification='info', lue=False):
+        notification = Notification.creer_notification(user, f"{type_notification} {jours}", "m", type_notification)
+        if lue:
+            Notification.marquer_lues(user, [notification.pk])
+        Notification.objects.filter(pk=notification.pk).update(
+            date_creation=timezone.now() - datetime.timedelta(days=jours)
+        )
+        return notification
+
+    def test_policies_delete_or_archive_by_type_and_adjust_counters(self):
+        vieille = self._notification(self.user, 40)
+        self._notification(self.user, 40, lue=True)
+        self._notification(self.autre, 45)
+        recente = self._notification(self.user, 10)
+        erreur = self._notification(self.user, 50, 'error')
+        ancienne_erreur = self._notification(self.autre, 70, 'error')
+        conservee = self._notification(self.user, 400, 'warning')
+        envoi = EnvoiPush.objects.create(user=self.user, notification=vieille, titre="t", message="m")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            resultats = appliquer_retention(
+                ['notification'], self.CONFIG, batch_size=2, archive_dir=self.archive_dir
+            )
+
+        self.assertEqual({r['politique']: r['lignes'] for r in resultats}, {'notification.*': 3, 'notification.error': 1})
+        self.assertCountEqual(
+            Notification.objects.values_list('pk', flat=True), [recente.pk, conservee.pk, erreur.pk]
+        )
+        envoi.refresh_from_db()
+        self.assertIsNone(envoi.notification_id)
+        # Compteurs : seules les non lues supprimées sont décomptées
+        self.assertEqual(User.objects.get(pk=self.user.pk).notifications_non_lues, 3)
+        self.assertEqual(User.objects.get(pk=self.autre.pk).notifications_non_lues, 0)
+
+        archive = resultats[1]['fichier']
+        with gzip.open(archive, 'rt', encoding='utf-8') as f:
+            lignes = [json.loads(ligne) for ligne in f]
+        self.assertEqual([(l['id'], l['user_id']) for l in lignes], [(ancienne_erreur.pk, self.autre.pk)])
+
+    def test_command_archives_connection_logs_in_batches(self):
+        for jours in (100, 120, 150, 5):
+            log = LogConnexion.objects.create(user=self.user, adresse_ip='127.0.0.1', navigateur='n', systeme_exploitation='s')
+            LogConnexion.objects.filter(pk=log.pk).update(date_connexion=timezone.now() - datetime.timedelta(days=jours))
+
+        sortie = io.StringIO()
+        with override_settings(RETENTION=self.CONFIG):
+            call_command('appliquer_retention', '--modele', 'logconnexion', '--dry-run', stdout=sortie)
+            self.assertEqual(LogConnexion.objects.count(), 4)
+            with self.captureOnCommitCallbacks(execute=True):
+                call_command('appliquer_retention', '--modele', 'logconnexion', '--batch-size', '2',
+                             '--archive-dir', self.archive_dir, stdout=sortie)
+
+        self.assertIn("logconnexion.* : 3 lignes concernées", sortie.getvalue())
+        self.assertIn("lignes/s), archivées dans", sortie.getvalue())
+        self.assertEqual(LogConnexion.objects.count(), 1)
+        (archive,) = os.listdir(self.archive_dir)
+        with gzip.open(os.path.join(self.archive_dir, archive), 'rt', encoding='utf-8') as f:
+            self.assertEqual(len(f.readlines()), 3)
+        with self.assertRaises(ValueError):
+            politiques({'logconnexion': {'reussi': {'jours': 1}}})
+
+    def test_failed_batch_is_not_archived(self):
+        ancienne = self._notification(self.user, 70, 'error')
+        config = {'notification': {'error': {'jours': 60, 'action': 'archiver'}}}
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks, \
+                mock.patch('dashboard.services.retention._supprimer', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                appliquer_retention(['notification'], config, archive_dir=self.archive_dir)
+
+        self.assertEqual(callbacks, [])
+        self.assertEqual(os.listdir(self.archive_dir), [])
+        self.assertTrue(Notification.objects.filter(pk=ancienne.pk).exists())
+
+
+class ConversationTests(TestCase):
+    def setUp(self):
+        self.client_user = make_user('conv_client')
+        self.livreur = make_user('conv_livreur', 'livreur')
+        self.autre = make_user('conv_autre', 'livreur')
+        self.annonce = make_annonce(self.client_user)
+        self.api = APIClient()
+
+    def _envoyer(self, sender, receiver, content, annonce=None):
+        return Message.objects.create(sender=sender, receiver=receiver, annonce=annonce or self.annonce, content=content)
+
+    def test_inbox_orders_by_activity_with_unread_counts(self):
+        self._envoyer(self.livreur, self.client_user, "Bonjour")
+        self._envoyer(self.client_user, self.livreur, "Bonjour, oui ?")
+        dernier = self._envoyer(self.livreur, self.client_user, "Je peux livrer demain")
+        self._envoyer(self.autre, self.client_user, "Toujours disponible ?")
+        self.assertEqual(Conversation.objects.count(), 2)
+
+        self.api.force_authenticate(self.client_user)
+        with self.assertNumQueries(2):
+            response = self.api.get(reverse('api:conversation-list'))
+        inbox = response.data['results']
+        self.assertEqual([c['interlocuteurs'][0]['username'] for c in inbox], ['conv_autre', 'conv_livreur'])
+        self.assertEqual([c['non_lus'] for c in inbox], [1, 2])
+        self.assertEqual((inbox[1]['dernier_message'], inbox[1]['apercu'], inbox[1]['nombre_messages']),
+                         (dernier.pk, "Je peux livrer demain", 3))
+
+        conversation = inbox[1]['id']
+        response = self.api.get(reverse('api:conversation-messages', args=[conversation]), {'page_size': 2})
+        self.assertEqual([m['content'] for m in response.data['results']], ["Je peux livrer demain", "Bonjour, oui ?"])
+        self.assertEqual([m['content'] for m in self.api.get(response.data['next']).data['results']], ["Bonjour"])
+
+        response = self.api.post(reverse('api:conversation-marquer-lue', args=[conversation]))
+        self.assertEqual(response.data, {'marques': 2})
+        self.assertEqual(self.api.get(reverse('api:conversation-detail', args=[conversation])).data['non_lus'], 0)
+
+        # Un tiers ne voit ni la conversation ni son historique
+        self.api.force_authenticate(self.autre)
+        self.assertEqual(self.api.get(reverse('api:conversation-messages', args=[conversation])).status_code, 404)
+        self.assertEqual(len(self.api.get(reverse('api:conversation-list')).data['results']), 1)
+
+    def test_message_api_is_scoped_to_the_requesting_user(self):
+        message = self._envoyer(self.livreur, self.client_user, "Bonjour")
+        self._envoyer(self.autre, self.livreur, "Privé", make_annonce(self.livreur))
+
+        self.api.force_authenticate(self.client_user)
+        response = self.api.get(reverse('api:message-list'))
+        self.assertEqual([m['id'] for m in response.data['results']], [message.pk])
+        self.assertEqual(self.api.patch(reverse('api:message-detail', args=[message.pk]), {'content': 'x'}).status_code, 404)
+
+        response = self.api.post(reverse('api:message-list'), {
+            'sender': self.autre.pk, 'receiver': self.livreur.pk, 'annonce': self.annonce.pk, 'content': "Merci"
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['sender'], response.data['conversation']), (self.client_user.pk, message.conversation_id))
+        self.assertEqual(self.api.post(reverse('api:message-list'), {
+            'receiver': self.client_user.pk, 'annonce': self.annonce.pk, 'content': "Moi"
+        }).status_code, 400)
+
+
+class MessageUpdatesTests(TestCase):
+    def setUp(self):
+        get_broker.cache_clear()
+        self.addCleanup(get_broker.cache_clear)
+        self.client_user = make_user('maj_client')
+        self.livreur = make_user('maj_livreur', 'livreur')
+        self.annonce = make_annonce(self.client_user)
+        self.token = Token.objects.create(user=self.client_user)
+        self.api = APIClient()
+        self.api.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _envoyer(self, content):
+        return Message.objects.create(sender=self.livreur, receiver=self.client_user, annonce=self.annonce, content=content)
+
+    def test_returns_messages_after_cursor(self):
+        premier = self._envoyer("Un")
+        url = reverse('api:message-updates')
+        self.assertEqual(self.api.get(url).json(), {'results': [], 'cursor': str(premier.pk), 'suite': False})
+
+        deuxieme = self._envoyer("Deux")
+        Message.objects.create(sender=self.livreur, receiver=make_user('maj_tiers'), annonce=self.annonce, content="Autre")
+        data = self.api.get(url, {'since': premier.pk}).json()
+        self.assertEqual(([m['content'] for m in data['results']], data['cursor']), (["Deux"], str(deuxieme.pk)))
+        data = self.api.get(url, {'since': deuxieme.pk, 'timeout': 0}).json()
+        self.assertEqual((data['results'], data['cursor']), ([], str(deuxieme.pk)))
+        self.assertEqual(self.api.get(url, {'since': 'x'}).status_code, 400)
+        for timeout in ('nan', 'inf', '-inf'):
+            self.assertEqual(self.api.get(url, {'since': 0, 'timeout': timeout}).status_code, 400)
+
+    async def test_long_poll_wakes_up_on_new_message(self):
+        requete = asyncio.ensure_future(self.async_client.get(
+            reverse('api:message-updates'), {'since': 0, 'timeout': 10},
+            headers={'Authorization': f'Token {self.token.key}'}
+        ))
+        while not get_broker().nombre_abonnes():
+            await asyncio.sleep(0.01)
+        debut = time.monotonic()
+        message = await sync_to_async(self._envoyer)("En direct")
+        get_broker().publish([(canal_utilisateur(self.client_user.pk), 'message', {'id': message.pk})])
+
+        data = (await requete).json()
+        self.assertLess(time.monotonic() - debut, 5)
+        self.assertEqual(([m['id'] for m in data['results']], data['cursor']), ([message.pk], str(message.pk)))
+
+
+class AnnonceSearchTests(TestCase):
+    def setUp(self):
+        self.client_user = make_user('recherche_client')
+        self.api = APIClient()
+        self.api.force_authenticate(make_user('recherche_livreur', 'livreur'))
+        self.demain = timezone.now() + datetime.timedelta(days=1)
+
+    def _annonce(self, titre, depart, arrivee, jours=1, **kwargs):
+        date = self.demain + datetime.timedelta(days=jours - 1)
+        kwargs.setdefault('poids', Decimal('5'))
+        return make_annonce(self.client_user, titre, depart=depart, arrivee=arrivee,
+                            date_depart=date, date_arrivee=date + datetime.timedelta(hours=3), **kwargs)
+
+    def _titres(self, url, params):
+        response = self.api.get(url, params)
+        self.assertEqual(response.status_code, 200, response.data)
+        return [a['titre'] for a in response.data['results']], response.data['next']
+
+    def test_filters_on_normalized_cities_and_ranks(self):
+        self._annonce('exacte', 'Saint-Étienne', '12 rue Mercière, 69002 Lyon', jours=3)
+        self._annonce('urgente', 'ST ETIENNE', 'Lyon 3e', jours=2, est_urgente=True)
+        self._annonce('prefixe', 'Saint-Étienne-de-Tinée', 'Lyon', jours=1)
+        self._annonce('lourde', 'Saint-Etienne', 'Lyon', poids=Decimal('40'))
+        self._annonce('autre arrivée', 'Saint-Etienne', 'Paris')
+        self._annonce('passée', 'Saint-Etienne', 'Lyon', jours=-3)
+        self._annonce('terminée', 'Saint-Etienne', 'Lyon', status='terminee')
+        self._annonce('service', 'Saint-Etienne', 'Lyon', type_annonce='service')
+
+        url = reverse('api:annonce-recherche')
+        titres, _ = self._titres(url, {'depart': 'saint étienne', 'arrivee': 'LYON', 'type': 'colis', 'poids_max': '30'})
+        # Villes exactes + urgente, villes exactes (départ le plus proche d'abord), départ par préfixe
+        self.assertEqual(titres, ['urgente', 'exacte', 'prefixe'])
+
+        titres, _ = self._titres(url, {'arrivee': 'lyon', 'urgente': 'oui'})
+        self.assertEqual(titres, ['urgente'])
+        date = (self.demain + datetime.timedelta(days=1)).date().isoformat()
+        titres, _ = self._titres(url, {'depart': 'st etienne', 'arrivee': 'lyon', 'date_min': date, 'date_max': date})
+        self.assertEqual(titres, ['urgente'])
+        self.assertEqual(self.api.get(url, {'poids_min': 'lourd'}).status_code, 400)
+
+        annonce = Annonce.objects.get(titre='autre arrivée')
+        annonce.arrivee = 'Évry-Courcouronnes'
+        annonce.save(update_fields=['arrivee'])
+        self.assertEqual(Annonce.objects.get(pk=annonce.pk).arrivee_ville, 'evry courcouronnes')
+
+    def test_keyset_cursor_walks_ties_without_duplicates(self):
+        for i in range(7):
+            self._annonce(f'a{i}', 'Paris', 'Lille', jours=1 + i % 2, est_urgente=i % 3 == 0)
+        url = reverse('api:annonce-available')
+        vus, suivante = self._titres(url, {'depart': 'paris', 'page_size': 3})
+        while suivante:
+            titres, suivante = self._titres(suivante, {})
+            vus += titres
+        self.assertEqual(vus, ['a0', 'a6', 'a3', 'a2', 'a4', 'a1', 'a5'])
+        self.assertEqual(self.api.get(url, {'cursor': 'invalide'}).status_code, 404)
+
+
+class ProximiteTests(TestCase):
+    def setUp(self):
+        self.client_user = make_user('proxi_client')
+        self.api = APIClient()
+        self.api.force_authenticate(self.client_user)
+
+    def _livreur(self, username, zones, verified=True, disponible=True):
+        livreur = make_user(username, 'livreur').livreur_profile
+        livreur.zones_livraison = zones
+        livreur.verified = verified
+        livreur.disponible = disponible
+        livreur.save()
+        return livreur
+
+    def test_geocoding_from_bundled_gazetteer(self):
+        self.assertGreater(len(gazetteer()), 100)
+        self.assertAlmostEqual(haversine(48.8566, 2.3522, 45.7640, 4.8357), 392, delta=2)
+        # Nom de commune, puis code postal exact, puis département
+        self.assertEqual(gazetteer().localiser('12 rue Mercière, 69002 Lyon'), (45.7640, 4.8357))
+        self.assertEqual(gazetteer().localiser('75015'), (48.8566, 2.3522))
+        self.assertIsNone(gazetteer().localiser('Atlantide'))
+
+        entrepot = Entrepot.objects.create(nom='Hub', adresse='1 quai', ville='Bordeaux', code_postal='33000',
+                                           capacite_totale=10)
+        self.assertEqual((entrepot.latitude, entrepot.longitude), (44.8378, -0.5792))
+        annonce = make_annonce(self.client_user, depart='Atlantide', arrivee='Lille')
+        self.assertIsNone(annonce.depart_cellule)
+        annonce.depart = 'Versailles'
+        annonce.save(update_fields=['depart'])
+        annonce = Annonce.objects.get(pk=annonce.pk)
+        self.assertEqual((annonce.depart_latitude, annonce.arrivee_latitude), (48.8049, 50.6292))
+
+    def test_nearby_annonces_ranked_by_distance(self):
+        for titre, depart in [('lyon', 'Lyon'), ('versailles', 'Versailles'), ('paris', '10 rue de Rivoli, 75004 Paris'),
+                              ('boulogne', 'Boulogne-Billancourt'), ('inconnue', 'Atlantide')]:
+            make_annonce(self.client_user, titre, depart=depart)
+        make_annonce(self.client_user, 'terminée', depart='Paris', status='terminee')
+
+        url = reverse('api:annonce-proximite')
+        response = self.api.get(url, {'ville': 'Paris', 'rayon': 30})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([a['titre'] for a in response.data['results']], ['paris', 'boulogne', 'versailles'])
+        self.assertAlmostEqual(response.data['results'][2]['distance_km'], 17, delta=1)
+
+        response = self.api.get(url, {'lat': 45.75, 'lon': 4.85, 'limite': 1})
+        self.assertEqual([a['titre'] for a in response.data['results']], ['lyon'])
+        self.assertEqual(self.api.get(url, {'lat': 'nord'}).status_code, 400)
+        self.assertEqual(self.api.get(url, {'ville': 'Atlantide'}).status_code, 400)
+
+    def test_candidate_couriers_from_geocoded_zones(self):
+        proche = self._livreur('proxi_proche', 'Boulogne-Billancourt; Lyon')
+        loin = self._livreur('proxi_loin', 'Versailles')
+        self._livreur('proxi_non_verifie', 'Paris', verified=False)
+        self._livreur('proxi_indisponible', 'Paris', disponible=False)
+        self._livreur('proxi_lyon', 'Lyon')
+        self.assertEqual(ZoneLivreur.objects.filter(livreur=proche).count(), 2)
+        annonce = make_annonce(self.client_user, depart='Paris')
+
+        url = reverse('api:annonce-livreurs-candidats', args=[annonce.pk])
+        response = self.api.get(url, {'rayon': 25})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([(l['username'], l['zone']) for l in response.data['results']],
+                         [('proxi_proche', 'Boulogne-Billancourt'), ('proxi_loin', 'Versailles')])
+
+        loin.zones_livraison = 'Marseille'
+        loin.save(update_fields=['zones_livraison'])
+        self.assertEqual(list(loin.zones.values_list('libelle', flat=True)), ['Marseille'])
+        response = self.api.get(url, {'rayon': 25})
+        self.assertEqual([l['username'] for l in response.data['results']], ['proxi_proche'])
+
+        autre = APIClient()
+        autre.force_authenticate(make_user('proxi_autre'))
+        self.assertEqual(autre.get(url).status_code, 403)
+
+
+class FullTextSearchTests(TestCase):
+    def setUp(self):
+        self.auteur = make_user('plein_texte_auteur')
+        self.api = APIClient()
+        self.api.force_authenticate(self.auteur)
+
+    def _titres(self, texte):
+        return sorted(Annonce.objects.filter(filtre_recherche('annonce', texte)).values_list('titre', flat=True))
+
+    def test_index_follows_saves_and_deletes(self):
+        annonce = make_annonce(self.auteur, 'Déménagement', description='Cartons fragiles', depart='Saint-Étienne')
+        make_annonce(self.auteur, 'Courses', description='Épicerie du quartier')
+        self.assertEqual(self._titres('DEMENAG etienne'), ['Déménagement'])
+        self.assertEqual(self._titres('epicerie'), ['Courses'])
+        self.assertEqual(self._titres('fragile lyon'), ['Déménagement'])  # Arrivée par défaut : Lyon
+        # Nom de l'auteur : via l'index des utilisateurs
+        self.assertEqual(self._titres('plein_texte'), ['Courses', 'Déménagement'])
+
+        annonce.titre = 'Piano'
+        annonce.save(update_fields=['titre'])
+        self.assertEqual(self._titres('demenagement'), [])
+        self.assertEqual(self._titres('piano'), ['Piano'])
+        annonce.delete()
+        self.assertEqual(self._titres('piano'), [])
+
+        # Les mises à jour en masse n'émettent pas de signaux : reconstruction par commande
+        Annonce.objects.update(titre='Vélo')
+        self.assertEqual(self._titres('velo'), [])
+        call_command('reindexer_recherche', 'annonce', stdout=io.StringIO())
+        self.assertEqual(self._titres('velo'), ['Vélo'])
+
+    def test_search_endpoints_rank_and_scope_results(self):
+        make_annonce(self.auteur, 'Livraison de meubles', description='Canapé')
+        make_annonce(self.auteur, 'Colis', description='Livraison rapide')
+        make_annonce(self.auteur, 'Livraison terminée', status='terminee')
+        prestataire = make_user('plein_texte_presta')
+        Service.objects.create(nom='Livraison de courses', description='Le samedi', type_service='courses',
+                               prestataire=prestataire, prix=Decimal('15.00'))
+
+        url = reverse('api:recherche')
+        response = self.api.get(url, {'q': 'livraison'})
+        self.assertEqual(response.status_code, 200)
+        # Le titre pèse plus que la description ; annonces non actives exclues
+        self.assertEqual([a['titre'] for a in response.data['annonces']], ['Livraison de meubles', 'Colis'])
+        self.assertEqual([s['nom'] for s in response.data['services']], ['Livraison de courses'])
+        self.assertNotIn('utilisateurs', response.data)
+        self.assertEqual(self.api.get(url, {'q': ' !? '}).status_code, 400)
+
+        admin = make_user('plein_texte_admin', 'admin')
+        admin.is_staff = True
+        admin.save()
+        self.api.force_authenticate(admin)
+        response = self.api.get(url, {'q': 'presta'})
+        self.assertEqual([u['username'] for u in response.data['utilisateurs']], ['plein_texte_presta'])
+
+        response = self.api.get(reverse('api:annonce-list'), {'q': 'canape'})
+        self.assertEqual([a['titre'] for a in response.data['results']], ['Livraison de meubles'])
+
+    def test_admin_and_client_search_use_index(self):
+        client = make_user('plein_texte_client')
+        client.last_name = 'Lefèvre'
+        client.save()
+        admin = User.objects.create_superuser('plein_texte_root', 'root@example.com', 'test1234')
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse('admin:dashboard_user_changelist'), {'q': 'lefevre'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        # Filtre de recherche_clients (le gabarit clients.html référence des vues absentes)
+        clients = User.objects.filter(filtre_recherche('user', 'LEFEVRE'), user_type='client')
+        self.assertEqual([c.username for c in clients], ['plein_texte_client'])
+
+
+@override_settings(VUES_FLUSH_INTERVAL=3600, VUES_FLUSH_MAX=3)
+class VuesAnnonceTests(TestCase):
+    def setUp(self):
+        get_compteur.cache_clear()
+        self.auteur = make_user('vues_auteur')
+        self.visiteur = make_user('vues_visiteur')
+        self.api = APIClient()
+        self.api.force_authenticate(self.visiteur)
+
+    def tearDown(self):
+        # Rien ne doit rester en attente pour l'écriture à l'arrêt du processus
+        get_compteur().vider()
+        get_compteur.cache_clear()
+
+    def test_views_buffered_then_flushed_in_one_update(self):
+        annonce = make_annonce(self.auteur, vues=5)
+        url = reverse('api:annonce-detail', args=[annonce.pk])
+        with CaptureQueriesContext(connection) as queries:
+            for _ in range(3):
+                response = self.api.get(url)
+        self.assertEqual(response.data['vues'], 8)
+        self.assertFalse([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')])
+        auteur = APIClient()
+        auteur.force_authenticate(self.auteur)
+        self.assertEqual(auteur.get(url).data['vues'], 8)
+        self.assertEqual(Annonce.objects.get(pk=annonce.pk).vues, 5)
+
+        autre = make_annonce(self.auteur, 'autre')
+        self.api.get(reverse('api:annonce-detail', args=[autre.pk]))
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(ecrire_vues(), 2)
+        self.assertEqual(len([q for q in queries.captured_queries if q['sql'].startswith('UPDATE')]), 1)
+        self.assertEqual(Annonce.objects.get(pk=annonce.pk).vues, 8)
+        self.assertEqual(Annonce.objects.get(pk=autre.pk).vues, 1)
+        self.assertEqual(ecrire_vues(), 0)
+
+        # VUES_FLUSH_MAX annonces en attente : la vue suivante écrit le tampon
+        for titre in ('a', 'b', 'c'):
+            self.api.get(reverse('api:annonce-detail', args=[make_annonce(self.auteur, titre).pk]))
+        self.assertEqual(Annonce.objects.filter(titre__in=['a', 'b', 'c'], vues=1).count(), 3)
+
+    def test_trending_over_sliding_window(self):
+        compteur = MemoryCompteur(fenetre=600, pas=60)
+        for annonce_id, instant in [(1, 0), (1, 10), (1, 30), (2, 300), (2, 320), (3, 650)]:
+            compteur.enregistrer(annonce_id, instant)
+        self.assertEqual(compteur.tendances(10, instant=650), [(1, 3), (2, 2), (3, 1)])
+        self.assertEqual(compteur.tendances(10, fenetre=60, instant=650), [(3, 1)])
+        # La tranche [0, 60) sort de la fenêtre ; le tampon à écrire n'est pas concerné
+        self.assertEqual(compteur.tendances(10, instant=700), [(2, 2), (3, 1)])
+        self.assertEqual(compteur.vider(), {1: 3, 2: 2, 3: 1})
+
+        populaire = make_annonce(self.auteur, 'populaire')
+        moyenne = make_annonce(self.auteur, 'moyenne')
+        terminee = make_annonce(self.auteur, 'terminée', status='terminee')
+        for annonce, nombre in [(populaire, 3), (moyenne, 1), (terminee, 5)]:
+            for _ in range(nombre):
+                get_compteur().enregistrer(annonce.pk)
+        response = self.api.get(reverse('api:annonce-tendances'), {'limite': 5})
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([(a['titre'], a['vues_recentes']) for a in response.data['results']],
+                         [('populaire', 3), ('moyenne', 1)])
+        self.assertEqual(self.api.get(reverse('api:annonce-tendances'), {'fenetre': 'x'}).status_code, 400)
+
+
+class AffectationTests(TestCase):
+    def setUp(self):
+        self.client_user = make_user('affect_client')
+        self.livreurs = [make_user(f'affect_livreur_{i}', 'livreur') for i in range(3)]
+        self.annonce = make_annonce(self.client_user)
+
+    def _offres(self, annonce):
+        return [make_livraison(livreur, self.client_user, annonce) for livreur in self.livreurs]
+
+    def _stats(self):
+        return dict(StatLivraisonJour.objects.filter(nombre__gt=0).values_list('status', 'nombre'))
+
+    def test_accept_offer_cancels_competitors_in_one_transaction(self):
+        offres = self._offres(self.annonce)
+        # Une offre ne réserve ni l'annonce ni le compteur du livreur
+        self.assertEqual(Annonce.objects.get(pk=self.annonce.pk).status, 'active')
+        self.assertEqual(self.livreurs[0].livreur_profile.nombre_livraisons, 0)
+
+        livreur_api = APIClient()
+        livreur_api.force_authenticate(self.livreurs[1])
+        url = reverse('api:livraison-valider', args=[offres[1].pk])
+        self.assertEqual(livreur_api.post(url).status_code, 403)
+
+        api = APIClient()
+        api.force_authenticate(self.client_user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = api.post(url)
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual([Livraison.objects.get(pk=o.pk).status for o in offres], ['annulee', 'en_cours', 'annulee'])
+        self.assertEqual(Annonce.objects.get(pk=self.annonce.pk).status, 'en_cours')
+        self.assertEqual([User.objects.get(pk=l.pk).livreur_profile.nombre_livraisons for l in self.livreurs], [0, 1, 0])
+        self.assertEqual(self._stats(), {'en_cours': 1, 'annulee': 2})
+
+        # Cache KPI invalidé après le COMMIT seulement
+        cache.clear()
+        get_home_kpis()
+        with self.captureOnCommitCallbacks(execute=True):
+            affecter_en_masse([self._offres(make_annonce(self.client_user))[0].pk])
+            with self.assertNumQueries(0):
+                get_home_kpis()
+        self.assertEqual(get_home_kpis()['stats']['livraisons_en_cours'], 2)
+
+        # Offre concurrente acceptée après coup : refusée, rien ne change
+        response = api.post(reverse('api:livraison-valider', args=[offres[2].pk]))
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Livraison.objects.get(pk=offres[1].pk).status, 'en_cours')
+        self.assertEqual(User.objects.get(pk=self.livreurs[2].pk).livreur_profile.nombre_livraisons, 0)
+
+    def test_bulk_assignment_with_constant_query_count(self):
+        def lot(nombre):
+            choix = []
+            for _ in range(nombre):
+                offres = self._offres(make_annonce(self.client_user))
+                choix.append(offres[0].pk)
+            return choix
+
+        # Premier lot : crée les cumuls journaliers
+        affecter_en_masse(lot(1))
+        petit, grand = lot(2), lot(10)
+        with CaptureQueriesContext(connection) as petit_queries:
+            affecter_en_masse(petit)
+        with CaptureQueriesContext(connection) as grand_queries:
+            acceptees, refus = affecter_en_masse(grand)
+        self.assertEqual(len(grand_queries), len(petit_queries))
+        self.assertEqual(len(acceptees), 10)
+        self.assertEqual(User.objects.get(pk=self.livreurs[0].pk).livreur_profile.nombre_livraisons, 13)
+
+        offres = self._offres(self.annonce)
+        admin = make_user('affect_admin', 'admin')
+        api = APIClient()
+        api.force_authenticate(admin)
+        url = reverse('api:livraison-affecter')
+        response = api.post(url, {'livraisons': [offres[0].pk, offres[1].pk, grand[0], 999999]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['acceptees'], [offres[0].pk])
+        self.assertEqual(set(response.data['refusees']), {str(offres[1].pk), str(grand[0]), '999999'})
+        self.assertEqual(api.post(url, {'livraisons': 'tout'}, format='json').status_code, 400)
+
+        api.force_authenticate(self.client_user)
+        self.assertEqual(api.post(url, {'livraisons': [offres[2].pk]}, format='json').status_code, 403)
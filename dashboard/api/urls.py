@@ -10,6 +10,8 @@ router.register('users', views.UserViewSet)
 router.register('livraisons', views.LivraisonViewSet)
 router.register('annonces', views.AnnonceViewSet)
 router.register('messages', views.MessageViewSet, basename='message')    #By Oceane
+router.register('conversations', views.ConversationViewSet, basename='conversation')
+router.register('notifications', views.NotificationViewSet, basename='notification')
 
 
 # ViewSets spécifiques par type d'utilisateur
@@ -28,6 +30,9 @@ admin_router.register('pieces-justificatives', views.AdminPieceJustificativeView
 app_name = 'api'
 
 urlpatterns = [
+    # Avant le routeur, qui prendrait « updates » pour un id de message
+    path('messages/updates/', views.messages_updates, name='message-updates'),
+
     # Inclure les routes générées par le routeur principal
     path('', include(router.urls)),
     
@@ -42,6 +47,9 @@ urlpatterns = [
     # Route de test de connexion
     path('test-connection/', views.test_connection, name='test-connection'),
     
+    # Recherche plein texte
+    path('recherche/', views.recherche, name='recherche'),
+
     # Route pour les statistiques
     path('stats/monthly-revenue/', views.monthly_revenue, name='monthly-revenue'),
     
@@ -50,4 +58,10 @@ urlpatterns = [
     path('admin/dashboard-stats/', views.admin_dashboard_stats, name='admin-dashboard-stats'),
     path('admin/financial-report/monthly/<int:year>/', views.admin_monthly_financial_report, name='admin-monthly-financial-report'),
     path('admin/financial-report/yearly/', views.admin_yearly_financial_report, name='admin-yearly-financial-report'),
+    path('admin/kpi-cache-stats/', views.admin_kpi_cache_stats, name='admin-kpi-cache-stats'),
+    path('admin/request-profile/', views.admin_request_profile, name='admin-request-profile'),
+    path('admin/factures/export/', views.admin_factures_export, name='admin-factures-export'),
+    path('factures/<int:pk>/pdf/', views.facture_pdf, name='facture-pdf'),
+    path('evenements/', views.evenements, name='evenements'),
+    path('admin/paiements/import/', views.AdminPaiementImportView.as_view(), name='admin-paiements-import'),
 ]
\ No newline at end of file
@@ -3,43 +3,184 @@ from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from rest_framework.authtoken.models import Token
+from django.conf import settings
 from django.contrib.auth import authenticate
-from django.db.models import Sum, Count, Q
+from django.db.models import Sum, Count, Q, Min, Prefetch
 from django.utils import timezone
 import datetime
 # Ajoutez ces imports nécessaires
 from rest_framework.views import APIView
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django.db import transaction
-from dashboard.models import User, Livreur, DemandeValidationLivreur, PieceJustificative, Livraison, Paiement, Annonce, Contrat, Service
+from dashboard.models import User, Livreur, DemandeValidationLivreur, PieceJustificative, Livraison, Paiement, Annonce, Contrat, Service, Facture
 from .serializers import (
     UserSerializer, LivraisonSerializer, AnnonceSerializer, PaiementSerializer,
-    ContratSerializer, ServiceSerializer, PieceJustificativeSerializer
+    ContratSerializer, ServiceSerializer, PieceJustificativeSerializer,
+    AnnonceProcheSerializer, AnnonceTendanceSerializer, LivreurCandidatSerializer
 )
-from dashboard.services.stats_service import get_monthly_revenue
+from dashboard.services.stats_service import get_monthly_revenue, get_time_series, get_yearly_series
+from dashboard.services.kpi_cache import get_kpi_cache_stats
+from dashboard.services.profiling import store as profile_store
+from dashboard.services.payment_ingestion import IngestionError, ingest_payments, read_payment_rows
+from dashboard.services.invoice_pdf import ensure_invoice_pdf, factures_a_rendre, invoice_pdf_path
+from dashboard.services.invoice_export import (
+    FORMATS, check_pdf_size, export_filename, factures_exportees, identifiant, invoices_pdf_chunks, periode,
+    stream_invoices_zip
+)
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+from asgiref.sync import sync_to_async
+from dashboard.services.affectation_service import AffectationError, accepter_offre, affecter_en_masse
+from dashboard.services.annonce_search import ORDRE_RECHERCHE, rechercher_annonces
+from dashboard.services.proximite import annonces_proches, lire_nombre, lire_point, livreurs_candidats
+from dashboard.services.recherche_texte import rechercher, termes
+from dashboard.services.vues import annonces_tendance, compter_vue, vues_totales
+from dashboard.services.events import AbonnementDeborde, canal_utilisateur, get_broker
+import json
+import math
+import time
+from django.shortcuts import get_object_or_404
+from .pagination import AdminPagination, DefaultCursorPagination, KeysetCursorPagination
+from .query_plans import QueryPlanMixin
+from .filters import RechercheTexteFilter
 
 
-from .serializers import MessageSerializer
-from dashboard.models import Message
+from .serializers import ConversationSerializer, MessageSerializer
+from dashboard.models import Message, ParticipantConversation
 from rest_framework.exceptions import ValidationError
+from rest_framework import status
 from rest_framework import status as drf_status
 
 
 
 class MessageViewSet(viewsets.ModelViewSet):
-    queryset = Message.objects.all()
+    """Messages envoyés ou reçus par l'utilisateur connecté ; seul l'expéditeur modifie ou supprime."""
     serializer_class = MessageSerializer
+    permission_classes = [IsAuthenticated]
+    cursor_ordering = '-id'
 
     def get_queryset(self):
-        queryset = super().get_queryset()
+        user = self.request.user
+        queryset = Message.objects.filter(Q(sender=user) | Q(receiver=user))
+        if self.request.method not in permissions.SAFE_METHODS:
+            queryset = queryset.filter(sender=user)
         receiver = self.request.query_params.get('receiver')
         annonce = self.request.query_params.get('annonce')
+        conversation = self.request.query_params.get('conversation')
         if receiver:
             queryset = queryset.filter(receiver=receiver)
         if annonce:
             queryset = queryset.filter(annonce=annonce)
+        if conversation:
+            queryset = queryset.filter(conversation=conversation)
         return queryset
 
+    def perform_create(self, serializer):
+        serializer.save(sender=self.request.user)
+
+
+def _messages_depuis(user, since, limite):
+    """Messages envoyés ou reçus par `user` d'id supérieur à `since`, du plus ancien au plus récent."""
+    messages = Message.objects.filter(Q(sender=user) | Q(receiver=user), pk__gt=since).order_by('pk')[:limite]
+    return MessageSerializer(messages, many=True).data
+
+
+def _dernier_message(user):
+    return Message.objects.filter(Q(sender=user) | Q(receiver=user)).order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+@require_GET
+async def messages_updates(request):
+    """
+    Nouveaux messages de l'utilisateur depuis le curseur `since` (id du dernier
+    message connu). S'il n'y en a pas, la requête reste ouverte jusqu'à
+    `timeout` secondes (MESSAGES_ATTENTE_MAX au plus) et répond dès qu'un
+    message arrive. Sans `since`, retourne seulement le curseur courant.
+
+    Réponse : {'results': [...], 'cursor': <since suivant>, 'suite': <autres messages en attente>}.
+    Le pub/sub ne sert qu'à réveiller l'attente : la base est relue à
+    l'échéance, même si l'événement a été publié par un autre processus.
+    """
+    user = await _utilisateur_flux(request)
+    if user is None:
+        return JsonResponse({'detail': "Informations d'authentification non fournies."}, status=401)
+    since = request.GET.get('since')
+    if since is None:
+        return JsonResponse({'results': [], 'cursor': str(await sync_to_async(_dernier_message)(user)), 'suite': False})
+    try:
+        since = int(since)
+        timeout = float(request.GET.get('timeout', settings.MESSAGES_ATTENTE_MAX))
+        if not math.isfinite(timeout):
+            raise ValueError(timeout)  # nan traverserait min/max
+        timeout = min(max(timeout, 0), settings.MESSAGES_ATTENTE_MAX)
+    except ValueError:
+        return JsonResponse({'detail': "Paramètres `since` ou `timeout` invalides."}, status=400)
+    limite = DefaultCursorPagination.max_page_size
+    lire = sync_to_async(_messages_depuis)
+
+    messages = await lire(user, since, limite)
+    if not messages and timeout:
+        with get_broker().subscribe([canal_utilisateur(user.pk)]) as abonnement:
+            # Relecture après l'abonnement : un message validé entre-temps n'est pas manqué
+            messages = await lire(user, since, limite)
+            fin = time.monotonic() + timeout
+            while not messages and (reste := fin - time.monotonic()) > 0:
+                try:
+                    evenement = await abonnement.get(timeout=reste)
+                except AbonnementDeborde:
+                    evenement = {'type': 'message'}
+                if evenement is None or evenement['type'] == 'message':
+                    messages = await lire(user, since, limite)
+                    if evenement is None:
+                        break
+
+    return JsonResponse({
+        'results': messages,
+        'cursor': str(messages[-1]['id'] if messages else since),
+        'suite': len(messages) == limite,
+    })
+
+
+class ConversationViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Boîte de réception : conversations de l'utilisateur connecté, de la plus
+    récemment active à la plus ancienne, avec leurs non lus (index
+    user + activité sur les participations). `messages/` donne l'historique
+    paginé d'une conversation.
+    """
+    serializer_class = ConversationSerializer
+    permission_classes = [IsAuthenticated]
+    lookup_field = 'conversation'
+    lookup_url_kwarg = 'pk'
+
+    @property
+    def cursor_ordering(self):
+        if self.action == 'messages':
+            return ('-timestamp', '-id')
+        return ('-date_derniere_activite', '-id')
+
+    def get_queryset(self):
+        return ParticipantConversation.objects.filter(
+            user=self.request.user, date_derniere_activite__isnull=False
+        ).select_related('conversation').prefetch_related(
+            Prefetch('conversation__participations', queryset=ParticipantConversation.objects.select_related('user'))
+        )
+
+    @action(detail=True, methods=['get'])
+    def messages(self, request, pk=None):
+        """Historique de la conversation, du plus récent au plus ancien (index conversation + date)."""
+        participation = self.get_object()
+        page = self.paginate_queryset(Message.objects.filter(conversation_id=participation.conversation_id))
+        return self.get_paginated_response(MessageSerializer(page, many=True).data)
+
+    @action(detail=True, methods=['post'], url_path='marquer-lue')
+    def marquer_lue(self, request, pk=None):
+        """Remet à zéro les non lus de l'utilisateur dans la conversation."""
+        participation = self.get_object()
+        return Response({'marques': participation.conversation.marquer_lue(request.user)})
+
 # puis le reste de votre code...
 class RegisterLivreurView(APIView):
     """
@@ -179,10 +320,11 @@ class RegisterLivreurView(APIView):
                 {"error": f"Erreur lors de l'inscription: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-from dashboard.models import User, Livraison, Paiement, Annonce, Contrat, Service, PieceJustificative
+from dashboard.models import User, Livraison, Paiement, Annonce, Contrat, Service, PieceJustificative, Notification
 from .serializers import (
     UserSerializer, LivraisonSerializer, AnnonceSerializer, PaiementSerializer,
-    ContratSerializer, ServiceSerializer, PieceJustificativeSerializer
+    ContratSerializer, ServiceSerializer, PieceJustificativeSerializer,
+    NotificationSerializer, NotificationsLuesSerializer
 )
 from dashboard.services.stats_service import get_monthly_revenue
 
@@ -192,12 +334,17 @@ class UserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = AdminPagination
+    cursor_ordering = '-id'
+    filter_backends = [RechercheTexteFilter]
+    recherche_index = 'user'
 
-class LivraisonViewSet(viewsets.ModelViewSet):
+class LivraisonViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """ViewSet pour gérer les opérations CRUD sur les livraisons."""
     queryset = Livraison.objects.all()
     serializer_class = LivraisonSerializer
     permission_classes = [permissions.IsAuthenticated]    #J'ai ajouté permissions.
+    cursor_ordering = ('-created_at', '-id')
     
     def perform_create(self, serializer):
        livreur = self.request.user
@@ -222,28 +369,64 @@ class LivraisonViewSet(viewsets.ModelViewSet):
     
     @action(detail=True, methods=['post'])
     def valider(self, request, pk=None):
+        """
+        Accepte l'offre : la livraison passe en cours, les autres offres de
+        l'annonce sont annulées. Réservé au client et aux administrateurs ;
+        409 si l'annonce est déjà attribuée.
+        """
         livraison = self.get_object()
-        annonce_id = livraison.annonce.id
-
-        # 1. Marquer cette livraison comme "en_cours"
-        livraison.status = "en_cours"
-        livraison.save()
-
-        # 2. Annuler les autres livraisons associées à cette annonce
-        Livraison.objects.filter(annonce_id=annonce_id).exclude(pk=livraison.pk).update(status="annulee")
-
+        user = request.user
+        if livraison.client_id != user.pk and not (user.is_staff or user.user_type == 'admin'):
+            return Response({"error": "Accès non autorisé"}, status=drf_status.HTTP_403_FORBIDDEN)
+        try:
+            accepter_offre(livraison.pk)
+        except AffectationError as exc:
+            return Response({'error': str(exc)}, status=drf_status.HTTP_409_CONFLICT)
         return Response({'message': 'Livreur validé.'}, status=drf_status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'])
+    def affecter(self, request):
+        """
+        Acceptation groupée d'offres (`livraisons` : liste d'ids, une par
+        annonce) pour les administrateurs, en une transaction ; les offres
+        refusées sont retournées avec leur raison.
+        """
+        user = request.user
+        if not (user.is_staff or user.user_type == 'admin'):
+            return Response({"error": "Accès non autorisé"}, status=drf_status.HTTP_403_FORBIDDEN)
+        ids = request.data.get('livraisons')
+        if not isinstance(ids, list) or not ids or not all(isinstance(pk, int) for pk in ids):
+            return Response({'detail': "`livraisons` doit être une liste d'identifiants"},
+                            status=drf_status.HTTP_400_BAD_REQUEST)
+        if len(ids) > 1000:
+            return Response({'detail': "1000 offres au plus par requête"}, status=drf_status.HTTP_400_BAD_REQUEST)
+        acceptees, refus = affecter_en_masse(ids)
+        return Response({
+            'acceptees': [livraison.pk for livraison in acceptees],
+            'refusees': {str(pk): raison for pk, raison in refus.items()},
+        })
 
-class AnnonceViewSet(viewsets.ModelViewSet):
+
+class AnnonceViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """ViewSet pour gérer les opérations CRUD sur les annonces."""
     queryset = Annonce.objects.all().order_by('-created_at')
     serializer_class = AnnonceSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    cursor_ordering = ('-created_at', '-id')
+    filter_backends = [RechercheTexteFilter]
+    recherche_index = 'annonce'
 
     def perform_create(self, serializer):
         """Associe l'utilisateur connecté à l'annonce lors de sa création."""
         serializer.save(created_by=self.request.user)
+
+    def retrieve(self, request, *args, **kwargs):
+        """Détail d'une annonce ; compte une vue, sauf pour son auteur."""
+        annonce = self.get_object()
+        if annonce.created_by_id != request.user.pk:
+            compter_vue(annonce)
+        annonce.vues = vues_totales(annonce)
+        return Response(self.get_serializer(annonce).data)
         
     def perform_update(self, serializer):         # Ajouter by Oceane
         annonce = serializer.save()
@@ -257,25 +440,107 @@ class AnnonceViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
     def my_annonces(self, request):
         """Endpoint pour obtenir les annonces de l'utilisateur connecté."""
-        annonces = Annonce.objects.filter(created_by=request.user).order_by('-created_at')
-        serializer = self.get_serializer(annonces, many=True)
-        return Response(serializer.data)
+        annonces = self.filter_queryset(Annonce.objects.filter(created_by=request.user))
+        page = self.paginate_queryset(annonces)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
     
-    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated],
+            pagination_class=KeysetCursorPagination, cursor_ordering=ORDRE_RECHERCHE)
     def available(self, request):
-        """Endpoint pour obtenir les annonces disponibles pour les livreurs."""
+        """Annonces disponibles pour les livreurs, avec les filtres de `recherche`."""
         if request.user.user_type != 'livreur':
             return Response({"error": "Accès non autorisé"}, status=status.HTTP_403_FORBIDDEN)
-        
-        annonces = Annonce.objects.filter(status='active').order_by('-created_at')
-        serializer = self.get_serializer(annonces, many=True)
-        return Response(serializer.data)
+        return self._rechercher(request)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated],
+            pagination_class=KeysetCursorPagination, cursor_ordering=ORDRE_RECHERCHE)
+    def recherche(self, request):
+        """
+        Annonces actives filtrées par ville de départ/arrivée (`depart`, `arrivee`),
+        fenêtre de dates (`date_min`, `date_max`), `type`, poids (`poids_min`,
+        `poids_max`), `urgente` et texte libre (`q`), classées par pertinence
+        puis date de départ.
+        """
+        return self._rechercher(request)
+
+    def _rechercher(self, request):
+        try:
+            annonces = rechercher_annonces(request.query_params)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        page = self.paginate_queryset(self.filter_queryset(annonces))
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['get'], permission_classes=[IsAuthenticated])
+    def proximite(self, request):
+        """
+        Annonces actives dont le départ est à moins de `rayon` km d'un point
+        (`lat` et `lon`, ou `ville` : nom ou code postal), les plus proches
+        d'abord, `limite` au plus.
+        """
+        params = request.query_params
+        try:
+            lat, lon = lire_point(params)
+            rayon = lire_nombre(params, 'rayon', settings.GEO_RAYON_DEFAUT, settings.GEO_RAYON_MAX)
+            limite = lire_nombre(params, 'limite', 50, 200, entier=True)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        annonces = annonces_proches(lat, lon, rayon, limite)
+        return Response({
+            'lat': lat, 'lon': lon, 'rayon': rayon,
+            'results': AnnonceProcheSerializer(annonces, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'], pagination_class=None)
+    def tendances(self, request):
+        """
+        Annonces actives les plus consultées sur la dernière heure (ou les
+        `fenetre` dernières secondes), `limite` au plus, avec `vues_recentes`.
+        """
+        params = request.query_params
+        try:
+            limite = lire_nombre(params, 'limite', 20, 100, entier=True)
+            fenetre = lire_nombre(params, 'fenetre', settings.VUES_TENDANCE_FENETRE,
+                                  settings.VUES_TENDANCE_FENETRE, entier=True)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        annonces = annonces_tendance(limite, fenetre)
+        return Response({
+            'fenetre': fenetre,
+            'results': AnnonceTendanceSerializer(annonces, many=True).data,
+        })
+
+    @action(detail=True, methods=['get'], permission_classes=[IsAuthenticated], url_path='livreurs-candidats')
+    def livreurs_candidats(self, request, pk=None):
+        """
+        Livreurs vérifiés et disponibles dont une zone de livraison couvre le
+        départ de l'annonce (à moins de `rayon` km), les plus proches puis les
+        mieux notés d'abord. Réservé à l'auteur de l'annonce et aux administrateurs.
+        """
+        annonce = self.get_object()
+        user = request.user
+        if annonce.created_by_id != user.pk and not (user.is_staff or user.user_type == 'admin'):
+            return Response({"error": "Accès non autorisé"}, status=status.HTTP_403_FORBIDDEN)
+        params = request.query_params
+        try:
+            rayon = lire_nombre(params, 'rayon', settings.GEO_RAYON_ZONE, settings.GEO_RAYON_MAX)
+            limite = lire_nombre(params, 'limite', 20, 100, entier=True)
+            livreurs = livreurs_candidats(annonce, rayon, limite)
+        except ValueError as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({
+            'annonce': annonce.pk, 'rayon': rayon,
+            'results': LivreurCandidatSerializer(livreurs, many=True).data,
+        })
 
 # ViewSets spécifiques par type d'utilisateur
-class LivreurLivraisonsViewSet(viewsets.ReadOnlyModelViewSet):
+class LivreurLivraisonsViewSet(QueryPlanMixin, viewsets.ReadOnlyModelViewSet):
     """ViewSet dédié aux livraisons des livreurs."""
     serializer_class = LivraisonSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         """Ne retourne que les livraisons assignées au livreur connecté."""
@@ -284,10 +549,11 @@ class LivreurLivraisonsViewSet(viewsets.ReadOnlyModelViewSet):
             return Livraison.objects.none()
         return Livraison.objects.filter(livreur=user).order_by('-created_at')
 
-class ClientAnnoncesViewSet(viewsets.ModelViewSet):
+class ClientAnnoncesViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """ViewSet dédié aux annonces des clients."""
     serializer_class = AnnonceSerializer
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-created_at', '-id')
     
     def get_queryset(self):
         """Ne retourne que les annonces créées par le client connecté."""
@@ -300,22 +566,135 @@ class ClientAnnoncesViewSet(viewsets.ModelViewSet):
         """Associe le client connecté à l'annonce lors de sa création."""
         serializer.save(created_by=self.request.user)
 
+class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Boîte de réception des notifications de l'utilisateur connecté
+    (`?lue=true|false` pour filtrer), avec marquage en lot.
+    """
+    serializer_class = NotificationSerializer
+    permission_classes = [IsAuthenticated]
+    cursor_ordering = '-id'
+
+    def get_queryset(self):
+        notifications = Notification.objects.filter(user=self.request.user)
+        lue = self.request.query_params.get('lue')
+        if lue in ('true', '1', 'false', '0'):
+            notifications = notifications.filter(lue=lue in ('true', '1'))
+        return notifications
+
+    def _compteur(self, marquees):
+        non_lues = User.objects.filter(pk=self.request.user.pk).values_list('notifications_non_lues', flat=True).get()
+        return Response({'marquees': marquees, 'non_lues': non_lues})
+
+    @action(detail=False, methods=['get'], url_path='non-lues')
+    def non_lues(self, request):
+        """Nombre de notifications non lues (compteur dénormalisé, sans requête)."""
+        return Response({'non_lues': request.user.notifications_non_lues})
+
+    @action(detail=False, methods=['post'], url_path='marquer-lues')
+    def marquer_lues(self, request):
+        """Marque comme lues les notifications `ids` (un seul UPDATE)."""
+        serializer = NotificationsLuesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return self._compteur(Notification.marquer_lues(request.user, serializer.validated_data['ids']))
+
+    @action(detail=False, methods=['post'], url_path='tout-marquer-lu')
+    def tout_marquer_lu(self, request):
+        """Marque comme lues toutes les notifications de l'utilisateur."""
+        return self._compteur(Notification.marquer_lues(request.user))
+
+
+async def _utilisateur_flux(request):
+    """Jeton (en-tête, ou ?token= car EventSource ne peut pas fixer d'en-tête) ou session."""
+    entete = request.headers.get('Authorization', '')
+    cle = entete[len('Token '):].strip() if entete.startswith('Token ') else request.GET.get('token')
+    if cle:
+        token = await Token.objects.select_related('user').filter(key=cle).afirst()
+        user = token.user if token else None
+    else:
+        user = await request.auser()
+    return user if user is not None and user.is_authenticated and user.is_active else None
+
+
+def _trame(evenement):
+    donnees = json.dumps(evenement['donnees'], cls=DjangoJSONEncoder)
+    return f"id: {evenement['id']}\nevent: {evenement['type']}\ndata: {donnees}\n\n"
+
+
+async def _flux_evenements(canaux, depuis):
+    """Trames SSE pendant EVENTS_DUREE_MAX, avec un commentaire de maintien toutes les EVENTS_HEARTBEAT s."""
+    with get_broker().subscribe(canaux, depuis) as abonnement:
+        yield "retry: 3000\n\n"
+        fin = time.monotonic() + settings.EVENTS_DUREE_MAX
+        while (reste := fin - time.monotonic()) > 0:
+            try:
+                evenement = await abonnement.get(timeout=min(settings.EVENTS_HEARTBEAT, reste))
+            except AbonnementDeborde:
+                # Le client se reconnecte avec Last-Event-ID et récupère ce qui reste en mémoire
+                return
+            yield ": ping\n\n" if evenement is None else _trame(evenement)
+
+
+async def _attendre_evenements(canaux, depuis):
+    """Long polling (WSGI) : attend un événement au plus EVENTS_ATTENTE_WSGI s et retourne ceux reçus."""
+    trames = ["retry: 500\n\n"]
+    with get_broker().subscribe(canaux, depuis) as abonnement:
+        try:
+            evenement = await abonnement.get(timeout=settings.EVENTS_ATTENTE_WSGI)
+        except AbonnementDeborde:
+            evenement = None
+        while evenement is not None:
+            trames.append(_trame(evenement))
+            evenement = abonnement.get_nowait()
+    return ''.join(trames)
+
+
+@require_GET
+async def evenements(request):
+    """
+    Flux server-sent events de l'utilisateur connecté : nouvelles notifications,
+    changements de statut de ses livraisons, messages reçus ou envoyés.
+    Remplace l'interrogation périodique des endpoints REST.
+
+    Servi en continu par Back_PA.asgi ; sous WSGI, chaque requête attend le
+    prochain événement puis se termine (EventSource se reconnecte seul).
+    Last-Event-ID (ou ?depuis=) rejoue les événements manqués encore en mémoire.
+    """
+    user = await _utilisateur_flux(request)
+    if user is None:
+        return JsonResponse({'detail': "Informations d'authentification non fournies."}, status=401)
+    depuis = request.headers.get('Last-Event-ID') or request.GET.get('depuis')
+    depuis = int(depuis) if depuis and depuis.isdigit() else None
+    canaux = [canal_utilisateur(user.pk)]
+
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(_flux_evenements(canaux, depuis), content_type='text/event-stream')
+    else:
+        response = HttpResponse(await _attendre_evenements(canaux, depuis), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
 class CommercantContratsViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet dédié aux contrats des commerçants."""
     serializer_class = ContratSerializer  # Assurez-vous que ce serializer existe
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-date_creation', '-id')
     
     def get_queryset(self):
         """Ne retourne que les contrats liés au commerçant connecté."""
         user = self.request.user
         if user.user_type != 'commercant':
             return Contrat.objects.none()
-        return Contrat.objects.filter(commercant=user).order_by('-created_at')
+        return Contrat.objects.filter(user=user)
 
 class PrestataireServicesViewSet(viewsets.ModelViewSet):
     """ViewSet dédié aux services des prestataires."""
     serializer_class = ServiceSerializer  # Assurez-vous que ce serializer existe
     permission_classes = [IsAuthenticated]
+    cursor_ordering = ('-created_at', '-id')
+    filter_backends = [RechercheTexteFilter]
+    recherche_index = 'service'
     
     def get_queryset(self):
         """Ne retourne que les services proposés par le prestataire connecté."""
@@ -334,17 +713,25 @@ class AdminUserViewSet(viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = AdminPagination
+    cursor_ordering = '-id'
+    filter_backends = [RechercheTexteFilter]
+    recherche_index = 'user'
 
-class AdminLivraisonViewSet(viewsets.ModelViewSet):
+class AdminLivraisonViewSet(QueryPlanMixin, viewsets.ModelViewSet):
     """ViewSet pour l'administration des livraisons."""
     queryset = Livraison.objects.all()
     serializer_class = LivraisonSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = AdminPagination
+    cursor_ordering = ('-created_at', '-id')
 
 class AdminValidationLivreurViewSet(viewsets.ModelViewSet):
     """ViewSet pour la validation des livreurs par les administrateurs."""
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
+    pagination_class = AdminPagination
+    cursor_ordering = '-id'
     
     def get_queryset(self):
         """Ne retourne que les utilisateurs de type livreur en attente de validation."""
@@ -370,6 +757,113 @@ class AdminPieceJustificativeViewSet(viewsets.ReadOnlyModelViewSet):
     serializer_class = PieceJustificativeSerializer
     permission_classes = [IsAdminUser]
     queryset = PieceJustificative.objects.all()
+    pagination_class = AdminPagination
+    cursor_ordering = ('-date_upload', '-id')
+
+class AdminPaiementImportView(APIView):
+    """
+    Import en masse de paiements (admin) : fichier CSV/JSONL en multipart
+    (champ `fichier`) ou liste JSON de lignes. `?dry_run=1` valide sans écrire.
+    """
+    permission_classes = [IsAdminUser]
+    parser_classes = (MultiPartParser, FormParser, JSONParser)
+
+    def post(self, request, format=None):
+        fichier = request.FILES.get('fichier')
+        if fichier is not None:
+            rows = read_payment_rows(fichier, request.data.get('format') or None)
+        elif isinstance(request.data, list):
+            rows = request.data
+        else:
+            return Response({"error": "Fichier ou liste de paiements attendu"}, status=status.HTTP_400_BAD_REQUEST)
+
+        dry_run = request.query_params.get('dry_run') in ('1', 'true')
+        try:
+            resultat = ingest_payments(rows, dry_run=dry_run)
+        except IngestionError as exc:
+            return Response({"error": str(exc), "lignes": exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(resultat, status=status.HTTP_200_OK if dry_run else status.HTTP_201_CREATED)
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def facture_pdf(request, pk):
+    """
+    PDF d'une facture, servi depuis media/factures/. Rendu à la volée
+    seulement si le fichier manque ou si le contenu a changé.
+    """
+    facture = get_object_or_404(factures_a_rendre(Facture.objects.all()), pk=pk)
+    paiement = facture.paiement
+    if not (request.user.is_staff or request.user.pk in (paiement.payeur_id, paiement.beneficiaire_id)):
+        return Response({"error": "Accès non autorisé"}, status=status.HTTP_403_FORBIDDEN)
+
+    ensure_invoice_pdf(facture)
+    return FileResponse(
+        open(invoice_pdf_path(facture), 'rb'),
+        content_type='application/pdf',
+        filename=f"facture_{facture.reference}.pdf"
+    )
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_factures_export(request):
+    """
+    Export par lot des factures (admin) : `?mois=AAAA-MM` ou `?debut=&fin=`,
+    filtres `commercant` / `payeur` optionnels, `type=zip` (défaut, diffusé
+    en flux) ou `type=pdf` (un seul PDF, au plus FACTURES_EXPORT_PDF_MAX
+    factures). `format` est réservé par DRF.
+    """
+    params = request.query_params
+    format = params.get('type', 'zip')
+    if format not in FORMATS:
+        return Response({"error": f"Type d'export inconnu : {format}"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        debut, fin = periode(params.get('mois'), params.get('debut'), params.get('fin'))
+        commercant = identifiant(params.get('commercant'), 'commercant')
+        payeur = identifiant(params.get('payeur'), 'payeur')
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    factures = factures_exportees(debut, fin, commercant, payeur)
+    if format == 'pdf':
+        try:
+            check_pdf_size(factures)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    filename = export_filename(debut, fin, format)
+    if format == 'zip':
+        response = StreamingHttpResponse(stream_invoices_zip(factures), content_type='application/zip')
+    else:
+        response = StreamingHttpResponse(invoices_pdf_chunks(factures), content_type='application/pdf')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def recherche(request):
+    """
+    Recherche plein texte (`q`, insensible aux accents, termes en préfixe) dans
+    les annonces actives, les services disponibles et, pour les administrateurs,
+    les utilisateurs : `limite` résultats par type, les plus pertinents d'abord.
+    """
+    q = request.query_params.get('q', '')
+    if not termes(q):
+        return Response({'detail': "Paramètre `q` requis"}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limite = lire_nombre(request.query_params, 'limite', 10, 50, entier=True)
+    except ValueError as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    annonces = rechercher('annonce', q, limite, Annonce.objects.filter(status='active').select_related('created_by'))
+    services = rechercher('service', q, limite, Service.objects.filter(disponible=True))
+    resultats = {
+        'annonces': AnnonceSerializer(annonces, many=True).data,
+        'services': ServiceSerializer(services, many=True).data,
+    }
+    if request.user.is_staff or request.user.user_type == 'admin':
+        resultats['utilisateurs'] = UserSerializer(rechercher('user', q, limite), many=True).data
+    return Response(resultats)
 
 # Vues API statistiques et rapports
 @api_view(['GET'])
@@ -443,24 +937,11 @@ def admin_monthly_financial_report(request, year):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Récupérer les revenus pour chaque mois de l'année
-    monthly_revenues = []
-    for month in range(1, 13):
-        start_date = datetime.date(year, month, 1)
-        if month < 12:
-            end_date = datetime.date(year, month + 1, 1)
-        else:
-            end_date = datetime.date(year + 1, 1, 1)
-        
-        revenue = Paiement.objects.filter(
-            date__gte=start_date, 
-            date__lt=end_date
-        ).aggregate(total=Sum('montant'))['total'] or 0
-        
-        monthly_revenues.append({
-            'mois': month,
-            'revenue': revenue
-        })
+    # Récupérer les revenus de chaque mois de l'année en une seule requête
+    monthly_revenues = [
+        {'mois': point['periode'].month, 'revenue': point['valeur']}
+        for point in get_yearly_series('revenue', year)
+    ]
     
     return Response(monthly_revenues)
 
@@ -468,32 +949,45 @@ def admin_monthly_financial_report(request, year):
 @permission_classes([IsAdminUser])
 def admin_yearly_financial_report(request):
     """Rapport financier annuel."""
-    # Récupérer les années pour lesquelles nous avons des paiements
-    first_payment = Paiement.objects.order_by('date').first()
+    # Récupérer la date du premier paiement enregistré
+    first_payment_date = Paiement.objects.aggregate(first=Min('date_paiement'))['first']
     
-    if not first_payment:
+    if not first_payment_date:
         return Response([])
     
-    start_year = first_payment.date.year
+    start_year = timezone.localtime(first_payment_date).year
     current_year = timezone.now().year
     
-    yearly_revenues = []
-    for year in range(start_year, current_year + 1):
-        start_date = datetime.date(year, 1, 1)
-        end_date = datetime.date(year + 1, 1, 1)
-        
-        revenue = Paiement.objects.filter(
-            date__gte=start_date, 
-            date__lt=end_date
-        ).aggregate(total=Sum('montant'))['total'] or 0
-        
-        yearly_revenues.append({
-            'annee': year,
-            'revenue': revenue
-        })
+    yearly_revenues = [
+        {'annee': point['periode'].year, 'revenue': point['valeur']}
+        for point in get_time_series(
+            'revenue', 'year',
+            start=datetime.date(start_year, 1, 1),
+            end=datetime.date(current_year, 12, 31)
+        )
+    ]
     
     return Response(yearly_revenues)
 
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def admin_kpi_cache_stats(request):
+    """Compteurs de hits/misses du cache des KPI de la page d'accueil."""
+    return Response(get_kpi_cache_stats())
+
+@api_view(['GET', 'DELETE'])
+@permission_classes([IsAdminUser])
+def admin_request_profile(request):
+    """Percentiles de profilage par nom d'URL (DELETE pour remettre à zéro)."""
+    if request.method == 'DELETE':
+        profile_store.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+    return Response({
+        'enabled': getattr(settings, 'REQUEST_PROFILING_ENABLED', False),
+        'sample_rate': getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 1.0),
+        'urls': profile_store.summary(),
+    })
+
 # Vues API pour l'authentification
 @api_view(['POST'])
 @permission_classes([AllowAny])
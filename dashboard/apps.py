@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class DashboardConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'dashboard'
+
+    def ready(self):
+        # Enregistrement des receivers de signaux (invalidation des caches, etc.)
+        from dashboard import signals  # noqa: F401
@@ -0,0 +1,9 @@
+def notifications(request):
+    """
+    Badge des notifications non lues sur toutes les pages : lu sur le compteur
+    dénormalisé de l'utilisateur déjà chargé par l'authentification, sans requête.
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    return {'notifications_non_lues': user.notifications_non_lues}
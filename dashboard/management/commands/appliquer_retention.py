@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.services.retention import MODELES, appliquer_retention
+
+
+class Command(BaseCommand):
+    help = (
+        "Applique les politiques de rétention (RETENTION) : supprime ou archive en "
+        "JSONL compressé les notifications et logs de connexion anciens, par petits lots."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--modele', action='append', help=f"Modèle à traiter ({', '.join(MODELES)}), répétable")
+        parser.add_argument('--batch-size', type=int, default=500, help="Lignes par lot (une transaction par lot)")
+        parser.add_argument('--pause', type=float, default=0.0, help="Attente entre deux lots (s)")
+        parser.add_argument('--archive-dir', help="Dossier des archives (défaut : RETENTION_ARCHIVE_DIR)")
+        parser.add_argument('--dry-run', action='store_true', help="Compte les lignes concernées sans rien modifier")
+
+    def handle(self, *args, **options):
+        for nom in options['modele'] or ():
+            if nom not in MODELES:
+                raise CommandError(f"Modèle inconnu : {nom} (attendu : {', '.join(MODELES)})")
+        try:
+            resultats = appliquer_retention(
+                options['modele'], batch_size=options['batch_size'], pause=options['pause'],
+                dry_run=options['dry_run'], archive_dir=options['archive_dir'],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        verbe = "concernées" if options['dry_run'] else "traitées"
+        for resultat in resultats:
+            ligne = (
+                f"{resultat['politique']} : {resultat['lignes']} lignes {verbe} en {resultat['secondes']:.2f} s "
+                f"({resultat['lignes_par_seconde']:.0f} lignes/s)"
+            )
+            if resultat['fichier']:
+                ligne += f", archivées dans {resultat['fichier']}"
+            self.stdout.write(ligne)
+        total = sum(resultat['lignes'] for resultat in resultats)
+        self.stdout.write(self.style.SUCCESS(f"{total} lignes {verbe}"))
@@ -0,0 +1,35 @@
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+
+from dashboard.services.push_backends import get_backend
+from dashboard.services.push_service import PushDispatcher
+
+
+class Command(BaseCommand):
+    help = (
+        "Envoie les notifications push en attente (file EnvoiPush) : lots, envois "
+        "concurrents, backoff exponentiel et abandon après le nombre maximal de tentatives."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Traite la file en continu")
+        parser.add_argument('--interval', type=float, default=2.0, help="Attente quand la file est vide (s)")
+        parser.add_argument('--batch-size', type=int, default=500, help="Envois réservés par lot")
+        parser.add_argument('--concurrency', type=int, help="Requêtes simultanées (défaut : PUSH_CONCURRENCE)")
+        parser.add_argument('--backend', help="Chemin du backend (défaut : PUSH_BACKEND)")
+
+    def handle(self, *args, **options):
+        dispatcher = PushDispatcher(
+            backend=get_backend(options['backend']),
+            concurrence=options['concurrency'],
+            batch_size=options['batch_size'],
+        )
+
+        def bilan(resultat):
+            self.stdout.write(
+                f"{resultat['envoyes']} envoyés, {resultat['reportes']} reportés, "
+                f"{resultat['abandonnes']} abandonnés"
+            )
+
+        total = async_to_sync(dispatcher.run)(options['loop'], options['interval'], bilan)
+        self.stdout.write(self.style.SUCCESS(f"{total['traites']} envois traités"))
@@ -0,0 +1,50 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.services.invoice_export import (
+    FORMATS, check_pdf_size, export_filename, factures_exportees, periode, stream_invoices_zip, write_invoices_pdf
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Exporte les factures d'une période en une archive ZIP ou un PDF unique. "
+        "Les PDF manquants ou périmés sont rendus au passage."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mois', help="Mois à exporter (AAAA-MM)")
+        parser.add_argument('--debut', help="Première date incluse (AAAA-MM-JJ)")
+        parser.add_argument('--fin', help="Dernière date incluse (AAAA-MM-JJ)")
+        parser.add_argument('--commercant', type=int, help="Id du profil commerçant")
+        parser.add_argument('--payeur', type=int, help="Id de l'utilisateur payeur")
+        parser.add_argument('--format', choices=FORMATS, default='zip')
+        parser.add_argument('--output', '-o', help="Fichier de sortie (défaut : factures_<debut>_<fin>.<format>, '-' pour stdout)")
+
+    def handle(self, *args, **options):
+        try:
+            debut, fin = periode(options['mois'], options['debut'], options['fin'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        factures = factures_exportees(debut, fin, options['commercant'], options['payeur'])
+        if options['format'] == 'pdf':
+            try:
+                check_pdf_size(factures)
+            except ValueError as exc:
+                raise CommandError(str(exc))
+        output = options['output'] or export_filename(debut, fin, options['format'])
+        fichier = sys.stdout.buffer if output == '-' else open(output, 'wb')
+        try:
+            if options['format'] == 'zip':
+                for morceau in stream_invoices_zip(factures):
+                    fichier.write(morceau)
+            else:
+                write_invoices_pdf(factures, fichier)
+        finally:
+            if fichier is not sys.stdout.buffer:
+                fichier.close()
+
+        if output != '-':
+            self.stdout.write(self.style.SUCCESS(f"Export écrit dans {output}"))
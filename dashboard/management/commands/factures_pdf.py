@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.services.invoice_pdf import process_invoice_jobs, render_month, requeue_stale_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère les PDF de factures : traite la file d'attente (une fois ou en boucle "
+        "avec --loop) ou rend toutes les factures d'un mois en parallèle (--mois AAAA-MM)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--mois', help="Rendu par lot des factures du mois AAAA-MM")
+        parser.add_argument('--force', action='store_true', help="Régénère même si le contenu est inchangé")
+        parser.add_argument('--workers', type=int, help="Processus de rendu (défaut : 1 pour la file, nb de CPU pour --mois)")
+        parser.add_argument('--loop', action='store_true', help="Traite la file en continu")
+        parser.add_argument('--interval', type=float, default=2.0, help="Attente entre deux lots vides (s)")
+        parser.add_argument('--limit', type=int, default=100, help="Tâches par lot")
+
+    def handle(self, *args, **options):
+        if options['mois']:
+            try:
+                year, month = (int(part) for part in options['mois'].split('-'))
+            except ValueError:
+                raise CommandError("Format attendu pour --mois : AAAA-MM")
+            debut = time.perf_counter()
+            total = render_month(year, month, options['workers'], options['force'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{total['rendues']} rendues, {total['inchangees']} inchangées, "
+                f"{total['echecs']} échecs en {time.perf_counter() - debut:.1f} s"
+            ))
+            self._temps_de_rendu(total['rendu_ms'])
+            return
+
+        while True:
+            requeue_stale_jobs()
+            resultat = process_invoice_jobs(options['limit'], options['workers'] or 1)
+            if resultat['traitees']:
+                self.stdout.write(
+                    f"{resultat['rendues']} rendues, {resultat['inchangees']} inchangées, {resultat['echecs']} échecs"
+                )
+                self._temps_de_rendu(resultat['rendu_ms'])
+            if not options['loop']:
+                break
+            if not resultat['traitees']:
+                time.sleep(options['interval'])
+
+    def _temps_de_rendu(self, stats):
+        if stats['moyenne'] is not None:
+            self.stdout.write(
+                f"Rendu par facture : moyenne {stats['moyenne']} ms, p50 {stats['p50']} ms, "
+                f"p95 {stats['p95']} ms, max {stats['max']} ms"
+            )
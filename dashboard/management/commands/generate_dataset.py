@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.services.dataset_service import VOLUMES, generate_dataset, purge_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Génère un jeu de données synthétique (utilisateurs, annonces, livraisons, "
+        "paiements et factures, évaluations, notifications, logs) par insertions en masse."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0,
+                            help="Multiplicateur des volumes par défaut")
+        for name, defaut in VOLUMES.items():
+            parser.add_argument(f"--{name}", type=int, help=f"Nombre de {name} (défaut : {defaut} x scale)")
+        parser.add_argument('--days', type=int, default=365, help="Profondeur d'historique en jours")
+        parser.add_argument('--seed', type=int, help="Graine pour un jeu reproductible")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--purge', action='store_true',
+                            help="Supprime les données synthétiques au lieu d'en générer")
+
+    def handle(self, *args, **options):
+        if options['purge']:
+            deleted = purge_dataset()
+            self.stdout.write(self.style.SUCCESS(f"{deleted} lignes synthétiques supprimées"))
+            return
+
+        volumes = {name: options[name] for name in VOLUMES}
+        resultats = generate_dataset(
+            scale=options['scale'], seed=options['seed'], days=options['days'],
+            batch_size=options['batch_size'], **volumes
+        )
+        for name, count in resultats.items():
+            self.stdout.write(self.style.SUCCESS(f"{name}: {count}"))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.services.payment_ingestion import IngestionError, ingest_payments, read_payment_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Importe des paiements depuis un fichier CSV ou JSONL : paiements, factures "
+        "et crédits de portefeuille en une seule transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="Chemin du fichier (.csv ou .jsonl)")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Déduit de l'extension par défaut")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Valide le fichier sans rien écrire")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['fichier'], 'rb') as fichier:
+                rows = read_payment_rows(fichier, options['format'])
+                resultat = ingest_payments(rows, options['batch_size'], options['dry_run'])
+        except OSError as exc:
+            raise CommandError(f"Lecture impossible : {exc}")
+        except IngestionError as exc:
+            for erreur in exc.errors[:50]:
+                self.stderr.write(f"ligne {erreur['ligne']} : {'; '.join(erreur['erreurs'])}")
+            raise CommandError(f"Import annulé : {exc}")
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        prefixe = "[dry-run] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefixe}{resultat['crees']} paiements, {resultat['factures']} factures, "
+            f"{resultat['beneficiaires_credites']} portefeuilles crédités, {resultat['ignores']} déjà importés"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.services.rollup_service import CUMULS, rebuild_daily_rollups
+
+
+class Command(BaseCommand):
+    help = "Reconstruit les tables de cumuls journaliers (paiements, livraisons, inscriptions)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'cumuls', nargs='*',
+            help=f"Cumuls à reconstruire parmi {', '.join(sorted(CUMULS))} (tous par défaut)"
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        inconnus = set(options['cumuls']) - set(CUMULS)
+        if inconnus:
+            raise CommandError(f"Cumuls inconnus : {', '.join(sorted(inconnus))}")
+        resultats = rebuild_daily_rollups(options['cumuls'] or None, options['batch_size'])
+        for name, count in resultats.items():
+            self.stdout.write(self.style.SUCCESS(f"{name}: {count} lignes de cumul reconstruites"))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.services.wallet_service import reconcile_wallets
+
+
+class Command(BaseCommand):
+    help = "Compare les soldes de portefeuille au journal des mouvements et signale les écarts."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help="Réaligne les soldes divergents sur le journal")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        ecarts = reconcile_wallets(options['fix'], options['batch_size'])
+        if not ecarts:
+            self.stdout.write(self.style.SUCCESS("Tous les soldes sont conformes au journal."))
+            return
+
+        for ecart in ecarts[:100]:
+            self.stdout.write(
+                f"{ecart['username']} (#{ecart['user']}) : solde {ecart['solde']} / "
+                f"journal {ecart['journal']} (écart {ecart['ecart']:+})"
+            )
+        message = f"{len(ecarts)} portefeuille(s) en écart"
+        if options['fix']:
+            self.stdout.write(self.style.SUCCESS(f"{message}, réalignés sur le journal."))
+        else:
+            self.stdout.write(self.style.WARNING(message))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.services.recherche_texte import INDEX, backend, reconstruire
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruit les index plein texte (annonces, services, utilisateurs), par exemple "
+        "après un import ou des mises à jour en masse qui n'émettent pas de signaux."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'index', nargs='*',
+            help=f"Index à reconstruire parmi {', '.join(INDEX)} (tous par défaut)"
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        inconnus = set(options['index']) - set(INDEX)
+        if inconnus:
+            raise CommandError(f"Index inconnus : {', '.join(sorted(inconnus))}")
+        if backend() is None:
+            raise CommandError("Pas d'index plein texte pour ce moteur de base de données (recherche par icontains)")
+        resultats = reconstruire(options['index'] or None, batch_size=options['batch_size'])
+        for nom, total in resultats.items():
+            self.stdout.write(self.style.SUCCESS(f"{nom}: {total} documents indexés"))
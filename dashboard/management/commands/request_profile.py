@@ -0,0 +1,57 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, override_settings
+
+from dashboard.models import User
+from dashboard.services.profiling import METRIQUES, load_snapshots, store
+
+
+class Command(BaseCommand):
+    help = (
+        "Affiche les percentiles de profilage par nom d'URL : instantanés écrits "
+        "par le serveur (REQUEST_PROFILING_DIR) ou URLs rejouées en local (--url)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=getattr(settings, 'REQUEST_PROFILING_DIR', None),
+                            help="Répertoire des instantanés du serveur")
+        parser.add_argument('--url', action='append', default=[],
+                            help="URL à rejouer en local (répétable)")
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--user', help="Utilisateur authentifié pour les URLs rejouées")
+        parser.add_argument('--json', action='store_true', help="Sortie JSON")
+
+    def handle(self, *args, **options):
+        if options['url']:
+            resume = self._rejouer(options['url'], options['repeat'], options['user'])
+        elif options['dir']:
+            resume = load_snapshots(options['dir']).summary()
+        else:
+            raise CommandError("Indiquez --url ou un répertoire d'instantanés (--dir / REQUEST_PROFILING_DIR).")
+
+        if options['json']:
+            self.stdout.write(json.dumps(resume, indent=2))
+            return
+        for name, stats in resume.items():
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({stats['requests']} requêtes)"))
+            for metrique in METRIQUES:
+                valeurs = ' '.join(f"{k}={v}" for k, v in stats[metrique].items())
+                self.stdout.write(f"  {metrique:<11} {valeurs}")
+
+    def _rejouer(self, urls, repeat, username):
+        client = Client()
+        if username:
+            try:
+                client.force_login(User.objects.get(username=username))
+            except User.DoesNotExist:
+                raise CommandError(f"Utilisateur inconnu : {username}")
+
+        store.reset()
+        with override_settings(REQUEST_PROFILING_ENABLED=True, REQUEST_PROFILING_SAMPLE_RATE=1.0,
+                               REQUEST_PROFILING_DIR=None, ALLOWED_HOSTS=['testserver']):
+            for url in urls:
+                for _ in range(repeat):
+                    client.get(url)
+        return store.summary()
@@ -0,0 +1,55 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.services.benchmark_service import SCENARIOS, compare_benchmarks, run_benchmarks
+
+
+class Command(BaseCommand):
+    help = (
+        "Chronomètre la page d'accueil, les statistiques, la liste des livraisons, "
+        "annonces/available et les rapports financiers ; écrit un JSON comparable entre commits."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*',
+                            help=f"Scénarios à exécuter parmi {', '.join(SCENARIOS)} (tous par défaut)")
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--cold', action='store_true', help="Vide le cache avant chaque itération")
+        parser.add_argument('--output', help="Fichier JSON de résultats")
+        parser.add_argument('--compare', help="Fichier JSON de référence à comparer")
+
+    def handle(self, *args, **options):
+        inconnus = set(options['scenarios']) - set(SCENARIOS)
+        if inconnus:
+            raise CommandError(f"Scénarios inconnus : {', '.join(sorted(inconnus))}")
+        resultats = run_benchmarks(
+            options['scenarios'] or None, options['iterations'], options['warmup'], options['cold']
+        )
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fichier:
+                json.dump(resultats, fichier, indent=2)
+
+        for name, mesure in resultats['scenarios'].items():
+            if 'erreur' in mesure:
+                self.stdout.write(self.style.WARNING(f"{name:<26} {mesure['erreur']}"))
+                continue
+            self.stdout.write(
+                f"{name:<26} médiane {mesure['median_ms']:>9.2f} ms  p95 {mesure['p95_ms']:>9.2f} ms  "
+                f"{mesure['queries']:>3} requêtes  HTTP {mesure['status']}"
+            )
+
+        if options['compare']:
+            try:
+                with open(options['compare'], encoding='utf-8') as fichier:
+                    reference = json.load(fichier)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f"Référence illisible : {exc}")
+            self.stdout.write(self.style.MIGRATE_HEADING(f"Comparaison avec {reference.get('commit')}"))
+            for name, ecart in compare_benchmarks(reference, resultats).items():
+                style = self.style.ERROR if ecart['ecart_pct'] > 10 else self.style.SUCCESS
+                self.stdout.write(style(
+                    f"{name:<26} {ecart['avant']:>9.2f} -> {ecart['apres']:>9.2f} ms ({ecart['ecart_pct']:+.1f} %)"
+                ))
@@ -0,0 +1,64 @@
+# dashboard/middleware.py
+
+import os
+import random
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from dashboard.services.profiling import QueryRecorder, snapshot_path, store
+
+
+class RequestProfilingMiddleware:
+    """
+    Profilage optionnel des requêtes : nombre de requêtes SQL, temps SQL,
+    doublons, temps Python et taille de la réponse, par nom d'URL résolu.
+
+    Désactivé par défaut (REQUEST_PROFILING_ENABLED). Avec
+    REQUEST_PROFILING_SAMPLE_RATE < 1, seules les requêtes tirées au sort
+    sont instrumentées ; les autres ne coûtent qu'un appel à random().
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'REQUEST_PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 1.0)
+        self.dump_dir = getattr(settings, 'REQUEST_PROFILING_DIR', None)
+        self.dump_every = getattr(settings, 'REQUEST_PROFILING_DUMP_EVERY', 100)
+        self._echantillons = 0
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        match = getattr(request, 'resolver_match', None)
+        store.record(match.view_name if match else 'non_resolue', {
+            'queries': recorder.count,
+            'sql_ms': round(recorder.duration * 1000, 3),
+            'duplicates': recorder.duplicates,
+            'python_ms': round((total - recorder.duration) * 1000, 3),
+            'size': 0 if response.streaming else len(response.content),
+        })
+        self._sauvegarder()
+        return response
+
+    def _sauvegarder(self):
+        """Écrit périodiquement l'instantané du processus pour la commande de dump."""
+        if not self.dump_dir:
+            return
+        self._echantillons += 1
+        if self._echantillons % self.dump_every == 0:
+            os.makedirs(self.dump_dir, exist_ok=True)
+            store.dump(snapshot_path(self.dump_dir))
@@ -0,0 +1,60 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0006_alter_user_email'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatInscriptionJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('nombre', models.IntegerField(default=0)),
+                ('user_type', models.CharField(choices=[('admin', 'Administrateur'), ('livreur', 'Livreur'), ('client', 'Client'), ('commercant', 'Commerçant'), ('prestataire', 'Prestataire')], max_length=20)),
+            ],
+            options={
+                'verbose_name': 'cumul journalier des inscriptions',
+                'verbose_name_plural': 'cumuls journaliers des inscriptions',
+                'indexes': [models.Index(fields=['user_type', 'jour'], name='dashboard_s_user_ty_6431ea_idx')],
+                'unique_together': {('jour', 'user_type')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StatLivraisonJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('nombre', models.IntegerField(default=0)),
+                ('status', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('livree', 'Livrée'), ('annulee', 'Annulée')], max_length=20)),
+            ],
+            options={
+                'verbose_name': 'cumul journalier des livraisons',
+                'verbose_name_plural': 'cumuls journaliers des livraisons',
+                'indexes': [models.Index(fields=['status', 'jour'], name='dashboard_s_status_c1c1f1_idx')],
+                'unique_together': {('jour', 'status')},
+            },
+        ),
+        migrations.CreateModel(
+            name='StatPaiementJour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('jour', models.DateField()),
+                ('nombre', models.IntegerField(default=0)),
+                ('status', models.CharField(choices=[('en_attente', 'En attente'), ('reussi', 'Réussi'), ('echoue', 'Échoué'), ('rembourse', 'Remboursé')], max_length=20)),
+                ('mode_paiement', models.CharField(choices=[('carte', 'Carte bancaire'), ('virement', 'Virement bancaire'), ('portefeuille', 'Portefeuille EcoDeli')], max_length=20)),
+                ('montant_total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name': 'cumul journalier des paiements',
+                'verbose_name_plural': 'cumuls journaliers des paiements',
+                'indexes': [models.Index(fields=['status', 'jour'], name='dashboard_s_status_68c517_idx')],
+                'unique_together': {('jour', 'status', 'mode_paiement')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0007_stats_journalieres'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='abonnement',
+            index=models.Index(fields=['date_debut'], name='dashboard_a_date_de_8c99da_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='livraison',
+            index=models.Index(fields=['created_at'], name='dashboard_l_created_a408a6_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='logconnexion',
+            index=models.Index(fields=['date_connexion'], name='dashboard_l_date_co_a4c105_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paiement',
+            index=models.Index(fields=['date_paiement'], name='dashboard_p_date_pa_9d3da5_idx'),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:43
+
+import django.core.validators
+import django.db.models.deletion
+from decimal import Decimal
+from django.conf import settings
+from django.db import migrations, models
+
+
+def ouvrir_soldes(apps, schema_editor):
+    """Reprend les soldes existants comme mouvements d'ouverture du journal."""
+    User = apps.get_model('dashboard', 'User')
+    MouvementPortefeuille = apps.get_model('dashboard', 'MouvementPortefeuille')
+    mouvements = [
+        MouvementPortefeuille(
+            user_id=pk,
+            sens='credit' if solde > 0 else 'debit',
+            motif='ajustement',
+            montant=abs(solde),
+            solde_apres=solde,
+            libelle="Solde d'ouverture",
+        )
+        for pk, solde in User.objects.exclude(portefeuille_solde=0).values_list('pk', 'portefeuille_solde')
+    ]
+    MouvementPortefeuille.objects.bulk_create(mouvements, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0008_index_pagination'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MouvementPortefeuille',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sens', models.CharField(choices=[('credit', 'Crédit'), ('debit', 'Débit')], max_length=6)),
+                ('motif', models.CharField(choices=[('paiement', 'Paiement reçu'), ('remboursement', 'Remboursement'), ('ajustement', 'Ajustement'), ('retrait', 'Retrait')], max_length=20)),
+                ('montant', models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(Decimal('0.01'))])),
+                ('solde_apres', models.DecimalField(decimal_places=2, help_text='Solde après ce mouvement', max_digits=10)),
+                ('libelle', models.CharField(blank=True, max_length=255)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('paiement', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='mouvements_portefeuille', to='dashboard.paiement')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='mouvements_portefeuille', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'mouvement de portefeuille',
+                'verbose_name_plural': 'mouvements de portefeuille',
+                'indexes': [models.Index(fields=['user', 'date_creation'], name='dashboard_m_user_id_37aecc_idx')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('paiement__isnull', False)), fields=('paiement', 'motif'), name='mouvement_unique_par_paiement')],
+            },
+        ),
+        migrations.RunPython(ouvrir_soldes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:45
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0009_journal_portefeuille'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='facture',
+            name='pdf_hash',
+            field=models.CharField(blank=True, help_text='Empreinte du contenu rendu dans pdf_file', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='TacheFacturePDF',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('terminee', 'Terminée'), ('echouee', 'Échouée')], default='en_attente', max_length=20)),
+                ('tentatives', models.IntegerField(default=0)),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_traitement', models.DateTimeField(blank=True, null=True)),
+                ('facture', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='tache_pdf', to='dashboard.facture')),
+            ],
+            options={
+                'verbose_name': 'tâche PDF de facture',
+                'verbose_name_plural': 'tâches PDF de factures',
+                'indexes': [models.Index(fields=['status', 'date_creation'], name='dashboard_t_status_2fbbec_idx')],
+            },
+        ),
+    ]
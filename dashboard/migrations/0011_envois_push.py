@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0010_factures_pdf'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EnvoiPush',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titre', models.CharField(max_length=255)),
+                ('message', models.TextField()),
+                ('url', models.CharField(blank=True, max_length=255, null=True)),
+                ('status', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('envoye', 'Envoyé'), ('abandonne', 'Abandonné')], default='en_attente', max_length=20)),
+                ('tentatives', models.IntegerField(default=0)),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now)),
+                ('derniere_erreur', models.TextField(blank=True)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('date_traitement', models.DateTimeField(blank=True, null=True)),
+                ('date_envoi', models.DateTimeField(blank=True, null=True)),
+                ('notification', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='envois_push', to='dashboard.notification')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='envois_push', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'envoi push',
+                'verbose_name_plural': 'envois push',
+                'indexes': [models.Index(fields=['status', 'prochaine_tentative'], name='dashboard_e_status_b464f1_idx')],
+            },
+        ),
+    ]
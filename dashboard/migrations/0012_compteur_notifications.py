@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:02
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def compter_non_lues(apps, schema_editor):
+    """Initialise le compteur depuis les notifications existantes (un seul UPDATE)."""
+    User = apps.get_model('dashboard', 'User')
+    Notification = apps.get_model('dashboard', 'Notification')
+    non_lues = Notification.objects.filter(user=OuterRef('pk'), lue=False).order_by().values('user').annotate(
+        nombre=Count('pk')
+    ).values('nombre')
+    User.objects.update(notifications_non_lues=Coalesce(Subquery(non_lues), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0011_envois_push'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='notifications_non_lues',
+            field=models.PositiveIntegerField(default=0, help_text='Compteur dénormalisé, maintenu par Notification (UPDATE atomiques)'),
+        ),
+        migrations.RunPython(compter_non_lues, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,134 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:17
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def creer_conversations(apps, schema_editor):
+    """Regroupe les messages existants par annonce et paire d'interlocuteurs (réputés lus)."""
+    Message = apps.get_model('dashboard', 'Message')
+    Conversation = apps.get_model('dashboard', 'Conversation')
+    ParticipantConversation = apps.get_model('dashboard', 'ParticipantConversation')
+
+    groupes = {}
+    messages = Message.objects.order_by('pk').values_list('pk', 'annonce_id', 'sender_id', 'receiver_id', 'timestamp')
+    for pk, annonce_id, sender_id, receiver_id, timestamp in messages.iterator():
+        users = {sender_id, receiver_id}
+        groupe = groupes.setdefault((annonce_id, '-'.join(str(u) for u in sorted(users))), {'users': users, 'ids': []})
+        groupe['ids'].append(pk)
+        groupe['dernier'] = (pk, timestamp)
+
+    for (annonce_id, cle), groupe in groupes.items():
+        dernier, date = groupe['dernier']
+        conversation = Conversation.objects.create(
+            annonce_id=annonce_id, cle=cle, dernier_message_id=dernier, date_dernier_message=date,
+            apercu=Message.objects.filter(pk=dernier).values_list('content', flat=True).get()[:255],
+            nombre_messages=len(groupe['ids']),
+        )
+        ParticipantConversation.objects.bulk_create([
+            ParticipantConversation(conversation=conversation, user_id=user_id, date_derniere_activite=date)
+            for user_id in groupe['users']
+        ])
+        for i in range(0, len(groupe['ids']), 500):
+            Message.objects.filter(pk__in=groupe['ids'][i:i + 500]).update(conversation=conversation)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0012_compteur_notifications'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ParticipantConversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('non_lus', models.PositiveIntegerField(default=0)),
+                ('date_derniere_activite', models.DateTimeField(blank=True, null=True)),
+                ('date_lecture', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'participant à une conversation',
+                'verbose_name_plural': 'participants aux conversations',
+            },
+        ),
+        migrations.AlterModelOptions(
+            name='message',
+            options={},
+        ),
+        migrations.RenameField(
+            model_name='message',
+            old_name='created_at',
+            new_name='timestamp',
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='timestamp',
+            field=models.DateTimeField(auto_now_add=True, verbose_name='Envoyé le'),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='content',
+            field=models.TextField(verbose_name='Contenu du message'),
+        ),
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cle', models.CharField(max_length=100)),
+                ('apercu', models.CharField(blank=True, max_length=255)),
+                ('date_dernier_message', models.DateTimeField(blank=True, null=True)),
+                ('nombre_messages', models.PositiveIntegerField(default=0)),
+                ('date_creation', models.DateTimeField(auto_now_add=True)),
+                ('annonce', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='dashboard.annonce')),
+                ('dernier_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='dashboard.message')),
+            ],
+            options={
+                'verbose_name': 'conversation',
+                'verbose_name_plural': 'conversations',
+            },
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='dashboard.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'timestamp'], name='dashboard_m_convers_f91b00_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'id'], name='dashboard_m_convers_b04334_idx'),
+        ),
+        migrations.AddField(
+            model_name='participantconversation',
+            name='conversation',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participations', to='dashboard.conversation'),
+        ),
+        migrations.AddField(
+            model_name='participantconversation',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='participations_conversation', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='participants',
+            field=models.ManyToManyField(related_name='conversations', through='dashboard.ParticipantConversation', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='participantconversation',
+            index=models.Index(fields=['user', '-date_derniere_activite', '-id'], name='dashboard_p_user_id_79416d_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='participantconversation',
+            constraint=models.UniqueConstraint(fields=('conversation', 'user'), name='participation_unique'),
+        ),
+        migrations.AddConstraint(
+            model_name='conversation',
+            constraint=models.UniqueConstraint(fields=('annonce', 'cle'), name='conversation_unique_par_annonce'),
+        ),
+        migrations.RunPython(creer_conversations, migrations.RunPython.noop),
+    ]
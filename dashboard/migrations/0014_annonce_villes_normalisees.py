@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:23
+
+from django.db import migrations, models
+
+from dashboard.services.geo import normaliser_ville
+
+
+def normaliser_villes(apps, schema_editor):
+    Annonce = apps.get_model('dashboard', 'Annonce')
+    dernier = 0
+    while True:
+        annonces = list(Annonce.objects.filter(pk__gt=dernier).order_by('pk').only('depart', 'arrivee')[:1000])
+        for annonce in annonces:
+            annonce.depart_ville = normaliser_ville(annonce.depart)
+            annonce.arrivee_ville = normaliser_ville(annonce.arrivee)
+        Annonce.objects.bulk_update(annonces, ['depart_ville', 'arrivee_ville'])
+        if len(annonces) < 1000:
+            return
+        dernier = annonces[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0013_conversations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='annonce',
+            name='arrivee_ville',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='annonce',
+            name='depart_ville',
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AddIndex(
+            model_name='annonce',
+            index=models.Index(fields=['status', 'depart_ville', 'date_depart'], name='dashboard_a_status_aa1042_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='annonce',
+            index=models.Index(fields=['status', 'arrivee_ville', 'date_depart'], name='dashboard_a_status_077aa4_idx'),
+        ),
+        migrations.RunPython(normaliser_villes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,123 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+from dashboard.services.geo import geocoder, zones
+
+
+def par_lots(queryset, taille=1000):
+    dernier = 0
+    while True:
+        lot = list(queryset.filter(pk__gt=dernier).order_by('pk')[:taille])
+        if lot:
+            yield lot
+        if len(lot) < taille:
+            return
+        dernier = lot[-1].pk
+
+
+def geocoder_existant(apps, schema_editor):
+    Annonce = apps.get_model('dashboard', 'Annonce')
+    Entrepot = apps.get_model('dashboard', 'Entrepot')
+    Livreur = apps.get_model('dashboard', 'Livreur')
+    ZoneLivreur = apps.get_model('dashboard', 'ZoneLivreur')
+    for annonces in par_lots(Annonce.objects.only('depart', 'arrivee')):
+        for annonce in annonces:
+            annonce.depart_latitude, annonce.depart_longitude, annonce.depart_cellule = geocoder(annonce.depart)
+            annonce.arrivee_latitude, annonce.arrivee_longitude, _ = geocoder(annonce.arrivee)
+        Annonce.objects.bulk_update(annonces, [
+            'depart_latitude', 'depart_longitude', 'depart_cellule', 'arrivee_latitude', 'arrivee_longitude',
+        ])
+    for entrepots in par_lots(Entrepot.objects.only('ville', 'code_postal')):
+        for entrepot in entrepots:
+            entrepot.latitude, entrepot.longitude, entrepot.cellule = geocoder(f"{entrepot.code_postal} {entrepot.ville}")
+        Entrepot.objects.bulk_update(entrepots, ['latitude', 'longitude', 'cellule'])
+    for livreurs in par_lots(Livreur.objects.exclude(zones_livraison='').exclude(zones_livraison=None).only('zones_livraison')):
+        ZoneLivreur.objects.bulk_create([
+            ZoneLivreur(livreur=livreur, libelle=libelle, latitude=lat, longitude=lon, cellule=case)
+            for livreur in livreurs
+            for libelle, lat, lon, case in zones(livreur.zones_livraison)
+        ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0014_annonce_villes_normalisees'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ZoneLivreur',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('libelle', models.CharField(max_length=255)),
+                ('latitude', models.FloatField()),
+                ('longitude', models.FloatField()),
+                ('cellule', models.IntegerField()),
+            ],
+            options={
+                'verbose_name': 'zone de livraison',
+                'verbose_name_plural': 'zones de livraison',
+            },
+        ),
+        migrations.AddField(
+            model_name='annonce',
+            name='arrivee_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='annonce',
+            name='arrivee_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='annonce',
+            name='depart_cellule',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='annonce',
+            name='depart_latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='annonce',
+            name='depart_longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrepot',
+            name='cellule',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrepot',
+            name='latitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='entrepot',
+            name='longitude',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='annonce',
+            index=models.Index(fields=['status', 'depart_cellule', 'date_depart', 'depart_latitude', 'depart_longitude'], name='dashboard_a_status_92112f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='entrepot',
+            index=models.Index(fields=['cellule'], name='dashboard_e_cellule_e178e8_idx'),
+        ),
+        migrations.AddField(
+            model_name='zonelivreur',
+            name='livreur',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='zones', to='dashboard.livreur'),
+        ),
+        migrations.AddIndex(
+            model_name='zonelivreur',
+            index=models.Index(fields=['cellule', 'latitude', 'longitude', 'livreur'], name='dashboard_z_cellule_b15c24_idx'),
+        ),
+        migrations.RunPython(geocoder_existant, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:39
+
+import re
+import unicodedata
+
+from django.db import migrations
+
+# Définitions figées à la date de la migration (indépendantes de
+# dashboard.services.recherche_texte) : table -> (modèle, colonnes indexées)
+INDEX = {
+    'dashboard_recherche_annonce': ('Annonce', ('titre', 'description', 'depart', 'arrivee')),
+    'dashboard_recherche_service': ('Service', ('nom', 'description', 'zone_intervention')),
+    'dashboard_recherche_user': ('User', ('username', 'last_name', 'first_name', 'email', 'phone')),
+}
+LOT = 1000
+
+
+def normaliser(texte):
+    if not texte:
+        return ''
+    texte = unicodedata.normalize('NFKD', str(texte)).encode('ascii', 'ignore').decode().lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', texte))
+
+
+def _creer_sqlite(cursor, table, colonnes):
+    cursor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5("
+        f"{', '.join(colonnes)}, tokenize = 'unicode61 remove_diacritics 2')"
+    )
+    return (
+        f"INSERT OR REPLACE INTO {table} (rowid, {', '.join(colonnes)}) "
+        f"VALUES ({', '.join(['%s'] * (len(colonnes) + 1))})"
+    )
+
+
+def _creer_postgresql(cursor, table, colonnes):
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table} (id bigint PRIMARY KEY, document tsvector NOT NULL)")
+    cursor.execute(f"CREATE INDEX IF NOT EXISTS {table}_document ON {table} USING gin (document)")
+    vecteur = ' || '.join(
+        f"setweight(to_tsvector('simple', %s), '{'A' if rang == 0 else 'B'}')" for rang in range(len(colonnes))
+    )
+    return (
+        f"INSERT INTO {table} (id, document) VALUES (%s, {vecteur}) "
+        f"ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document"
+    )
+
+
+CREER = {'sqlite': _creer_sqlite, 'postgresql': _creer_postgresql}
+
+
+def creer_index(apps, schema_editor):
+    connexion = schema_editor.connection
+    creer = CREER.get(connexion.vendor)
+    if creer is None:
+        return  # Autres moteurs : recherche par icontains, sans index
+    with connexion.cursor() as cursor:
+        for table, (nom_modele, colonnes) in INDEX.items():
+            insertion = creer(cursor, table, colonnes)
+            lignes = apps.get_model('dashboard', nom_modele)._base_manager.using(connexion.alias) \
+                .order_by('pk').values_list('pk', *colonnes)
+            dernier = None
+            while True:
+                lot = list((lignes if dernier is None else lignes.filter(pk__gt=dernier))[:LOT])
+                cursor.executemany(insertion, [[ligne[0], *map(normaliser, ligne[1:])] for ligne in lot])
+                if len(lot) < LOT:
+                    break
+                dernier = lot[-1][0]
+
+
+def supprimer_index(apps, schema_editor):
+    connexion = schema_editor.connection
+    if connexion.vendor in CREER:
+        with connexion.cursor() as cursor:
+            for table in INDEX:
+                cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0015_geolocalisation'),
+    ]
+
+    operations = [
+        migrations.RunPython(creer_index, supprimer_index),
+    ]
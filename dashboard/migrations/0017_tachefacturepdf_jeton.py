@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0016_recherche_texte'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tachefacturepdf',
+            name='jeton',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0017_tachefacturepdf_jeton'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='envoipush',
+            name='jeton',
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
@@ -1,19 +1,56 @@
-from django.db import models
+from django.db import models, transaction, IntegrityError
 from django.contrib.auth.models import AbstractUser
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator, RegexValidator
-from django.db.models import Sum
-from django.db.models.signals import post_save
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
+from collections import Counter, defaultdict
+from decimal import Decimal
 import uuid
 import os
 
+from dashboard.services.events import canal_utilisateur, evenement_notification, publier_messages
+from dashboard.services.geo import geocoder, normaliser_ville, zones
+
 def generate_unique_reference(prefix, length=6):
     """Génère une référence unique avec préfixe."""
     return f"{prefix}-{uuid.uuid4().hex[:length].upper()}"
 
 
+def date_locale(valeur):
+    """Convertit un datetime (conscient ou non) en date locale."""
+    if valeur is None:
+        return timezone.localdate()
+    if timezone.is_aware(valeur):
+        return timezone.localtime(valeur).date()
+    return valeur.date()
+
+
+class EtatInitialMixin:
+    """Mémorise les valeurs chargées depuis la base pour détecter les changements sans requête."""
+    champs_suivis = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._memoriser_etat()
+        return instance
+
+    def _memoriser_etat(self):
+        self._etat_initial = {champ: self.__dict__.get(champ) for champ in self.champs_suivis}
+
+    def valeur_initiale(self, champ, defaut=None):
+        """Retourne la valeur du champ telle que chargée depuis la base."""
+        return getattr(self, '_etat_initial', {}).get(champ, defaut)
+
+    def etat_connu(self):
+        """Indique si l'état initial de l'instance est connu."""
+        return hasattr(self, '_etat_initial')
+
+
 #By Oceane
 class Message(models.Model):
     sender = models.ForeignKey(
@@ -22,17 +59,133 @@ class Message(models.Model):
     receiver = models.ForeignKey(
         'User', related_name='received_messages', on_delete=models.CASCADE
     )
+    # Facultative pour les messages antérieurs aux conversations ; exigée par l'API
     annonce = models.ForeignKey(
-        'Annonce', related_name='messages', on_delete=models.CASCADE
+        'Annonce', related_name='messages', on_delete=models.CASCADE, null=True, blank=True
+    )
+    conversation = models.ForeignKey(
+        'Conversation', related_name='messages', on_delete=models.CASCADE, null=True, blank=True
     )
     content = models.TextField(verbose_name="Contenu du message")
     timestamp = models.DateTimeField(auto_now_add=True, verbose_name="Envoyé le")
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['conversation', 'timestamp']),
+            models.Index(fields=['conversation', 'id']),
+        ]
+
     def __str__(self):
         return f"De {self.sender.username} à {self.receiver.username} ({self.timestamp.strftime('%d/%m/%Y %H:%M')})"
 
+    def save(self, *args, **kwargs):
+        """Rattache le message à sa conversation et met à jour le dernier message de celle-ci."""
+        is_new = self.pk is None
+        with transaction.atomic():
+            if is_new and self.conversation_id is None:
+                self.conversation = Conversation.pour(self.annonce_id, self.sender_id, self.receiver_id)
+            super().save(*args, **kwargs)
+            if is_new:
+                self.conversation.enregistrer_message(self)
+
+
+class Conversation(models.Model):
+    """
+    Fil de discussion entre participants autour d'une annonce. Le dernier
+    message est dénormalisé pour afficher la boîte de réception sans jointure
+    sur les messages.
+    """
+    APERCU = 255
+
+    annonce = models.ForeignKey(
+        'Annonce', related_name='conversations', on_delete=models.CASCADE, null=True, blank=True
+    )
+    participants = models.ManyToManyField(
+        'User', through='ParticipantConversation', related_name='conversations'
+    )
+    # Ids des participants triés (« 3-17 ») : une seule conversation par annonce et groupe
+    cle = models.CharField(max_length=100)
+    dernier_message = models.ForeignKey(
+        Message, related_name='+', on_delete=models.SET_NULL, null=True, blank=True
+    )
+    apercu = models.CharField(max_length=APERCU, blank=True)
+    date_dernier_message = models.DateTimeField(null=True, blank=True)
+    nombre_messages = models.PositiveIntegerField(default=0)
+    date_creation = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('conversation')
+        verbose_name_plural = _('conversations')
+        constraints = [
+            models.UniqueConstraint(fields=['annonce', 'cle'], name='conversation_unique_par_annonce'),
+        ]
+
+    def __str__(self):
+        return f"Conversation {self.cle} (annonce {self.annonce_id})"
+
+    @staticmethod
+    def cle_participants(user_ids):
+        return '-'.join(str(pk) for pk in sorted(set(user_ids)))
+
+    @classmethod
+    def pour(cls, annonce_id, *user_ids):
+        """Conversation de ces participants sur l'annonce, créée au besoin avec leurs participations."""
+        cle = cls.cle_participants(user_ids)
+        conversation = cls.objects.filter(annonce_id=annonce_id, cle=cle).first()
+        if conversation is not None:
+            return conversation
+        try:
+            with transaction.atomic():
+                conversation = cls.objects.create(annonce_id=annonce_id, cle=cle)
+                ParticipantConversation.objects.bulk_create([
+                    ParticipantConversation(conversation=conversation, user_id=pk) for pk in set(user_ids)
+                ])
+                return conversation
+        except IntegrityError:
+            # Créée entre-temps par une requête concurrente
+            return cls.objects.get(annonce_id=annonce_id, cle=cle)
+
+    def enregistrer_message(self, message):
+        """Dernier message, compteur et activité des participants ; non lus des destinataires."""
+        Conversation.objects.filter(pk=self.pk).update(
+            dernier_message=message, apercu=message.content[:self.APERCU],
+            date_dernier_message=message.timestamp, nombre_messages=F('nombre_messages') + 1,
+        )
+        self.participations.update(date_derniere_activite=message.timestamp)
+        self.participations.exclude(user_id=message.sender_id).update(non_lus=F('non_lus') + 1)
+
+    def marquer_lue(self, user):
+        """Remet à zéro les non lus de `user` dans la conversation. Retourne le nombre remis à zéro."""
+        participation = self.participations.filter(user=user)
+        non_lus = participation.values_list('non_lus', flat=True).first() or 0
+        participation.update(non_lus=0, date_lecture=timezone.now())
+        return non_lus
+
+
+class ParticipantConversation(models.Model):
+    """Participation d'un utilisateur à une conversation : non lus et activité, triés pour sa boîte de réception."""
+    conversation = models.ForeignKey(Conversation, related_name='participations', on_delete=models.CASCADE)
+    user = models.ForeignKey('User', related_name='participations_conversation', on_delete=models.CASCADE)
+    non_lus = models.PositiveIntegerField(default=0)
+    # Copie de Conversation.date_dernier_message : l'index (user, activité) sert la boîte de réception
+    date_derniere_activite = models.DateTimeField(null=True, blank=True)
+    date_lecture = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = _('participant à une conversation')
+        verbose_name_plural = _('participants aux conversations')
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'user'], name='participation_unique'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-date_derniere_activite', '-id']),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} dans {self.conversation_id}"
+
 
-class User(AbstractUser):
+class User(EtatInitialMixin, AbstractUser):
     USER_TYPE_CHOICES = (
         ('admin', 'Administrateur'),
         ('livreur', 'Livreur'),
@@ -83,6 +236,9 @@ class User(AbstractUser):
     langue_preference = models.CharField(max_length=10, default='fr')
     portefeuille_solde = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
     date_derniere_connexion = models.DateTimeField(null=True, blank=True)
+    notifications_non_lues = models.PositiveIntegerField(
+        default=0, help_text="Compteur dénormalisé, maintenu par Notification (UPDATE atomiques)"
+    )
     
     class Meta:
         verbose_name = _('utilisateur')
@@ -93,6 +249,8 @@ class User(AbstractUser):
             models.Index(fields=['user_type']),
         ]
 
+    champs_suivis = ('user_type',)
+
     def __str__(self):
         return self.username
     
@@ -101,6 +259,16 @@ class User(AbstractUser):
         is_new = self.pk is None
         super().save(*args, **kwargs)
         
+        # Mise à jour des cumuls d'inscriptions par type d'utilisateur
+        ancien_type = self.valeur_initiale('user_type')
+        if is_new:
+            StatInscriptionJour.incrementer(date_locale(self.date_joined), user_type=self.user_type)
+        elif self.etat_connu() and ancien_type != self.user_type:
+            jour = date_locale(self.date_joined)
+            StatInscriptionJour.incrementer(jour, nombre=-1, user_type=ancien_type)
+            StatInscriptionJour.incrementer(jour, user_type=self.user_type)
+        self._memoriser_etat()
+        
         # Création automatique des profils selon le type d'utilisateur
         if is_new:
             if self.user_type == 'livreur':
@@ -151,7 +319,7 @@ def set_user_type_for_superuser(sender, instance, created, **kwargs):
         instance.save(update_fields=['user_type'])
 
 # Modifié: Changement de l'ordre de définition des modèles pour résoudre le problème de référence circulaire
-class Livreur(models.Model):
+class Livreur(EtatInitialMixin, models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='livreur_profile')
     verified = models.BooleanField(default=False)
     rating = models.DecimalField(
@@ -179,9 +347,21 @@ class Livreur(models.Model):
         verbose_name = _('livreur')
         verbose_name_plural = _('livreurs')
     
+    champs_suivis = ('zones_livraison',)
+    
     def __str__(self):
         return f"Livreur: {self.user.username}"
     
+    def save(self, *args, **kwargs):
+        """Regéocode les zones de livraison (ZoneLivreur) quand le texte saisi change."""
+        update_fields = kwargs.get('update_fields')
+        zones_modifiees = (update_fields is None or 'zones_livraison' in update_fields) \
+            and self.valeur_initiale('zones_livraison') != self.zones_livraison
+        super().save(*args, **kwargs)
+        if zones_modifiees:
+            ZoneLivreur.synchroniser([self])
+        self._memoriser_etat()
+    
     def update_rating(self):
         """Met à jour la note moyenne du livreur."""
         evaluations = self.user.evaluations_recues.all()
@@ -193,6 +373,35 @@ class Livreur(models.Model):
         """Vérifie si les documents obligatoires sont fournis."""
         return bool(self.id_card and self.driving_license)
 
+
+class ZoneLivreur(models.Model):
+    """Zone de livraison géocodée, déduite de Livreur.zones_livraison (une ligne par zone localisable)."""
+    livreur = models.ForeignKey(Livreur, on_delete=models.CASCADE, related_name='zones')
+    libelle = models.CharField(max_length=255)
+    latitude = models.FloatField()
+    longitude = models.FloatField()
+    cellule = models.IntegerField()
+
+    class Meta:
+        verbose_name = _('zone de livraison')
+        verbose_name_plural = _('zones de livraison')
+        indexes = [
+            models.Index(fields=['cellule', 'latitude', 'longitude', 'livreur']),
+        ]
+
+    def __str__(self):
+        return self.libelle
+
+    @classmethod
+    def synchroniser(cls, livreurs):
+        """Remplace les zones des livreurs par celles de leur texte `zones_livraison`."""
+        cls.objects.filter(livreur__in=[livreur.pk for livreur in livreurs]).delete()
+        return cls.objects.bulk_create([
+            cls(livreur=livreur, libelle=libelle, latitude=lat, longitude=lon, cellule=case)
+            for livreur in livreurs
+            for libelle, lat, lon, case in zones(livreur.zones_livraison)
+        ])
+
 class DemandeValidationLivreur(models.Model):
     STATUS_CHOICES = [
         ('en_attente', 'En attente'),
@@ -235,9 +444,24 @@ class DemandeValidationLivreur(models.Model):
         # Si le statut passe à refusée, aussi mettre à jour la date de traitement
         elif self.status == 'refusee' and not self.date_traitement:
             self.date_traitement = timezone.now()
+        
+        # Notifier seulement lors du passage à « validée », pas à chaque enregistrement
+        devient_validee = self.status == 'validee' and (
+            self.pk is None
+            or DemandeValidationLivreur.objects.filter(pk=self.pk).values_list('status', flat=True).first() != 'validee'
+        )
             
         super().save(*args, **kwargs)
         
+        if devient_validee:
+            Notification.bulk_notify(
+                [self.user_id],
+                titre="Demande de livreur acceptée",
+                message="Votre demande pour devenir livreur a été acceptée. Vous pouvez maintenant proposer vos services.",
+                type_notification='success',
+                on_commit=True
+            )
+        
         # Si la demande est validée, mettre à jour le statut du livreur
         if self.status == 'validee':
             try:
@@ -245,16 +469,6 @@ class DemandeValidationLivreur(models.Model):
                 livreur = Livreur.objects.get(user=self.user)
                 livreur.verified = True
                 livreur.save(update_fields=['verified'])
-                
-                # Notification à l'utilisateur (si la fonction existe)
-                if 'Notification' in globals():
-                    Notification.creer_notification(
-                        user=self.user,
-                        titre="Demande de livreur acceptée",
-                        message="Votre demande pour devenir livreur a été acceptée. Vous pouvez maintenant proposer vos services.",
-                        type_notification='success',
-                        lien=None
-                    )
             except Livreur.DoesNotExist:
                 # Si le livreur n'existe pas pour une raison quelconque, on peut le créer
                 Livreur.objects.create(
@@ -285,15 +499,7 @@ class DemandeValidationLivreur(models.Model):
                 derniere_demande_validation=self
             )
         
-        # Notification à l'utilisateur
-        Notification.creer_notification(
-            user=self.user,
-            titre="Demande de livreur acceptée",
-            message="Votre demande pour devenir livreur a été acceptée. Vous pouvez maintenant proposer vos services.",
-            type_notification='success',
-            lien=None
-        )
-        
+        # La notification à l'utilisateur est envoyée par save()
         return True
     
     def refuser(self, admin, motif, notes=None):
@@ -307,12 +513,12 @@ class DemandeValidationLivreur(models.Model):
         self.save()
         
         # Notification à l'utilisateur
-        Notification.creer_notification(
-            user=self.user,
+        Notification.bulk_notify(
+            [self.user_id],
             titre="Demande de livreur refusée",
             message=f"Votre demande pour devenir livreur a été refusée. Motif: {motif}",
             type_notification='warning',
-            lien=None
+            on_commit=True
         )
         
         return True
@@ -326,12 +532,12 @@ class DemandeValidationLivreur(models.Model):
         self.save()
         
         # Notification à l'utilisateur
-        Notification.creer_notification(
-            user=self.user,
+        Notification.bulk_notify(
+            [self.user_id],
             titre="Demande de livreur en cours d'examen",
             message="Votre demande est en cours d'examen par notre équipe.",
             type_notification='info',
-            lien=None
+            on_commit=True
         )
         
         return True
@@ -476,6 +682,15 @@ class Annonce(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     est_urgente = models.BooleanField(default=False)
     vues = models.IntegerField(default=0)
+    # Villes normalisées (normaliser_ville) pour la recherche indexée
+    depart_ville = models.CharField(max_length=255, blank=True, editable=False)
+    arrivee_ville = models.CharField(max_length=255, blank=True, editable=False)
+    # Coordonnées géocodées hors ligne (services.geo) ; la case de grille indexe la proximité
+    depart_latitude = models.FloatField(null=True, blank=True, editable=False)
+    depart_longitude = models.FloatField(null=True, blank=True, editable=False)
+    depart_cellule = models.IntegerField(null=True, blank=True, editable=False)
+    arrivee_latitude = models.FloatField(null=True, blank=True, editable=False)
+    arrivee_longitude = models.FloatField(null=True, blank=True, editable=False)
     
     class Meta:
         verbose_name = _('annonce')
@@ -484,11 +699,36 @@ class Annonce(models.Model):
             models.Index(fields=['status', 'type_annonce']),
             models.Index(fields=['created_at']),
             models.Index(fields=['date_depart']),
+            models.Index(fields=['status', 'depart_ville', 'date_depart']),
+            models.Index(fields=['status', 'arrivee_ville', 'date_depart']),
+            # Couvrant pour la recherche de proximité : la table n'est pas lue
+            models.Index(fields=['status', 'depart_cellule', 'date_depart', 'depart_latitude', 'depart_longitude']),
         ]
     
     def __str__(self):
         return self.titre
     
+    # Champs déduits de chaque lieu saisi
+    CHAMPS_DEDUITS = {
+        'depart': ('depart_ville', 'depart_latitude', 'depart_longitude', 'depart_cellule'),
+        'arrivee': ('arrivee_ville', 'arrivee_latitude', 'arrivee_longitude'),
+    }
+    
+    def save(self, *args, **kwargs):
+        """Tient à jour les villes normalisées et les coordonnées."""
+        self.depart_ville = normaliser_ville(self.depart)
+        self.arrivee_ville = normaliser_ville(self.arrivee)
+        self.depart_latitude, self.depart_longitude, self.depart_cellule = geocoder(self.depart)
+        self.arrivee_latitude, self.arrivee_longitude, _ = geocoder(self.arrivee)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            champs = set(update_fields)
+            for lieu, deduits in self.CHAMPS_DEDUITS.items():
+                if lieu in champs:
+                    champs.update(deduits)
+            kwargs['update_fields'] = champs
+        super().save(*args, **kwargs)
+    
     def clean(self):
         """Valide les dates de l'annonce."""
         from django.core.exceptions import ValidationError
@@ -571,14 +811,28 @@ class Entrepot(models.Model):
         null=True, 
         blank=True
     )
+    latitude = models.FloatField(null=True, blank=True, editable=False)
+    longitude = models.FloatField(null=True, blank=True, editable=False)
+    cellule = models.IntegerField(null=True, blank=True, editable=False)
     
     class Meta:
         verbose_name = _('entrepôt')
         verbose_name_plural = _('entrepôts')
+        indexes = [
+            models.Index(fields=['cellule']),
+        ]
     
     def __str__(self):
         return self.nom
     
+    def save(self, *args, **kwargs):
+        """Géocode l'entrepôt d'après sa ville et son code postal."""
+        self.latitude, self.longitude, self.cellule = geocoder(f"{self.code_postal} {self.ville}")
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'ville', 'code_postal'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'latitude', 'longitude', 'cellule'}
+        super().save(*args, **kwargs)
+    
     def capacite_disponible(self):
         """Calcule la capacité encore disponible."""
         capacite_utilisee = sum(
@@ -607,7 +861,7 @@ class BoxStockage(models.Model):
     def __str__(self):
         return f"Box {self.reference} - {self.entrepot.nom}"
 
-class Livraison(models.Model):
+class Livraison(EtatInitialMixin, models.Model):
     STATUS_CHOICES = (
         ('en_attente', 'En attente'),
         ('en_cours', 'En cours'),
@@ -639,8 +893,11 @@ class Livraison(models.Model):
             models.Index(fields=['reference']),
             models.Index(fields=['status']),
             models.Index(fields=['date_livraison_prevue']),
+            models.Index(fields=['created_at']),
         ]
     
+    champs_suivis = ('status',)
+
     def __str__(self):
         return f"Livraison {self.reference}"
     
@@ -656,15 +913,17 @@ class Livraison(models.Model):
         is_new = self.pk is None
         super().save(*args, **kwargs)
         
-        # Met à jour les compteurs et le statut de l'annonce
+        # Mise à jour des cumuls journaliers de livraisons par statut
+        ancien_status = self.valeur_initiale('status')
         if is_new:
-            if self.livreur.user_type == 'livreur':
-                livreur_profile = self.livreur.livreur_profile
-                livreur_profile.nombre_livraisons += 1
-                livreur_profile.save(update_fields=['nombre_livraisons'])
-            
-            self.annonce.status = 'en_cours'
-            self.annonce.save(update_fields=['status'])
+            StatLivraisonJour.incrementer(date_locale(self.created_at), status=self.status)
+        elif self.etat_connu() and ancien_status != self.status:
+            jour = date_locale(self.created_at)
+            StatLivraisonJour.incrementer(jour, nombre=-1, status=ancien_status)
+            StatLivraisonJour.incrementer(jour, status=self.status)
+        self._memoriser_etat()
+        # Une livraison créée est une offre : l'annonce et le compteur du livreur
+        # ne changent qu'à son acceptation (services.affectation_service)
     
     def est_en_retard(self):
         """Vérifie si la livraison est en retard."""
@@ -687,7 +946,7 @@ class Livraison(models.Model):
                 self.box_stockage.disponible = True
                 self.box_stockage.save(update_fields=['disponible'])
 
-class Paiement(models.Model):
+class Paiement(EtatInitialMixin, models.Model):
     STATUS_CHOICES = (
         ('en_attente', 'En attente'),
         ('reussi', 'Réussi'),
@@ -719,8 +978,11 @@ class Paiement(models.Model):
         indexes = [
             models.Index(fields=['reference']),
             models.Index(fields=['status']),
+            models.Index(fields=['date_paiement']),
         ]
     
+    champs_suivis = ('status', 'mode_paiement', 'montant')
+
     def __str__(self):
         return f"Paiement {self.reference} - {self.montant}€"
     
@@ -730,9 +992,14 @@ class Paiement(models.Model):
             self.reference = generate_unique_reference("PAY")
         
         is_new = self.pk is None
+        # Le changement de statut doit être évalué avant l'écriture en base
+        status_changed = self._status_changed()
         super().save(*args, **kwargs)
         
-        if is_new or self._status_changed():
+        self._mettre_a_jour_cumuls(is_new)
+        self._memoriser_etat()
+        
+        if is_new or status_changed:
             # Générer une facture si le paiement est réussi
             if self.status == 'reussi':
                 Facture.objects.create(
@@ -742,16 +1009,42 @@ class Paiement(models.Model):
                     status_paiement='reussi'
                 )
                 
-                # Mettre à jour le portefeuille du bénéficiaire
-                self.beneficiaire.portefeuille_solde += self.montant
-                self.beneficiaire.save(update_fields=['portefeuille_solde'])
+                # Créditer le portefeuille du bénéficiaire (journal + UPDATE atomique)
+                MouvementPortefeuille.crediter_paiement(self)
+            elif self.status == 'rembourse' and status_changed:
+                MouvementPortefeuille.debiter_remboursement(self)
     
     def _status_changed(self):
         """Vérifie si le statut a changé."""
         if not self.pk:
             return False
-        old_status = Paiement.objects.get(pk=self.pk).status
+        if self.etat_connu():
+            old_status = self.valeur_initiale('status')
+        else:
+            old_status = Paiement.objects.filter(pk=self.pk).values_list('status', flat=True).first()
         return old_status != self.status
+    
+    def _mettre_a_jour_cumuls(self, is_new):
+        """Répercute la création ou la modification sur les cumuls journaliers."""
+        jour = date_locale(self.date_paiement)
+        montant = Decimal(str(self.montant))
+        
+        if not is_new:
+            if not self.etat_connu():
+                return
+            ancien = self._etat_initial
+            if (ancien['status'], ancien['mode_paiement'], ancien['montant']) == (
+                    self.status, self.mode_paiement, montant):
+                return
+            StatPaiementJour.incrementer(
+                jour, nombre=-1, montant_total=-Decimal(str(ancien['montant'])),
+                status=ancien['status'], mode_paiement=ancien['mode_paiement']
+            )
+        
+        StatPaiementJour.incrementer(
+            jour, montant_total=montant,
+            status=self.status, mode_paiement=self.mode_paiement
+        )
 
 class Facture(models.Model):
     reference = models.CharField(max_length=20, unique=True)
@@ -760,6 +1053,7 @@ class Facture(models.Model):
     date_emission = models.DateTimeField(auto_now_add=True)
     montant_total = models.DecimalField(max_digits=10, decimal_places=2)
     status_paiement = models.CharField(max_length=20, choices=Paiement.STATUS_CHOICES, default='en_attente')
+    pdf_hash = models.CharField(max_length=64, blank=True, help_text="Empreinte du contenu rendu dans pdf_file")
     
     class Meta:
         verbose_name = _('facture')
@@ -772,17 +1066,164 @@ class Facture(models.Model):
     def __str__(self):
         return f"Facture {self.reference}"
     
-    def generer_pdf(self):
-        """Génère le fichier PDF de la facture."""
-        # Cette méthode serait implémentée avec une bibliothèque comme reportlab
-        # Pour l'instant, c'est un placeholder
-        from django.core.files.base import ContentFile
-        
-        # Code pour générer le PDF
-        # pdf_content = create_pdf(self)
-        # self.pdf_file.save(f"facture_{self.reference}.pdf", ContentFile(pdf_content))
-        # self.save(update_fields=['pdf_file'])
-        pass
+    def generer_pdf(self, force=False):
+        """
+        Génère le fichier PDF de la facture (media/factures/) si son contenu
+        a changé depuis le dernier rendu. Retourne True si le fichier a été écrit.
+        """
+        from dashboard.services.invoice_pdf import ensure_invoice_pdf
+        return ensure_invoice_pdf(self, force=force)
+
+class TacheFacturePDF(models.Model):
+    """File d'attente en base des générations de PDF de factures."""
+    STATUS_CHOICES = (
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('terminee', 'Terminée'),
+        ('echouee', 'Échouée'),
+    )
+    
+    facture = models.OneToOneField(Facture, on_delete=models.CASCADE, related_name='tache_pdf')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='en_attente')
+    tentatives = models.IntegerField(default=0)
+    derniere_erreur = models.TextField(blank=True)
+    # Réservation par un worker : seules les tâches portant son jeton lui reviennent
+    jeton = models.CharField(max_length=32, blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_traitement = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('tâche PDF de facture')
+        verbose_name_plural = _('tâches PDF de factures')
+        indexes = [
+            models.Index(fields=['status', 'date_creation']),
+        ]
+    
+    def __str__(self):
+        return f"PDF {self.facture.reference} ({self.get_status_display()})"
+    
+    @classmethod
+    def planifier(cls, facture_ids):
+        """Met en file (ou remet en attente) la génération des factures données."""
+        facture_ids = list(facture_ids)
+        cls.objects.filter(facture_id__in=facture_ids).exclude(status='en_attente').update(
+            status='en_attente', tentatives=0, derniere_erreur=''
+        )
+        cls.objects.bulk_create(
+            [cls(facture_id=pk) for pk in facture_ids], ignore_conflicts=True, batch_size=1000
+        )
+
+class MouvementPortefeuille(models.Model):
+    """
+    Journal append-only des crédits et débits de portefeuille.
+
+    User.portefeuille_solde en est le cumul, maintenu par UPDATE atomique
+    (F()) dans la même transaction que l'écriture du mouvement.
+    """
+    SENS_CHOICES = (
+        ('credit', 'Crédit'),
+        ('debit', 'Débit'),
+    )
+    
+    MOTIF_CHOICES = (
+        ('paiement', 'Paiement reçu'),
+        ('remboursement', 'Remboursement'),
+        ('ajustement', 'Ajustement'),
+        ('retrait', 'Retrait'),
+    )
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='mouvements_portefeuille')
+    sens = models.CharField(max_length=6, choices=SENS_CHOICES)
+    motif = models.CharField(max_length=20, choices=MOTIF_CHOICES)
+    montant = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(Decimal('0.01'))])
+    paiement = models.ForeignKey(
+        Paiement, on_delete=models.SET_NULL, related_name='mouvements_portefeuille',
+        null=True, blank=True
+    )
+    solde_apres = models.DecimalField(max_digits=10, decimal_places=2, help_text="Solde après ce mouvement")
+    libelle = models.CharField(max_length=255, blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        verbose_name = _('mouvement de portefeuille')
+        verbose_name_plural = _('mouvements de portefeuille')
+        indexes = [
+            models.Index(fields=['user', 'date_creation']),
+        ]
+        constraints = [
+            # Un paiement n'est crédité (ou remboursé) qu'une seule fois
+            models.UniqueConstraint(
+                fields=['paiement', 'motif'],
+                condition=models.Q(paiement__isnull=False),
+                name='mouvement_unique_par_paiement',
+            ),
+        ]
+    
+    def __str__(self):
+        signe = '+' if self.sens == 'credit' else '-'
+        return f"{self.user} {signe}{self.montant}€ ({self.get_motif_display()})"
+    
+    def save(self, *args, **kwargs):
+        """Le journal est en ajout seul : un mouvement n'est jamais modifié."""
+        if self.pk is not None:
+            raise ValueError("Un mouvement de portefeuille ne peut pas être modifié.")
+        super().save(*args, **kwargs)
+    
+    @property
+    def delta(self):
+        return self.montant if self.sens == 'credit' else -self.montant
+    
+    @classmethod
+    def enregistrer(cls, user, montant, sens, motif, paiement=None, libelle=''):
+        """
+        Écrit un mouvement et met à jour le solde dans la même transaction.
+
+        Idempotent pour un couple (paiement, motif) : si le mouvement existe
+        déjà, il est retourné et le solde n'est pas modifié.
+        """
+        montant = Decimal(str(montant))
+        delta = montant if sens == 'credit' else -montant
+        user_id = getattr(user, 'pk', user)
+        try:
+            with transaction.atomic():
+                User.objects.filter(pk=user_id).update(portefeuille_solde=F('portefeuille_solde') + delta)
+                solde = User.objects.filter(pk=user_id).values_list('portefeuille_solde', flat=True).get()
+                mouvement = cls.objects.create(
+                    user_id=user_id, sens=sens, motif=motif, montant=montant,
+                    paiement=paiement, solde_apres=solde, libelle=libelle
+                )
+        except IntegrityError:
+            if paiement is None:
+                raise
+            return cls.objects.get(paiement=paiement, motif=motif)
+        if isinstance(user, User):
+            user.portefeuille_solde = solde
+        return mouvement
+    
+    @staticmethod
+    def _beneficiaire(paiement):
+        """Instance déjà chargée (pour garder son solde à jour) ou simple id."""
+        if Paiement.beneficiaire.is_cached(paiement):
+            return paiement.beneficiaire
+        return paiement.beneficiaire_id
+    
+    @classmethod
+    def crediter_paiement(cls, paiement):
+        """Crédite le bénéficiaire d'un paiement réussi."""
+        return cls.enregistrer(
+            cls._beneficiaire(paiement), paiement.montant, 'credit', 'paiement',
+            paiement=paiement, libelle=f"Paiement {paiement.reference}"
+        )
+    
+    @classmethod
+    def debiter_remboursement(cls, paiement):
+        """Reprend au bénéficiaire le montant d'un paiement remboursé, s'il avait été crédité."""
+        if not cls.objects.filter(paiement=paiement, motif='paiement').exists():
+            return None
+        return cls.enregistrer(
+            cls._beneficiaire(paiement), paiement.montant, 'debit', 'remboursement',
+            paiement=paiement, libelle=f"Remboursement {paiement.reference}"
+        )
 
 class Abonnement(models.Model):
     TYPE_CHOICES = (
@@ -802,6 +1243,9 @@ class Abonnement(models.Model):
     class Meta:
         verbose_name = _('abonnement')
         verbose_name_plural = _('abonnements')
+        indexes = [
+            models.Index(fields=['date_debut']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.get_type_abonnement_display()}"
@@ -818,7 +1262,7 @@ class Abonnement(models.Model):
             return 0
         return (self.date_fin - today).days
 
-class Notification(models.Model):
+class Notification(EtatInitialMixin, models.Model):
     TYPE_CHOICES = (
         ('info', 'Information'),
         ('success', 'Succès'),
@@ -842,9 +1286,64 @@ class Notification(models.Model):
             models.Index(fields=['date_creation']),
         ]
     
+    champs_suivis = ('lue',)
+    
     def __str__(self):
         return self.titre
     
+    def save(self, *args, **kwargs):
+        """Répercute la création ou le changement de `lue` sur le compteur de l'utilisateur."""
+        is_new = self.pk is None
+        etait_lue = self.valeur_initiale('lue') if self.etat_connu() else None
+        super().save(*args, **kwargs)
+        
+        if is_new:
+            delta = 0 if self.lue else 1
+        elif etait_lue is not None and etait_lue != self.lue:
+            delta = -1 if self.lue else 1
+        else:
+            delta = 0
+        if delta:
+            Notification.ajuster_compteurs({self.user_id: delta})
+        self._memoriser_etat()
+    
+    @staticmethod
+    def ajuster_compteurs(deltas):
+        """Applique {user_id: delta} aux compteurs de non lues : un UPDATE par valeur de delta."""
+        par_delta = defaultdict(list)
+        for user_id, delta in deltas.items():
+            if delta:
+                par_delta[delta].append(user_id)
+        for delta, ids in par_delta.items():
+            User.objects.filter(pk__in=ids).update(
+                notifications_non_lues=Greatest(F('notifications_non_lues') + delta, Value(0))
+            )
+    
+    @classmethod
+    def marquer_lues(cls, user, ids=None):
+        """
+        Marque comme lues les notifications de `user` (toutes, ou celles de `ids`)
+        en un seul UPDATE et décrémente son compteur d'autant. Retourne le nombre marqué.
+        """
+        with transaction.atomic():
+            notifications = cls.objects.filter(user=user, lue=False)
+            if ids is not None:
+                notifications = notifications.filter(pk__in=ids)
+            nombre = notifications.update(lue=True)
+            if nombre:
+                cls.ajuster_compteurs({user.pk: -nombre})
+                user.notifications_non_lues = max(user.notifications_non_lues - nombre, 0)
+        return nombre
+    
+    @classmethod
+    def recompter_non_lues(cls, users=None):
+        """Recalcule les compteurs depuis les notifications (tous les utilisateurs par défaut)."""
+        non_lues = cls.objects.filter(user=OuterRef('pk'), lue=False).order_by().values('user').annotate(
+            nombre=Count('pk')
+        ).values('nombre')
+        users = User.objects.all() if users is None else users
+        return users.update(notifications_non_lues=Coalesce(Subquery(non_lues), Value(0)))
+    
     @classmethod
     def creer_notification(cls, user, titre, message, type_notification='info', lien=None):
         """Crée une nouvelle notification."""
@@ -855,6 +1354,118 @@ class Notification(models.Model):
             type_notification=type_notification,
             lien=lien
         )
+    
+    @classmethod
+    def bulk_notify(cls, users, titre, message, type_notification='info', lien=None,
+                    user_type=None, batch_size=1000, on_commit=False, push=False):
+        """
+        Envoie la même notification à un ensemble d'utilisateurs, par bulk_create
+        de `batch_size` lignes.
+        
+        `users` : liste d'utilisateurs ou d'ids, queryset, ou None pour tous ;
+        `user_type` restreint un queryset (ou tous les utilisateurs) à un segment.
+        Avec on_commit=True, l'envoi est différé après la validation de la
+        transaction courante et la méthode retourne None ; sinon elle retourne
+        le nombre de notifications créées. push=True met aussi en file un
+        push par destinataire (EnvoiPush).
+        """
+        if isinstance(users, models.QuerySet) and users.query.is_sliced:
+            # Un queryset découpé ne peut plus être filtré : ses ids sont lus d'emblée
+            users = list(users.values_list('pk', flat=True))
+        if users is not None and not isinstance(users, models.QuerySet):
+            if user_type is not None:
+                raise ValueError("user_type ne s'applique qu'à un queryset ou à users=None")
+            users = [u if isinstance(u, int) else u.pk for u in users]
+        
+        def envoyer():
+            champs = dict(titre=titre, message=message, type_notification=type_notification, lien=lien)
+            total = 0
+            for ids in cls._lots_destinataires(users, user_type, batch_size):
+                notifications = cls.objects.bulk_create(
+                    [cls(user_id=pk, **champs) for pk in ids], batch_size=batch_size
+                )
+                cls.ajuster_compteurs(Counter(ids))
+                publier_messages([
+                    (canal_utilisateur(n.user_id), 'notification', evenement_notification(n)) for n in notifications
+                ])
+                if push:
+                    EnvoiPush.planifier(ids, titre, message, lien, notifications, batch_size)
+                total += len(ids)
+            return total
+        
+        if on_commit:
+            transaction.on_commit(envoyer)
+            return None
+        return envoyer()
+    
+    @staticmethod
+    def _lots_destinataires(users, user_type, batch_size):
+        """Ids des destinataires par lots ; un queryset est parcouru par pagination sur la clé."""
+        if isinstance(users, list):
+            for i in range(0, len(users), batch_size):
+                yield users[i:i + batch_size]
+            return
+        
+        queryset = User.objects.all() if users is None else users
+        if user_type is not None:
+            queryset = queryset.filter(user_type=user_type)
+        dernier = 0
+        while True:
+            ids = list(queryset.filter(pk__gt=dernier).order_by('pk').values_list('pk', flat=True)[:batch_size])
+            if ids:
+                yield ids
+            if len(ids) < batch_size:
+                return
+            dernier = ids[-1]
+
+class EnvoiPush(models.Model):
+    """
+    File d'envoi (outbox) des notifications push. Les requêtes HTTP au
+    fournisseur sont faites par `manage.py dispatch_push`, hors des requêtes web.
+    """
+    STATUS_CHOICES = (
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours'),
+        ('envoye', 'Envoyé'),
+        ('abandonne', 'Abandonné'),
+    )
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='envois_push')
+    notification = models.ForeignKey(
+        Notification, on_delete=models.SET_NULL, related_name='envois_push', null=True, blank=True
+    )
+    titre = models.CharField(max_length=255)
+    message = models.TextField()
+    url = models.CharField(max_length=255, blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='en_attente')
+    tentatives = models.IntegerField(default=0)
+    prochaine_tentative = models.DateTimeField(default=timezone.now)
+    derniere_erreur = models.TextField(blank=True)
+    # Réservation par un dispatcher : seuls les envois portant son jeton lui reviennent
+    jeton = models.CharField(max_length=32, blank=True)
+    date_creation = models.DateTimeField(auto_now_add=True)
+    date_traitement = models.DateTimeField(null=True, blank=True)
+    date_envoi = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = _('envoi push')
+        verbose_name_plural = _('envois push')
+        indexes = [
+            models.Index(fields=['status', 'prochaine_tentative']),
+        ]
+    
+    def __str__(self):
+        return f"Push {self.titre} à {self.user_id} ({self.get_status_display()})"
+    
+    @classmethod
+    def planifier(cls, user_ids, titre, message, url=None, notifications=None, batch_size=1000):
+        """Met en file un push par utilisateur (`notifications` : liées, dans le même ordre)."""
+        notifications = notifications or [None] * len(user_ids)
+        return cls.objects.bulk_create([
+            cls(user_id=pk, titre=titre, message=message, url=url,
+                notification_id=notification.pk if notification is not None else None)
+            for pk, notification in zip(user_ids, notifications)
+        ], batch_size=batch_size)
 
 class Evaluation(models.Model):
     evaluateur = models.ForeignKey(User, on_delete=models.CASCADE, related_name='evaluations_donnees')
@@ -891,11 +1502,12 @@ class Evaluation(models.Model):
             self.evalue.prestataire_profile.update_rating()
         
         # Envoyer une notification à l'évalué
-        Notification.objects.create(
-            user=self.evalue,
+        Notification.bulk_notify(
+            [self.evalue_id],
             titre=f"Nouvelle évaluation reçue",
             message=f"{self.evaluateur.username} vous a donné une note de {self.note}/5.",
-            type_notification='info'
+            type_notification='info',
+            on_commit=True
         )
 
 class PieceJustificative(models.Model):
@@ -946,11 +1558,12 @@ class PieceJustificative(models.Model):
         self.save()
         
         # Envoyer une notification à l'utilisateur
-        Notification.creer_notification(
-            user=self.user,
+        Notification.bulk_notify(
+            [self.user_id],
             titre=f"Pièce justificative validée",
             message=f"Votre {self.get_type_piece_display()} a été validée.",
-            type_notification='success'
+            type_notification='success',
+            on_commit=True
         )
         
         # Si l'utilisateur est un livreur et que la pièce est liée à une demande, 
@@ -968,15 +1581,15 @@ class PieceJustificative(models.Model):
                 self.demande_validation.en_examen(validateur, "Documents obligatoires validés")
                 
                 # Notification aux administrateurs
-                admins = User.objects.filter(user_type='admin')
-                for admin in admins:
-                    Notification.creer_notification(
-                        user=admin,
-                        titre="Nouvelle demande livreur à examiner",
-                        message=f"Les pièces justificatives de {self.user.username} ont été validées. Sa demande est prête à être examinée.",
-                        type_notification='info',
-                        lien="/admin/validation-livreurs/"
-                    )
+                Notification.bulk_notify(
+                    None,
+                    user_type='admin',
+                    titre="Nouvelle demande livreur à examiner",
+                    message=f"Les pièces justificatives de {self.user.username} ont été validées. Sa demande est prête à être examinée.",
+                    type_notification='info',
+                    lien="/admin/validation-livreurs/",
+                    on_commit=True
+                )
 
 class Contrat(models.Model):
     STATUS_CHOICES = (
@@ -1044,11 +1657,12 @@ class Contrat(models.Model):
             ])
         
         # Envoyer une notification à l'utilisateur
-        Notification.creer_notification(
-            user=self.user,
+        Notification.bulk_notify(
+            [self.user_id],
             titre=f"Contrat signé",
             message=f"Votre contrat {self.reference} a été activé.",
-            type_notification='success'
+            type_notification='success',
+            on_commit=True
         )
     
     def resilier(self, raison=None):
@@ -1085,6 +1699,7 @@ class LogConnexion(models.Model):
         verbose_name_plural = _('logs de connexion')
         indexes = [
             models.Index(fields=['user', 'date_connexion']),
+            models.Index(fields=['date_connexion']),
             models.Index(fields=['adresse_ip']),
             models.Index(fields=['reussi']),
         ]
@@ -1122,7 +1737,107 @@ class LogConnexion(models.Model):
             user.save(update_fields=['date_derniere_connexion'])
         
         return log
-        # À ajouter dans votre models.py
+
+
+# Cumuls journaliers pré-agrégés pour les statistiques
+class StatistiqueJournaliere(models.Model):
+    """Base des tables de cumuls journaliers maintenues de façon incrémentale."""
+    jour = models.DateField()
+    nombre = models.IntegerField(default=0)
+    
+    class Meta:
+        abstract = True
+    
+    @classmethod
+    def incrementer(cls, jour, nombre=1, montant_total=None, **dimensions):
+        """Ajoute des deltas au cumul du jour pour les dimensions données."""
+        deltas = {'nombre': nombre}
+        if montant_total is not None:
+            deltas['montant_total'] = montant_total
+        expressions = {champ: F(champ) + valeur for champ, valeur in deltas.items()}
+        
+        cumuls = cls.objects.filter(jour=jour, **dimensions)
+        if cumuls.update(**expressions):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(jour=jour, **dimensions, **deltas)
+        except IntegrityError:
+            # Ligne créée entre-temps par une autre transaction
+            cumuls.update(**expressions)
+
+
+class StatPaiementJour(StatistiqueJournaliere):
+    """Nombre et montant des paiements par jour, statut et mode de paiement."""
+    status = models.CharField(max_length=20, choices=Paiement.STATUS_CHOICES)
+    mode_paiement = models.CharField(max_length=20, choices=Paiement.MODE_CHOICES)
+    montant_total = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        verbose_name = _('cumul journalier des paiements')
+        verbose_name_plural = _('cumuls journaliers des paiements')
+        unique_together = ('jour', 'status', 'mode_paiement')
+        indexes = [
+            models.Index(fields=['status', 'jour']),
+        ]
+    
+    def __str__(self):
+        return f"Paiements {self.jour} ({self.status}/{self.mode_paiement})"
+
+
+class StatLivraisonJour(StatistiqueJournaliere):
+    """Nombre de livraisons créées par jour et par statut."""
+    status = models.CharField(max_length=20, choices=Livraison.STATUS_CHOICES)
+    
+    class Meta:
+        verbose_name = _('cumul journalier des livraisons')
+        verbose_name_plural = _('cumuls journaliers des livraisons')
+        unique_together = ('jour', 'status')
+        indexes = [
+            models.Index(fields=['status', 'jour']),
+        ]
+    
+    def __str__(self):
+        return f"Livraisons {self.jour} ({self.status})"
+
+
+class StatInscriptionJour(StatistiqueJournaliere):
+    """Nombre d'inscriptions par jour et par type d'utilisateur."""
+    user_type = models.CharField(max_length=20, choices=User.USER_TYPE_CHOICES)
+    
+    class Meta:
+        verbose_name = _('cumul journalier des inscriptions')
+        verbose_name_plural = _('cumuls journaliers des inscriptions')
+        unique_together = ('jour', 'user_type')
+        indexes = [
+            models.Index(fields=['user_type', 'jour']),
+        ]
+    
+    def __str__(self):
+        return f"Inscriptions {self.jour} ({self.user_type})"
+
+
+@receiver(post_delete, sender=Paiement)
+def retirer_paiement_des_cumuls(sender, instance, **kwargs):
+    """Retire un paiement supprimé des cumuls journaliers."""
+    StatPaiementJour.incrementer(
+        date_locale(instance.date_paiement), nombre=-1,
+        montant_total=-Decimal(str(instance.montant)),
+        status=instance.status, mode_paiement=instance.mode_paiement
+    )
+
+
+@receiver(post_delete, sender=Livraison)
+def retirer_livraison_des_cumuls(sender, instance, **kwargs):
+    """Retire une livraison supprimée des cumuls journaliers."""
+    StatLivraisonJour.incrementer(date_locale(instance.created_at), nombre=-1, status=instance.status)
+
+
+@receiver(post_delete, sender=User)
+def retirer_inscription_des_cumuls(sender, instance, **kwargs):
+    """Retire un utilisateur supprimé des cumuls d'inscriptions."""
+    StatInscriptionJour.incrementer(date_locale(instance.date_joined), nombre=-1, user_type=instance.user_type)
+
 
 class LangueDisponible(models.Model):
     """Langues disponibles sur la plateforme"""
@@ -0,0 +1,242 @@
+import base64
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet, FieldDoesNotExist, ValidationError
+from django.db.models import BooleanField, Field, Q
+
+DEFAULT_PAGE_SIZE = 25
+MAX_PAGE_SIZE = 100
+COUNT_CACHE_TIMEOUT = 60
+
+BOOLEENS = {'true': True, '1': True, 'oui': True, 'false': False, '0': False, 'non': False}
+
+
+def _field_name(ordering):
+    return ordering.lstrip('-')
+
+
+def encode_cursor(values):
+    """Encode les valeurs des colonnes de tri en un curseur opaque."""
+    payload = json.dumps([
+        value.isoformat() if hasattr(value, 'isoformat') else value
+        for value in values
+    ], default=str)
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, model, ordering):
+    """Décode un curseur en valeurs Python typées selon les champs du modèle."""
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding).decode())
+        if len(values) != len(ordering):
+            return None
+        return [_to_python(model, field, value) for field, value in zip(ordering, values)]
+    except (ValueError, TypeError, ValidationError):
+        return None
+
+
+def _to_python(model, field, value):
+    try:
+        return model._meta.get_field(_field_name(field)).to_python(value)
+    except FieldDoesNotExist:
+        # Annotation (score calculé) : valeur JSON telle quelle
+        return value
+
+
+def seek_filter(ordering, values, reverse=False):
+    """
+    Construit la condition de recherche « après » (ou « avant ») un curseur.
+
+    Pour un tri (-a, -b), les lignes suivantes vérifient
+    a < va OU (a = va ET b < vb).
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        descending = field.startswith('-')
+        if reverse:
+            descending = not descending
+        lookup = 'lt' if descending else 'gt'
+        egalites = {_field_name(f): v for f, v in zip(ordering[:i], values[:i])}
+        condition |= Q(**egalites, **{f"{_field_name(field)}__{lookup}": values[i]})
+    return condition
+
+
+def _inverser(ordering):
+    return [field[1:] if field.startswith('-') else f"-{field}" for field in ordering]
+
+
+# Lookups dont la valeur a le type du champ comparé
+COMPARAISONS = ('exact', 'iexact', 'gt', 'gte', 'lt', 'lte')
+
+
+def _champ(model, lookup):
+    """
+    Champ dont le type s'applique à la valeur d'un lookup (`livreur_id`,
+    `user__email`, `date_creation__date__gte`), ou None s'il n'est pas connu.
+    """
+    champ = None
+    for partie in lookup.split('__'):
+        if model is not None:
+            try:
+                champ = model._meta.get_field(partie)
+                model = champ.related_model
+                continue
+            except FieldDoesNotExist:
+                pass
+        if champ is None:
+            return None
+        model = None
+        transform = champ.get_transform(partie)
+        if transform is not None and isinstance(getattr(transform, 'output_field', None), Field):
+            champ = transform.output_field  # __date, __year…
+        elif partie not in COMPARAISONS:
+            return None
+    return champ
+
+
+def apply_query_filters(queryset, params, filters):
+    """
+    Applique les filtres autorisés présents dans la query string.
+
+    filters associe un nom de paramètre à un lookup ORM ; les paramètres
+    absents, vides ou non déclarés sont ignorés, de même que les valeurs
+    que le champ visé ne sait pas convertir (`?livreur=abc`).
+    """
+    appliques = {}
+    for param, lookup in (filters or {}).items():
+        value = params.get(param)
+        if value in (None, ''):
+            continue
+        champ = _champ(queryset.model, lookup)
+        if isinstance(champ, BooleanField):
+            if value.lower() not in BOOLEENS:
+                continue
+            value = BOOLEENS[value.lower()]
+        elif champ is not None:
+            try:
+                value = champ.to_python(value)
+            except (ValidationError, ValueError, TypeError):
+                continue
+        appliques[param] = value
+        queryset = queryset.filter(**{lookup: value})
+    return queryset, appliques
+
+
+def cached_count(queryset):
+    """Compte les lignes d'un queryset une seule fois par jeu de filtres."""
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        return 0
+    key = 'pagination:count:' + hashlib.md5(sql.encode()).hexdigest()
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+class KeysetPage:
+    """Page obtenue par pagination par curseur (seek) sur les colonnes de tri."""
+
+    def __init__(self, object_list, params, has_next, has_previous,
+                 next_cursor, previous_cursor, total_count, filters, page_size):
+        self.object_list = object_list
+        self.params = params
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+        self.total_count = total_count
+        self.filters = filters
+        self.page_size = page_size
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def _query(self, **curseur):
+        params = self.params.copy()
+        for key in ('after', 'before'):
+            params.pop(key, None)
+        for key, value in curseur.items():
+            params[key] = value
+        return params.urlencode()
+
+    @property
+    def first_query(self):
+        return self._query()
+
+    @property
+    def next_query(self):
+        return self._query(after=self.next_cursor)
+
+    @property
+    def previous_query(self):
+        return self._query(before=self.previous_cursor)
+
+
+def paginate_keyset(request, queryset, ordering, filters=None, page_size=None):
+    """
+    Pagine un queryset par curseur sur des colonnes de tri indexées.
+
+    ordering doit se terminer par une colonne unique (typiquement '-id')
+    pour que le curseur soit déterministe. La query string accepte
+    after/before (curseurs), page_size et les filtres déclarés.
+    """
+    params = request.GET
+    try:
+        page_size = int(params.get('page_size', page_size or DEFAULT_PAGE_SIZE))
+    except ValueError:
+        page_size = DEFAULT_PAGE_SIZE
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    ordering = list(ordering)
+    queryset, appliques = apply_query_filters(queryset, params, filters)
+    total_count = cached_count(queryset.order_by())
+
+    after = params.get('after')
+    before = params.get('before')
+    model = queryset.model
+
+    if before:
+        values = decode_cursor(before, model, ordering)
+        page_qs = queryset.order_by(*_inverser(ordering))
+        if values is not None:
+            page_qs = page_qs.filter(seek_filter(ordering, values, reverse=True))
+        rows = list(page_qs[:page_size + 1])
+        has_previous = len(rows) > page_size
+        rows = rows[:page_size][::-1]
+        has_next = values is not None
+    else:
+        values = decode_cursor(after, model, ordering) if after else None
+        page_qs = queryset.order_by(*ordering)
+        if values is not None:
+            page_qs = page_qs.filter(seek_filter(ordering, values))
+        rows = list(page_qs[:page_size + 1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        has_previous = values is not None
+
+    def _cursor(obj):
+        return encode_cursor([getattr(obj, _field_name(field)) for field in ordering])
+
+    return KeysetPage(
+        object_list=rows,
+        params=params,
+        has_next=has_next and bool(rows),
+        has_previous=has_previous and bool(rows),
+        next_cursor=_cursor(rows[-1]) if rows else None,
+        previous_cursor=_cursor(rows[0]) if rows else None,
+        total_count=total_count,
+        filters=appliques,
+        page_size=page_size,
+    )
@@ -0,0 +1,130 @@
+# dashboard/services/affectation_service.py
+
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils import timezone
+from dashboard.models import Annonce, Livraison, Livreur, StatLivraisonJour, date_locale
+from dashboard.services.events import evenement_livraison, publier
+from dashboard.services.kpi_cache import invalidate_home_kpis_on_commit, SECTION_STATS, SECTION_LIVRAISONS
+
+# Une annonce dont une livraison a l'un de ces statuts a déjà son livreur
+STATUS_ATTRIBUEE = ('en_cours', 'livree')
+# Statuts d'annonce acceptant encore une offre ('en_cours' : annonces marquées
+# à la première offre, avant l'affectation transactionnelle)
+STATUS_ANNONCE_OUVERTE = ('active', 'en_cours')
+
+
+class AffectationError(ValueError):
+    """Offre qui ne peut pas être acceptée (annonce déjà attribuée, offre déjà traitée…)."""
+
+
+def _increments_par_livreur(increments):
+    return Case(
+        *[When(user_id=user_id, then=Value(nombre)) for user_id, nombre in increments.items()],
+        output_field=IntegerField()
+    )
+
+
+def affecter_en_masse(livraison_ids, batch_size=500):
+    """
+    Accepte des offres (livraisons en attente) sur des annonces distinctes, en
+    une transaction : l'offre passe en cours, les autres offres en attente de
+    l'annonce sont annulées, l'annonce passe en cours et le compteur du livreur
+    est incrémenté en base (F()). Les annonces puis leurs offres sont verrouillées
+    (select_for_update, par pk croissant) : deux affectations concurrentes d'une
+    même annonce sont sérialisées et la seconde est refusée.
+
+    Retourne (livraisons acceptées, {livraison_id: raison du refus}).
+    """
+    livraison_ids = list(dict.fromkeys(livraison_ids))
+    maintenant = timezone.now()
+    refus = {}
+    with transaction.atomic():
+        offres = dict(Livraison.objects.filter(pk__in=livraison_ids).values_list('pk', 'annonce_id'))
+        for livraison_id in livraison_ids:
+            if livraison_id not in offres:
+                refus[livraison_id] = "Offre introuvable"
+
+        annonces = dict(
+            Annonce.objects.select_for_update().filter(pk__in=set(offres.values())).order_by('pk')
+            .values_list('pk', 'status')
+        )
+        par_annonce = defaultdict(list)
+        for ligne in Livraison.objects.select_for_update().filter(annonce_id__in=annonces).order_by('pk').values(
+                'pk', 'annonce_id', 'livreur_id', 'status', 'created_at'):
+            par_annonce[ligne['annonce_id']].append(ligne)
+
+        acceptees, choisies = [], set()
+        for livraison_id in livraison_ids:
+            if livraison_id in refus:
+                continue
+            annonce_id = offres[livraison_id]
+            lignes = par_annonce[annonce_id]
+            offre = next(ligne for ligne in lignes if ligne['pk'] == livraison_id)
+            if annonce_id in choisies:
+                refus[livraison_id] = "Une autre offre de cette annonce est acceptée dans le même lot"
+            elif annonces.get(annonce_id) not in STATUS_ANNONCE_OUVERTE \
+                    or any(ligne['status'] in STATUS_ATTRIBUEE for ligne in lignes):
+                refus[livraison_id] = "Annonce déjà attribuée ou fermée"
+            elif offre['status'] != 'en_attente':
+                refus[livraison_id] = "Offre déjà traitée"
+            else:
+                choisies.add(annonce_id)
+                acceptees.append(offre)
+        if not acceptees:
+            return [], refus
+
+        ids_acceptees = {offre['pk'] for offre in acceptees}
+        annulees = [
+            ligne for annonce_id in choisies for ligne in par_annonce[annonce_id]
+            if ligne['status'] == 'en_attente' and ligne['pk'] not in ids_acceptees
+        ]
+        annonce_ids = sorted(choisies)
+        increments = Counter(offre['livreur_id'] for offre in acceptees)
+        for debut in range(0, len(annonce_ids), batch_size):
+            Annonce.objects.filter(pk__in=annonce_ids[debut:debut + batch_size]).update(
+                status='en_cours', updated_at=maintenant
+            )
+        for status, lignes in (('en_cours', acceptees), ('annulee', annulees)):
+            ids = [ligne['pk'] for ligne in lignes]
+            for debut in range(0, len(ids), batch_size):
+                Livraison.objects.filter(pk__in=ids[debut:debut + batch_size]).update(
+                    status=status, updated_at=maintenant
+                )
+        livreurs = list(increments.items())
+        for debut in range(0, len(livreurs), batch_size):
+            lot = dict(livreurs[debut:debut + batch_size])
+            Livreur.objects.filter(user_id__in=lot).update(
+                nombre_livraisons=F('nombre_livraisons') + _increments_par_livreur(lot)
+            )
+
+        # Cumuls journaliers : ce que Livraison.save ferait ligne par ligne
+        deltas = Counter()
+        for status, lignes in (('en_cours', acceptees), ('annulee', annulees)):
+            for ligne in lignes:
+                jour = date_locale(ligne['created_at'])
+                deltas[(jour, 'en_attente')] -= 1
+                deltas[(jour, status)] += 1
+        for (jour, status), nombre in sorted(deltas.items()):
+            if nombre:
+                StatLivraisonJour.incrementer(jour, nombre=nombre, status=status)
+
+        modifiees = Livraison.objects.filter(pk__in=[ligne['pk'] for ligne in acceptees + annulees])
+        for livraison in modifiees:
+            publier([livraison.client_id, livraison.livreur_id], 'livraison',
+                    evenement_livraison(livraison, 'en_attente'))
+        # update() n'émet pas post_save : invalidation explicite, après validation
+        invalidate_home_kpis_on_commit(SECTION_STATS, SECTION_LIVRAISONS)
+
+    acceptees = Livraison.objects.select_related('annonce').in_bulk(ids_acceptees)
+    return [acceptees[pk] for pk in livraison_ids if pk in acceptees], refus
+
+
+def accepter_offre(livraison_id):
+    """Accepte une offre (voir affecter_en_masse) ; lève AffectationError si elle est refusée."""
+    acceptees, refus = affecter_en_masse([livraison_id])
+    if refus:
+        raise AffectationError(refus[livraison_id])
+    return acceptees[0]
@@ -0,0 +1,87 @@
+# dashboard/services/annonce_search.py
+
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db.models import Case, IntegerField, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from dashboard.models import Annonce, normaliser_ville
+from dashboard.pagination import BOOLEENS
+
+# Tri des résultats : pertinence, puis départ le plus proche ; l'id rend le curseur déterministe
+ORDRE_RECHERCHE = ('-pertinence', 'date_depart', 'id')
+# Borne haute d'un préfixe : toute chaîne commençant par le préfixe lui est inférieure
+FIN_PREFIXE = '\uffff'
+
+
+def _date(valeur, nom, fin_de_journee=False):
+    """Date ISO ; un jour seul (AAAA-MM-JJ) vaut son début, ou sa fin pour une borne haute."""
+    try:
+        jour = parse_date(valeur)
+        date = datetime.datetime.combine(jour, datetime.time.max if fin_de_journee else datetime.time.min) \
+            if jour is not None else parse_datetime(valeur)
+    except ValueError:
+        date = None
+    if date is None:
+        raise ValueError(f"`{nom}` invalide : {valeur!r} (attendu AAAA-MM-JJ ou date ISO)")
+    return timezone.make_aware(date) if timezone.is_naive(date) else date
+
+
+def _decimal(valeur, nom):
+    try:
+        return Decimal(valeur)
+    except InvalidOperation:
+        raise ValueError(f"`{nom}` invalide : {valeur!r}")
+
+
+def _ville(annonces, champ, valeur):
+    """Filtre par préfixe de ville normalisée (intervalle sur l'index) ; l'égalité exacte compte dans la pertinence."""
+    ville = normaliser_ville(valeur)
+    if not ville:
+        return annonces, None
+    annonces = annonces.filter(**{f'{champ}__gte': ville, f'{champ}__lt': ville + FIN_PREFIXE})
+    return annonces, When(**{champ: ville}, then=Value(2))
+
+
+def rechercher_annonces(params, maintenant=None):
+    """
+    Annonces actives filtrées par les paramètres de recherche :
+    `depart`, `arrivee` (préfixes de ville, insensibles aux accents et à la casse),
+    `date_min` (maintenant par défaut), `date_max`, `type`, `poids_min`, `poids_max`
+    et `urgente` (les annonces sans poids sont exclues par les filtres de poids).
+    Annotées d'une `pertinence` : +2 par ville exacte, +1 si urgente.
+    Lève ValueError si un paramètre est invalide.
+    """
+    annonces = Annonce.objects.filter(status='active')
+    criteres = []
+    for param, champ in (('depart', 'depart_ville'), ('arrivee', 'arrivee_ville')):
+        if params.get(param):
+            annonces, critere = _ville(annonces, champ, params[param])
+            if critere is not None:
+                criteres.append(critere)
+
+    date_min = _date(params['date_min'], 'date_min') if params.get('date_min') else (maintenant or timezone.now())
+    annonces = annonces.filter(date_depart__gte=date_min)
+    if params.get('date_max'):
+        annonces = annonces.filter(date_depart__lte=_date(params['date_max'], 'date_max', fin_de_journee=True))
+
+    type_annonce = params.get('type')
+    if type_annonce:
+        if type_annonce not in dict(Annonce.TYPE_CHOICES):
+            raise ValueError(f"`type` invalide : {type_annonce!r}")
+        annonces = annonces.filter(type_annonce=type_annonce)
+    if params.get('poids_min'):
+        annonces = annonces.filter(poids__gte=_decimal(params['poids_min'], 'poids_min'))
+    if params.get('poids_max'):
+        annonces = annonces.filter(poids__lte=_decimal(params['poids_max'], 'poids_max'))
+    urgente = params.get('urgente')
+    if urgente:
+        if urgente.lower() not in BOOLEENS:
+            raise ValueError(f"`urgente` invalide : {urgente!r}")
+        annonces = annonces.filter(est_urgente=BOOLEENS[urgente.lower()])
+
+    pertinence = Case(When(est_urgente=True, then=Value(1)), default=Value(0), output_field=IntegerField())
+    for critere in criteres:
+        pertinence = pertinence + Case(critere, default=Value(0), output_field=IntegerField())
+    return annonces.annotate(pertinence=pertinence)
@@ -0,0 +1,129 @@
+# dashboard/services/benchmark_service.py
+
+import platform
+import statistics
+import subprocess
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.test import Client, override_settings
+from django.utils import timezone
+from dashboard.models import User, Annonce, Livraison, Paiement
+from dashboard.services.profiling import QueryRecorder, percentile
+
+# Scénarios : nom -> (URL, type d'utilisateur connecté)
+SCENARIOS = {
+    'home': ('/dashboard/', 'admin'),
+    'statistiques': ('/dashboard/statistiques/', 'admin'),
+    'livraisons_list': ('/dashboard/api/livraisons/', 'admin'),
+    'annonces_available': ('/dashboard/api/annonces/available/', 'livreur'),
+    'financial_report_monthly': ('/dashboard/api/admin/financial-report/monthly/{year}/', 'admin'),
+    'financial_report_yearly': ('/dashboard/api/admin/financial-report/yearly/', 'admin'),
+}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+            capture_output=True, text=True, timeout=5
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _utilisateur(user_type):
+    """Premier utilisateur du type demandé (staff pour l'admin)."""
+    queryset = User.objects.filter(user_type=user_type, is_active=True)
+    if user_type == 'admin':
+        queryset = queryset.filter(is_staff=True)
+    return queryset.order_by('pk').first()
+
+
+def _mesurer(client, url, cold):
+    if cold:
+        cache.clear()
+    recorder = QueryRecorder()
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(recorder))
+        response = client.get(url)
+    return (time.perf_counter() - start) * 1000, recorder.count, response.status_code
+
+
+def run_benchmarks(names=None, iterations=20, warmup=2, cold=False):
+    """
+    Chronomètre les scénarios dans le processus (client de test Django).
+
+    Retourne un dict sérialisable en JSON : métadonnées (commit, volumes)
+    et, par scénario, latences min/médiane/p95/max en ms et nombre de
+    requêtes SQL. `cold` vide le cache avant chaque itération.
+    """
+    names = names or list(SCENARIOS)
+    year = timezone.localdate().year
+    clients = {}
+    resultats = {}
+
+    with override_settings(ALLOWED_HOSTS=['testserver'], REQUEST_PROFILING_ENABLED=False):
+        for name in names:
+            url, user_type = SCENARIOS[name]
+            url = url.format(year=year)
+            if user_type not in clients:
+                user = _utilisateur(user_type)
+                client = Client(raise_request_exception=False)
+                if user is not None:
+                    client.force_login(user)
+                clients[user_type] = (client, user)
+            client, user = clients[user_type]
+            if user is None:
+                resultats[name] = {'url': url, 'erreur': f"aucun utilisateur {user_type}"}
+                continue
+
+            for _ in range(warmup):
+                _mesurer(client, url, cold)
+            mesures = [_mesurer(client, url, cold) for _ in range(iterations)]
+            durees = [m[0] for m in mesures]
+            resultats[name] = {
+                'url': url,
+                'status': sorted({m[2] for m in mesures}),
+                'queries': max(m[1] for m in mesures),
+                'min_ms': round(min(durees), 3),
+                'median_ms': round(statistics.median(durees), 3),
+                'p95_ms': round(percentile(durees, 95), 3),
+                'max_ms': round(max(durees), 3),
+            }
+
+    return {
+        'commit': _git_commit(),
+        'date': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'database': connections['default'].vendor,
+        'iterations': iterations,
+        'cold_cache': cold,
+        'volumes': {
+            'users': User.objects.count(),
+            'annonces': Annonce.objects.count(),
+            'livraisons': Livraison.objects.count(),
+            'paiements': Paiement.objects.count(),
+        },
+        'scenarios': resultats,
+    }
+
+
+def compare_benchmarks(reference, courant, metric='median_ms'):
+    """Écart relatif (%) par scénario entre deux résultats de run_benchmarks."""
+    ecarts = {}
+    for name, mesure in courant['scenarios'].items():
+        avant = reference.get('scenarios', {}).get(name, {}).get(metric)
+        apres = mesure.get(metric)
+        if avant and apres is not None:
+            ecarts[name] = {
+                'avant': avant,
+                'apres': apres,
+                'ecart_pct': round((apres - avant) / avant * 100, 1),
+            }
+    return ecarts
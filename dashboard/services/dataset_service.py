@@ -0,0 +1,292 @@
+# dashboard/services/dataset_service.py
+
+import datetime
+import random
+import uuid
+from collections import Counter
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from dashboard.models import (
+    User, Livreur, Commercant, Prestataire, Abonnement, Annonce, Livraison,
+    Paiement, Facture, Evaluation, Notification, LogConnexion, ZoneLivreur, normaliser_ville
+)
+from dashboard.services.geo import geocoder
+from dashboard.services.kpi_cache import invalidate_home_kpis
+from dashboard.services.recherche_texte import indexer_objets
+from dashboard.services.rollup_service import rebuild_daily_rollups
+from dashboard.services.wallet_service import crediter_paiements_en_masse
+
+# Préfixe des comptes générés, utilisé aussi pour la purge
+PREFIXE = 'synth'
+
+# Volumes pour scale=1
+VOLUMES = {
+    'users': 1000,
+    'annonces': 2000,
+    'livraisons': 1500,
+    'paiements': 1500,
+    'evaluations': 1000,
+    'notifications': 5000,
+    'logs': 5000,
+}
+
+# Répartition des utilisateurs par type
+REPARTITION_USERS = {'client': 0.6, 'livreur': 0.2, 'commercant': 0.1, 'prestataire': 0.1}
+
+VILLES = ['Paris', 'Lyon', 'Marseille', 'Lille', 'Bordeaux', 'Toulouse', 'Nantes', 'Strasbourg', 'Rennes', 'Nice']
+NAVIGATEURS = ['Chrome', 'Firefox', 'Safari', 'Edge']
+SYSTEMES = ['Windows', 'macOS', 'Linux', 'Android', 'iOS']
+
+
+def _reference(prefix):
+    return f"{prefix}-{uuid.uuid4().hex[:12].upper()}"
+
+
+class _Generateur:
+    def __init__(self, seed, days, batch_size):
+        self.rng = random.Random(seed)
+        self.now = timezone.now()
+        self.days = days
+        self.batch_size = batch_size
+        self.tag = uuid.uuid4().hex[:6]
+
+    def date(self):
+        """Date aléatoire dans l'historique simulé."""
+        return self.now - datetime.timedelta(seconds=self.rng.randint(0, self.days * 86400))
+
+    def bulk(self, model, objets, dates=None):
+        """
+        Insère en masse, puis recale les champs auto_now_add (écrasés par
+        bulk_create) avec un bulk_update : {champ: [valeurs]}.
+        """
+        objets = model.objects.bulk_create(objets, batch_size=self.batch_size)
+        if dates:
+            for champ, valeurs in dates.items():
+                for obj, valeur in zip(objets, valeurs):
+                    setattr(obj, champ, valeur)
+            model.objects.bulk_update(objets, list(dates), batch_size=self.batch_size)
+        return objets
+
+    def users(self, total):
+        password = make_password('synthetique')
+        types = [
+            user_type
+            for user_type, part in REPARTITION_USERS.items()
+            for _ in range(max(1, round(total * part)))
+        ]
+        dates = [self.date() for _ in types]
+        users = self.bulk(User, [
+            User(
+                username=f"{PREFIXE}_{self.tag}_{user_type}_{i}",
+                email=f"{PREFIXE}_{self.tag}_{i}@example.com",
+                password=password,
+                user_type=user_type,
+                pays='France',
+                portefeuille_solde=Decimal('0.00'),
+            )
+            for i, user_type in enumerate(types)
+        ], {'date_joined': dates})
+
+        # Profils et abonnements normalement créés par User.save
+        par_type = {user_type: [] for user_type in REPARTITION_USERS}
+        for user in users:
+            par_type[user.user_type].append(user)
+        livreurs = self.bulk(Livreur, [
+            Livreur(user=u, verified=self.rng.random() < 0.8, vehicle_type='voiture',
+                    zones_livraison=self.rng.choice(VILLES))
+            for u in par_type['livreur']
+        ])
+        ZoneLivreur.synchroniser(livreurs)
+        self.bulk(Commercant, [
+            Commercant(user=u, company_name=f"Société {u.pk}", siret=f"{u.pk:014d}",
+                       company_address=self.rng.choice(VILLES))
+            for u in par_type['commercant']
+        ])
+        self.bulk(Prestataire, [
+            Prestataire(user=u, specialites='Transport', tarif_horaire=Decimal('25.00'))
+            for u in par_type['prestataire']
+        ])
+        today = self.now.date()
+        self.bulk(Abonnement, [
+            Abonnement(user=u, type_abonnement='free', date_debut=today,
+                       date_fin=today + datetime.timedelta(days=365))
+            for u in users
+        ])
+        return par_type
+
+    def annonces(self, total, auteurs):
+        objets, dates = [], []
+        for i in range(total):
+            creation = self.date()
+            depart = creation + datetime.timedelta(days=self.rng.randint(1, 15))
+            # Tirages dans l'ordre historique : un même seed donne le même jeu
+            auteur = self.rng.choice(auteurs)
+            depart_ville, arrivee_ville = self.rng.choice(VILLES), self.rng.choice(VILLES)
+            depart_lat, depart_lon, depart_cellule = geocoder(depart_ville)
+            arrivee_lat, arrivee_lon, _ = geocoder(arrivee_ville)
+            objets.append(Annonce(
+                titre=f"Annonce {i}",
+                description='Colis généré',
+                created_by=auteur,
+                depart=depart_ville,
+                arrivee=arrivee_ville,
+                depart_ville=normaliser_ville(depart_ville),
+                arrivee_ville=normaliser_ville(arrivee_ville),
+                depart_latitude=depart_lat,
+                depart_longitude=depart_lon,
+                depart_cellule=depart_cellule,
+                arrivee_latitude=arrivee_lat,
+                arrivee_longitude=arrivee_lon,
+                date_depart=depart,
+                date_arrivee=depart + datetime.timedelta(hours=self.rng.randint(2, 48)),
+                prix=Decimal(self.rng.randint(500, 15000)) / 100,
+                status=self.rng.choices(['active', 'en_cours', 'terminee', 'annulee'], [5, 2, 2, 1])[0],
+                type_annonce=self.rng.choices(['colis', 'service'], [4, 1])[0],
+                poids=Decimal(self.rng.randint(10, 3000)) / 100,
+                est_urgente=self.rng.random() < 0.1,
+                vues=self.rng.randint(0, 500),
+            ))
+            dates.append(creation)
+        return self.bulk(Annonce, objets, {'created_at': dates})
+
+    def livraisons(self, total, annonces, livreurs):
+        objets = []
+        for annonce in self.rng.sample(annonces, min(total, len(annonces))):
+            objets.append(Livraison(
+                reference=f"L{uuid.uuid4().hex[:9].upper()}",
+                annonce=annonce,
+                livreur=self.rng.choice(livreurs),
+                client_id=annonce.created_by_id,
+                description_colis=annonce.titre,
+                poids=annonce.poids,
+                date_prise_en_charge=annonce.date_depart,
+                date_livraison_prevue=annonce.date_arrivee,
+                status=self.rng.choices(['en_attente', 'en_cours', 'livree', 'annulee'], [2, 2, 5, 1])[0],
+                code_validation=f"{self.rng.randint(0, 999999):06d}",
+            ))
+        return self.bulk(Livraison, objets, {'created_at': [l.annonce.created_at for l in objets]})
+
+    def paiements(self, total, livraisons):
+        objets = []
+        for i in range(total):
+            livraison = livraisons[i % len(livraisons)]
+            objets.append(Paiement(
+                reference=_reference('PAY'),
+                livraison=livraison,
+                montant=livraison.annonce.prix,
+                payeur_id=livraison.client_id,
+                beneficiaire_id=livraison.livreur_id,
+                status=self.rng.choices(['reussi', 'en_attente', 'echoue', 'rembourse'], [8, 1, 1, 0.5])[0],
+                mode_paiement=self.rng.choices(['carte', 'virement', 'portefeuille'], [6, 2, 2])[0],
+            ))
+        paiements = self.bulk(Paiement, objets, {
+            'date_paiement': [self.date() for _ in objets]
+        })
+
+        # Factures et crédits de portefeuille normalement créés par Paiement.save
+        reussis = [p for p in paiements if p.status == 'reussi']
+        self.bulk(Facture, [
+            Facture(reference=_reference('FAC'), paiement=p, montant_total=p.montant, status_paiement='reussi')
+            for p in reussis
+        ], {'date_emission': [p.date_paiement for p in reussis]})
+
+        crediter_paiements_en_masse(reussis, self.batch_size)
+        return paiements, reussis
+
+    def evaluations(self, total, livraisons):
+        livrees = [l for l in livraisons if l.status == 'livree'] or livraisons
+        objets = [
+            Evaluation(
+                evaluateur_id=livraison.client_id,
+                evalue_id=livraison.livreur_id,
+                livraison=livraison,
+                note=self.rng.choices([1, 2, 3, 4, 5], [1, 1, 2, 4, 6])[0],
+            )
+            for livraison in (self.rng.choice(livrees) for _ in range(total))
+        ]
+        return self.bulk(Evaluation, objets, {'date_evaluation': [self.date() for _ in objets]})
+
+    def notifications(self, total, users):
+        objets = [
+            Notification(
+                user=self.rng.choice(users),
+                titre=f"Notification {i}",
+                message='Message généré',
+                lue=self.rng.random() < 0.7,
+                type_notification=self.rng.choice(['info', 'success', 'warning', 'error']),
+            )
+            for i in range(total)
+        ]
+        crees = self.bulk(Notification, objets, {'date_creation': [self.date() for _ in objets]})
+        # bulk_create contourne Notification.save : compteurs de non lues ajustés en bloc
+        Notification.ajuster_compteurs(Counter(n.user_id for n in objets if not n.lue))
+        return crees
+
+    def logs(self, total, users):
+        objets = [
+            LogConnexion(
+                user=self.rng.choice(users),
+                adresse_ip=f"10.{self.rng.randint(0, 255)}.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}",
+                navigateur=self.rng.choice(NAVIGATEURS),
+                systeme_exploitation=self.rng.choice(SYSTEMES),
+                reussi=self.rng.random() < 0.95,
+            )
+            for _ in range(total)
+        ]
+        return self.bulk(LogConnexion, objets, {'date_connexion': [self.date() for _ in objets]})
+
+
+def generate_dataset(scale=1.0, seed=None, days=365, batch_size=1000, **volumes):
+    """
+    Génère un jeu de données synthétique par insertions en masse.
+
+    Les volumes par défaut (VOLUMES) sont multipliés par `scale` et peuvent
+    être surchargés un à un (users=..., paiements=...). Les effets de bord
+    des save() (profils, abonnements, factures, portefeuilles) sont reproduits
+    en masse, puis les cumuls journaliers sont reconstruits.
+    Retourne le nombre de lignes créées par type.
+    """
+    volumes = {
+        name: int(volumes.get(name) if volumes.get(name) is not None else round(defaut * scale))
+        for name, defaut in VOLUMES.items()
+    }
+    gen = _Generateur(seed, days, batch_size)
+
+    with transaction.atomic():
+        par_type = gen.users(volumes['users'])
+        tous = [u for users in par_type.values() for u in users]
+        auteurs = par_type['client'] + par_type['commercant']
+        annonces = gen.annonces(volumes['annonces'], auteurs)
+        livraisons = gen.livraisons(volumes['livraisons'], annonces, par_type['livreur'])
+        paiements, reussis = gen.paiements(volumes['paiements'], livraisons) if livraisons else ([], [])
+        evaluations = gen.evaluations(volumes['evaluations'], livraisons) if livraisons else []
+        notifications = gen.notifications(volumes['notifications'], tous)
+        logs = gen.logs(volumes['logs'], tous)
+        # bulk_create n'émet pas post_save : index plein texte rempli ici
+        indexer_objets(tous)
+        indexer_objets(annonces)
+
+    rebuild_daily_rollups(batch_size=batch_size)
+    invalidate_home_kpis()
+
+    return {
+        'users': len(tous),
+        'annonces': len(annonces),
+        'livraisons': len(livraisons),
+        'paiements': len(paiements),
+        'factures': len(reussis),
+        'evaluations': len(evaluations),
+        'notifications': len(notifications),
+        'logs': len(logs),
+    }
+
+
+def purge_dataset():
+    """Supprime les comptes synthétiques et, en cascade, leurs données."""
+    deleted, _ = User.objects.filter(username__startswith=f"{PREFIXE}_").delete()
+    rebuild_daily_rollups()
+    invalidate_home_kpis()
+    return deleted
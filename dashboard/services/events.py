@@ -0,0 +1,198 @@
+# dashboard/services/events.py
+
+import asyncio
+import functools
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class AbonnementDeborde(Exception):
+    """Le client ne lit pas assez vite : sa file est pleine, le flux doit être fermé."""
+
+
+def canal_utilisateur(user_id):
+    return f"user:{user_id}"
+
+
+def evenement_notification(notification):
+    return {
+        'id': notification.pk,
+        'titre': notification.titre,
+        'message': notification.message,
+        'type_notification': notification.type_notification,
+        'lien': notification.lien,
+        'lue': notification.lue,
+        'date_creation': notification.date_creation,
+    }
+
+
+def evenement_livraison(livraison, ancien_status=None):
+    return {
+        'id': livraison.pk,
+        'reference': livraison.reference,
+        'status': livraison.status,
+        'ancien_status': ancien_status,
+        'annonce': livraison.annonce_id,
+        'updated_at': livraison.updated_at,
+    }
+
+
+def evenement_message(message):
+    return {
+        'id': message.pk,
+        'sender': message.sender_id,
+        'receiver': message.receiver_id,
+        'annonce': message.annonce_id,
+        'conversation': message.conversation_id,
+        'content': message.content,
+        'timestamp': message.timestamp,
+    }
+
+
+class Abonnement:
+    """
+    Abonnement d'un flux à des canaux. Les événements sont déposés dans une
+    file asyncio de la boucle qui l'a créé, quel que soit le thread qui publie.
+    """
+
+    def __init__(self, broker, canaux, taille_file):
+        self.broker = broker
+        self.canaux = frozenset(canaux)
+        self.boucle = asyncio.get_running_loop()
+        self.file = asyncio.Queue()
+        self.taille_file = taille_file
+        self.deborde = False
+
+    def deposer(self, evenement):
+        """À appeler dans la boucle de l'abonnement (call_soon_threadsafe depuis un autre thread)."""
+        if self.file.qsize() >= self.taille_file:
+            self.deborde = True
+        else:
+            self.file.put_nowait(evenement)
+
+    async def get(self, timeout=None):
+        """Prochain événement, ou None après `timeout` secondes sans événement."""
+        if self.deborde:
+            raise AbonnementDeborde
+        try:
+            return await asyncio.wait_for(self.file.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def get_nowait(self):
+        """Événement déjà reçu, ou None."""
+        try:
+            return self.file.get_nowait()
+        except asyncio.QueueEmpty:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class EventBroker:
+    """
+    Interface du pub/sub des événements temps réel (flux SSE).
+
+    `publish` est appelé depuis du code synchrone (signaux, vues, commandes)
+    avec des triplets (canal, type, données) ; `subscribe` est appelé dans la
+    boucle asyncio d'un flux et retourne un Abonnement. `depuis` (dernier id
+    reçu par le client) demande de rejouer les événements manqués encore connus.
+    Une implémentation adossée à un broker (Redis, LISTEN/NOTIFY…) se branche
+    via le réglage EVENTS_BROKER.
+    """
+
+    def publish(self, messages):
+        raise NotImplementedError
+
+    def subscribe(self, canaux, depuis=None):
+        raise NotImplementedError
+
+    def unsubscribe(self, abonnement):
+        raise NotImplementedError
+
+
+class MemoryBroker(EventBroker):
+    """
+    Pub/sub en mémoire du processus : ne relie que les flux servis par le même
+    processus que l'émetteur (serveur ASGI unique, développement, tests).
+
+    Les `taille_historique` derniers événements sont gardés pour rejouer ceux
+    manqués lors d'une reconnexion (Last-Event-ID). Les ids partent de l'heure
+    courante en millisecondes pour rester croissants d'un redémarrage à l'autre.
+    """
+
+    def __init__(self, taille_historique=1000, taille_file=100):
+        self.taille_file = taille_file
+        self._abonnes = defaultdict(set)
+        self._historique = deque(maxlen=taille_historique)
+        self._ids = itertools.count(int(time.time() * 1000))
+        self._verrou = threading.Lock()
+
+    def publish(self, messages):
+        with self._verrou:
+            for canal, type_evenement, donnees in messages:
+                evenement = {'id': next(self._ids), 'type': type_evenement, 'donnees': donnees}
+                self._historique.append((canal, evenement))
+                for abonnement in list(self._abonnes.get(canal, ())):
+                    try:
+                        abonnement.boucle.call_soon_threadsafe(abonnement.deposer, evenement)
+                    except RuntimeError:
+                        # Boucle fermée : le flux a disparu sans se désabonner
+                        self._retirer(abonnement)
+
+    def subscribe(self, canaux, depuis=None):
+        abonnement = Abonnement(self, canaux, self.taille_file)
+        with self._verrou:
+            for canal in abonnement.canaux:
+                self._abonnes[canal].add(abonnement)
+            if depuis is not None:
+                for canal, evenement in self._historique:
+                    if evenement['id'] > depuis and canal in abonnement.canaux:
+                        abonnement.deposer(evenement)
+        return abonnement
+
+    def unsubscribe(self, abonnement):
+        with self._verrou:
+            self._retirer(abonnement)
+
+    def _retirer(self, abonnement):
+        for canal in abonnement.canaux:
+            abonnes = self._abonnes.get(canal)
+            if abonnes is not None:
+                abonnes.discard(abonnement)
+                if not abonnes:
+                    del self._abonnes[canal]
+
+    def nombre_abonnes(self):
+        with self._verrou:
+            return len({abonnement for abonnes in self._abonnes.values() for abonnement in abonnes})
+
+
+@functools.lru_cache(maxsize=None)
+def get_broker():
+    """Broker configuré (EVENTS_BROKER), unique par processus."""
+    return import_string(settings.EVENTS_BROKER)()
+
+
+def publier(user_ids, type_evenement, donnees):
+    """Publie un événement sur le canal de chaque utilisateur, après validation de la transaction."""
+    publier_messages([(canal_utilisateur(pk), type_evenement, donnees) for pk in dict.fromkeys(user_ids) if pk])
+
+
+def publier_messages(messages):
+    """Publie des triplets (canal, type, données) après validation de la transaction courante."""
+    if messages:
+        transaction.on_commit(lambda: get_broker().publish(messages))
@@ -0,0 +1,163 @@
+# dashboard/services/geo.py
+
+import csv
+import functools
+import math
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+
+# Mots ignorés ou abrégés dans les noms de ville normalisés
+MOTS_VILLE_IGNORES = {'cedex'}
+ABREVIATIONS_VILLE = {'saint': 'st', 'sainte': 'ste'}
+
+RAYON_TERRE_KM = 6371.0088
+KM_PAR_DEGRE = RAYON_TERRE_KM * math.pi / 180
+# Grille d'index : cases de PAS_GRILLE degrés (~22 km en latitude), numérotées
+# ligne par ligne ; les cases d'une même ligne forment un intervalle d'entiers
+PAS_GRILLE = 0.2
+COLONNES_GRILLE = round(360 / PAS_GRILLE)
+CODE_POSTAL = re.compile(r'\b(\d{5})\b')
+SEPARATEURS_ZONES = re.compile(r'[,;/\n]+')
+
+
+def normaliser_ville(texte):
+    """
+    Forme de recherche d'une ville : dernier segment d'une adresse
+    (« 12 rue X, 75002 Paris » → « paris »), sans accents, casse, ponctuation,
+    code postal ni arrondissement ; « Saint(e) » abrégé en « st(e) ».
+    """
+    if not texte:
+        return ''
+    segment = unicodedata.normalize('NFKD', texte.split(',')[-1]).encode('ascii', 'ignore').decode().lower()
+    mots = [
+        ABREVIATIONS_VILLE.get(mot, mot) for mot in re.split(r'[^a-z0-9]+', segment)
+        if mot and not any(c.isdigit() for c in mot) and mot not in MOTS_VILLE_IGNORES
+    ]
+    return ' '.join(mots)
+
+
+def departement(code_postal):
+    """Département d'un code postal (trois chiffres outre-mer)."""
+    return code_postal[:3] if code_postal.startswith('97') else code_postal[:2]
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Distance orthodromique en km entre deux points (degrés)."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((phi2 - phi1) / 2) ** 2 \
+        + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2
+    return 2 * RAYON_TERRE_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def cellule(lat, lon):
+    """Case de la grille contenant le point."""
+    return int((lat + 90) // PAS_GRILLE) * COLONNES_GRILLE + int((lon + 180) // PAS_GRILLE)
+
+
+def boite(lat, lon, rayon_km):
+    """Rectangle (lat_min, lat_max, lon_min, lon_max) contenant le cercle de rayon `rayon_km`."""
+    dlat = rayon_km / KM_PAR_DEGRE
+    # Le cercle est le plus large en longitude du côté du pôle
+    cos = math.cos(math.radians(min(90.0, abs(lat) + dlat)))
+    dlon = 180.0 if cos < 1e-9 else min(180.0, rayon_km / (KM_PAR_DEGRE * cos))
+    return max(-90.0, lat - dlat), min(90.0, lat + dlat), max(-180.0, lon - dlon), min(180.0, lon + dlon)
+
+
+def plages_cellules(lat, lon, rayon_km):
+    """Intervalles (première, dernière case) de la grille couvrant le cercle, un par ligne."""
+    lat_min, lat_max, lon_min, lon_max = boite(lat, lon, rayon_km)
+    ligne_min, ligne_max = cellule(lat_min, 0) // COLONNES_GRILLE, cellule(min(lat_max, 89.999), 0) // COLONNES_GRILLE
+    colonne_min = cellule(0, lon_min) % COLONNES_GRILLE
+    colonne_max = cellule(0, min(lon_max, 179.999)) % COLONNES_GRILLE
+    return [
+        (ligne * COLONNES_GRILLE + colonne_min, ligne * COLONNES_GRILLE + colonne_max)
+        for ligne in range(ligne_min, ligne_max + 1)
+    ]
+
+
+class Gazetteer:
+    """
+    Répertoire hors ligne des communes : coordonnées par nom normalisé et par
+    code postal, avec repli sur le centre des communes connues du département.
+    """
+
+    def __init__(self, communes):
+        self.par_nom = {}
+        self.par_code = {}
+        points = defaultdict(list)
+        for code_postal, nom, lat, lon in communes:
+            self.par_nom.setdefault(normaliser_ville(nom), (lat, lon))
+            self.par_code.setdefault(code_postal, (lat, lon))
+            points[departement(code_postal)].append((lat, lon))
+        self.par_departement = {
+            dep: (sum(p[0] for p in liste) / len(liste), sum(p[1] for p in liste) / len(liste))
+            for dep, liste in points.items()
+        }
+
+    def __len__(self):
+        return len(self.par_nom)
+
+    @classmethod
+    def charger(cls, chemin):
+        """
+        Lit un CSV « ; » : colonnes code_postal, commune, latitude, longitude,
+        ou le format de la base officielle des codes postaux (Code_postal,
+        Nom_de_la_commune, coordonnees_gps « lat, lon »). Les lignes sans
+        coordonnées sont ignorées.
+        """
+        communes = []
+        with open(chemin, encoding='utf-8-sig', newline='') as fichier:
+            for ligne in csv.DictReader(fichier, delimiter=';'):
+                ligne = {cle.lstrip('#').strip().lower(): (valeur or '').strip() for cle, valeur in ligne.items() if cle}
+                nom = ligne.get('commune') or ligne.get('nom_de_la_commune') or ligne.get('nom_commune')
+                if ligne.get('coordonnees_gps'):
+                    lat, _, lon = ligne['coordonnees_gps'].partition(',')
+                else:
+                    lat, lon = ligne.get('latitude'), ligne.get('longitude')
+                try:
+                    communes.append((ligne['code_postal'].zfill(5), nom, float(lat), float(lon)))
+                except (KeyError, TypeError, ValueError):
+                    continue
+        return cls(communes)
+
+    def localiser(self, texte):
+        """
+        Coordonnées (lat, lon) d'un lieu saisi librement (ville, code postal ou
+        adresse), ou None : nom de commune d'abord, puis code postal, puis département.
+        """
+        if not texte:
+            return None
+        point = self.par_nom.get(normaliser_ville(texte))
+        if point is None:
+            codes = CODE_POSTAL.findall(texte)
+            if codes:
+                point = self.par_code.get(codes[-1]) or self.par_departement.get(departement(codes[-1]))
+        return point
+
+
+@functools.lru_cache(maxsize=None)
+def gazetteer():
+    """Répertoire des communes (GEO_COMMUNES), chargé une fois par processus."""
+    return Gazetteer.charger(settings.GEO_COMMUNES)
+
+
+def geocoder(texte):
+    """(latitude, longitude, cellule) d'un lieu, ou (None, None, None) s'il est inconnu."""
+    point = gazetteer().localiser(texte)
+    if point is None:
+        return None, None, None
+    return point[0], point[1], cellule(*point)
+
+
+def zones(texte):
+    """Zones d'une saisie libre (« Paris; Lyon, 69003 ») : (libellé, lat, lon, cellule) localisables, sans doublon."""
+    resultat = {}
+    for libelle in SEPARATEURS_ZONES.split(texte or ''):
+        libelle = libelle.strip()
+        lat, lon, case = geocoder(libelle)
+        if lat is not None:
+            resultat.setdefault((lat, lon), (libelle[:255], lat, lon, case))
+    return list(resultat.values())
@@ -0,0 +1,158 @@
+# dashboard/services/invoice_export.py
+
+import calendar
+import datetime
+import io
+import os
+import zipfile
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_date
+from dashboard.api.pdf_utils import invoice_data, invoice_template
+from dashboard.models import Facture
+from dashboard.services.invoice_pdf import ensure_invoice_pdf, factures_a_rendre, invoice_pdf_path
+
+FORMATS = ('zip', 'pdf')
+
+
+def periode(mois=None, debut=None, fin=None):
+    """
+    Bornes (incluses) de l'export : un mois `AAAA-MM` ou deux dates
+    `AAAA-MM-JJ`. Lève ValueError si les paramètres sont invalides.
+    """
+    if mois:
+        try:
+            year, month = (int(part) for part in mois.split('-'))
+            dernier = calendar.monthrange(year, month)[1]
+        except (ValueError, calendar.IllegalMonthError):
+            raise ValueError(f"Mois invalide : {mois!r} (attendu AAAA-MM)")
+        return datetime.date(year, month, 1), datetime.date(year, month, dernier)
+
+    bornes = []
+    for valeur in (debut, fin):
+        date = parse_date(valeur) if isinstance(valeur, str) else valeur
+        if not isinstance(date, datetime.date):
+            raise ValueError(f"Date invalide : {valeur!r} (attendu AAAA-MM-JJ)")
+        bornes.append(date)
+    if bornes[0] > bornes[1]:
+        raise ValueError("La date de début est postérieure à la date de fin")
+    return tuple(bornes)
+
+
+def identifiant(valeur, nom):
+    """Id entier d'un filtre optionnel (None si absent) ; lève ValueError sinon."""
+    if valeur in (None, ''):
+        return None
+    try:
+        return int(valeur)
+    except (TypeError, ValueError):
+        raise ValueError(f"`{nom}` doit être un identifiant entier : {valeur!r}")
+
+
+def factures_exportees(debut, fin, commercant=None, payeur=None):
+    """
+    Factures émises entre `debut` et `fin` (inclus). `commercant` (id du
+    profil commerçant) retient les paiements où il est payeur ou bénéficiaire ;
+    `payeur` est un id utilisateur.
+    """
+    factures = Facture.objects.filter(date_emission__date__gte=debut, date_emission__date__lte=fin)
+    if commercant:
+        factures = factures.filter(
+            Q(paiement__payeur__commercant_profile=commercant)
+            | Q(paiement__beneficiaire__commercant_profile=commercant)
+        )
+    if payeur:
+        factures = factures.filter(paiement__payeur=payeur)
+    return factures_a_rendre(factures)
+
+
+def _par_lots(factures, chunk_size):
+    """Parcourt les factures par pagination sur la clé : au plus `chunk_size` en mémoire."""
+    dernier = 0
+    while True:
+        lot = list(factures.filter(pk__gt=dernier).order_by('pk')[:chunk_size])
+        yield from lot
+        if len(lot) < chunk_size:
+            return
+        dernier = lot[-1].pk
+
+
+class _Flux(io.RawIOBase):
+    """Tampon en écriture seule, vidé à chaque morceau transmis."""
+
+    def __init__(self):
+        self._morceaux = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._morceaux.append(bytes(b))
+        return len(b)
+
+    def vider(self):
+        contenu = b''.join(self._morceaux)
+        self._morceaux = []
+        return contenu
+
+
+def stream_invoices_zip(factures, chunk_size=100):
+    """
+    Génère une archive ZIP des PDF, morceau par morceau (StreamingHttpResponse
+    ou fichier). Les PDF manquants ou périmés sont rendus au passage.
+    """
+    flux = _Flux()
+    # Flux non positionnable : zipfile écrit des descripteurs de données
+    with zipfile.ZipFile(flux, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for facture in _par_lots(factures, chunk_size):
+            ensure_invoice_pdf(facture)
+            archive.write(invoice_pdf_path(facture), os.path.basename(invoice_pdf_path(facture)))
+            morceau = flux.vider()
+            if morceau:
+                yield morceau
+    yield flux.vider()
+
+
+def check_pdf_size(factures):
+    """
+    Le PDF unique est rendu en mémoire par reportlab : au-delà de
+    FACTURES_EXPORT_PDF_MAX factures, lève ValueError (export ZIP à utiliser).
+    """
+    nombre = factures.count()
+    if nombre > settings.FACTURES_EXPORT_PDF_MAX:
+        raise ValueError(
+            f"{nombre} factures : PDF unique limité à {settings.FACTURES_EXPORT_PDF_MAX}, "
+            f"utiliser le format zip ou une période plus courte"
+        )
+    return nombre
+
+
+def write_invoices_pdf(factures, fichier, chunk_size=100):
+    """
+    Écrit toutes les factures à la suite dans un seul PDF. Les factures sont
+    lues par lots de `chunk_size`, mais reportlab garde le document en mémoire
+    et ne l'écrit qu'à la fin du rendu (voir check_pdf_size).
+    """
+    return invoice_template().write(
+        (invoice_data(facture) for facture in _par_lots(factures, chunk_size)),
+        fichier,
+        vide="Aucune facture sur la période",
+    )
+
+
+def invoices_pdf_chunks(factures, chunk_size=100, taille_morceau=64 * 1024):
+    """
+    PDF unique des factures, découpé en morceaux de `taille_morceau` octets
+    pour une StreamingHttpResponse. Rien n'est transmis avant la fin du rendu :
+    seul le rendu est reporté à la première itération, hors de la vue.
+    """
+    fichier = io.BytesIO()
+    write_invoices_pdf(factures, fichier, chunk_size)
+    contenu = fichier.getbuffer()
+    for debut in range(0, len(contenu), taille_morceau):
+        yield bytes(contenu[debut:debut + taille_morceau])
+
+
+def export_filename(debut, fin, format):
+    return f"factures_{debut:%Y%m%d}_{fin:%Y%m%d}.{format}"
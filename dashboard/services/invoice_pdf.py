@@ -0,0 +1,249 @@
+# dashboard/services/invoice_pdf.py
+
+import datetime
+import hashlib
+import json
+import multiprocessing
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from dashboard.api.pdf_utils import InvoiceTemplate, invoice_data, render_invoice_pdf_timed
+from dashboard.models import Facture, TacheFacturePDF
+from dashboard.services.profiling import percentile
+
+DOSSIER = 'factures'
+MAX_TENTATIVES = 3
+# Tâche « en cours » depuis plus longtemps : worker présumé arrêté
+DELAI_TACHE_BLOQUEE = datetime.timedelta(minutes=15)
+
+
+def content_hash(data):
+    """Empreinte SHA-256 du contenu affiché sur la facture et de la version du gabarit."""
+    return hashlib.sha256(json.dumps([InvoiceTemplate.VERSION, data], sort_keys=True).encode()).hexdigest()
+
+
+def invoice_pdf_name(facture):
+    return f"{DOSSIER}/facture_{facture.reference}.pdf"
+
+
+def invoice_pdf_path(facture):
+    return os.path.join(settings.MEDIA_ROOT, invoice_pdf_name(facture))
+
+
+def _a_jour(facture, empreinte):
+    return (
+        facture.pdf_hash == empreinte
+        and facture.pdf_file.name == invoice_pdf_name(facture)
+        and os.path.exists(invoice_pdf_path(facture))
+    )
+
+
+def _ecrire(facture, contenu, empreinte):
+    """Écrit le PDF de manière atomique puis enregistre son chemin et son empreinte."""
+    path = invoice_pdf_path(facture)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'wb') as fichier:
+        fichier.write(contenu)
+    os.replace(tmp, path)
+
+    # update() plutôt que save() : pas de post_save, donc pas de nouvelle tâche
+    Facture.objects.filter(pk=facture.pk).update(pdf_file=invoice_pdf_name(facture), pdf_hash=empreinte)
+    facture.pdf_file.name = invoice_pdf_name(facture)
+    facture.pdf_hash = empreinte
+
+
+def ensure_invoice_pdf(facture, force=False):
+    """Rend le PDF si le contenu a changé (ou si le fichier manque). Retourne True si écrit."""
+    data = invoice_data(facture)
+    empreinte = content_hash(data)
+    if not force and _a_jour(facture, empreinte):
+        return False
+    contenu, _ = render_invoice_pdf_timed(data)
+    _ecrire(facture, contenu, empreinte)
+    return True
+
+
+def factures_a_rendre(queryset):
+    return queryset.select_related('paiement__payeur', 'paiement__livraison', 'paiement__service')
+
+
+def process_pool(workers):
+    """Pool de processus de rendu (spawn : pas d'héritage des connexions à la base)."""
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+
+
+def render_invoices(factures, workers=1, force=False, pool=None):
+    """
+    Rend les PDF des factures dont le contenu a changé.
+
+    Avec workers > 1 (ou un `pool` fourni), le rendu, lié au CPU, est réparti
+    sur des processus ; les écritures restent dans le processus courant.
+    Retourne (rendues, erreurs, inchangees, durees) où erreurs = {facture_id: message}
+    et durees le temps de rendu (s) de chaque facture rendue.
+    """
+    a_rendre, inchangees, invalides = [], [], {}
+    for facture in factures:
+        try:
+            data = invoice_data(facture)
+            empreinte = content_hash(data)
+        except Exception as exc:
+            # Relation manquante, date invalide… : seule cette facture échoue
+            invalides[facture.pk] = repr(exc)
+            continue
+        if not force and _a_jour(facture, empreinte):
+            inchangees.append(facture.pk)
+        else:
+            a_rendre.append((facture, data, empreinte))
+
+    if pool is None and workers > 1 and len(a_rendre) > 1:
+        with process_pool(workers) as pool:
+            rendues, erreurs, durees = _rendre(a_rendre, pool)
+    else:
+        rendues, erreurs, durees = _rendre(a_rendre, pool)
+    return rendues, {**invalides, **erreurs}, inchangees, durees
+
+
+def _rendre(a_rendre, pool):
+    if pool is not None:
+        contenus = [pool.submit(render_invoice_pdf_timed, data) for _, data, _ in a_rendre]
+    else:
+        contenus = [None] * len(a_rendre)
+
+    rendues, erreurs, durees = [], {}, []
+    for (facture, data, empreinte), future in zip(a_rendre, contenus):
+        try:
+            contenu, duree = future.result() if future is not None else render_invoice_pdf_timed(data)
+            _ecrire(facture, contenu, empreinte)
+            rendues.append(facture.pk)
+            durees.append(duree)
+        except Exception as exc:
+            erreurs[facture.pk] = repr(exc)
+    return rendues, erreurs, durees
+
+
+def _reserver(limit):
+    """
+    Passe au plus `limit` tâches en attente à « en cours » et retourne les ids
+    de celles que cet appel a effectivement réservées. Sans SKIP LOCKED
+    (SQLite), deux workers peuvent sélectionner les mêmes tâches : seul celui
+    dont l'UPDATE les a passées « en cours » y a posé son jeton.
+    """
+    jeton = uuid.uuid4().hex
+    with transaction.atomic():
+        taches = TacheFacturePDF.objects.filter(status='en_attente').order_by('date_creation')
+        if connection.features.has_select_for_update_skip_locked:
+            taches = taches.select_for_update(skip_locked=True)
+        ids = list(taches.values_list('pk', flat=True)[:limit])
+        TacheFacturePDF.objects.filter(pk__in=ids, status='en_attente').update(
+            status='en_cours', jeton=jeton, tentatives=F('tentatives') + 1, date_traitement=timezone.now()
+        )
+        return list(TacheFacturePDF.objects.filter(pk__in=ids, status='en_cours', jeton=jeton)
+                    .values_list('pk', flat=True))
+
+
+def _orphelines():
+    return TacheFacturePDF.objects.filter(~Exists(Facture.objects.filter(pk=OuterRef('facture_id'))))
+
+
+def requeue_stale_jobs():
+    """
+    Remet en attente les tâches restées « en cours » trop longtemps. Celles
+    dont la facture a disparu sont supprimées : plus rien à rendre.
+    """
+    bloquees = TacheFacturePDF.objects.filter(
+        status='en_cours', date_traitement__lt=timezone.now() - DELAI_TACHE_BLOQUEE
+    )
+    _orphelines().filter(pk__in=bloquees.values('pk')).delete()
+    return bloquees.update(status='en_attente', jeton='')
+
+
+def process_invoice_jobs(limit=100, workers=1):
+    """
+    Traite un lot de la file des PDF de factures.
+
+    Retourne {'traitees', 'rendues', 'inchangees', 'echecs', 'rendu_ms'}. Une
+    tâche en erreur est remise en attente jusqu'à MAX_TENTATIVES, puis marquée échouée.
+    """
+    ids = _reserver(limit)
+    if not ids:
+        return {'traitees': 0, 'rendues': 0, 'inchangees': 0, 'echecs': 0, 'rendu_ms': render_stats([])}
+
+    taches = dict(TacheFacturePDF.objects.filter(pk__in=ids).values_list('facture_id', 'tentatives'))
+    factures = factures_a_rendre(Facture.objects.filter(pk__in=taches))
+    rendues, erreurs, inchangees, durees = render_invoices(factures, workers)
+    # Facture supprimée depuis la mise en file : la tâche n'a plus d'objet
+    _orphelines().filter(pk__in=ids).delete()
+
+    maintenant = timezone.now()
+    TacheFacturePDF.objects.filter(facture_id__in=rendues + inchangees).update(
+        status='terminee', derniere_erreur='', date_traitement=maintenant
+    )
+    for facture_id, message in erreurs.items():
+        TacheFacturePDF.objects.filter(facture_id=facture_id).update(
+            status='echouee' if taches[facture_id] >= MAX_TENTATIVES else 'en_attente',
+            derniere_erreur=message, date_traitement=maintenant
+        )
+    return {
+        'traitees': len(ids), 'rendues': len(rendues), 'inchangees': len(inchangees),
+        'echecs': len(erreurs), 'rendu_ms': render_stats(durees),
+    }
+
+
+def render_month(year, month, workers=None, force=False, chunk_size=200):
+    """
+    Rend en parallèle toutes les factures émises sur un mois, par lots de
+    `chunk_size` pour borner la mémoire. Les tâches en attente de ces factures
+    sont soldées. Retourne {'rendues', 'inchangees', 'echecs', 'rendu_ms'}.
+    """
+    workers = workers or os.cpu_count() or 1
+    factures = factures_a_rendre(
+        Facture.objects.filter(date_emission__year=year, date_emission__month=month)
+    ).order_by('pk')
+
+    total = {'rendues': 0, 'inchangees': 0, 'echecs': 0}
+    durees = []
+    pool = process_pool(workers) if workers > 1 else None
+    try:
+        lot = []
+        for facture in factures.iterator(chunk_size=chunk_size):
+            lot.append(facture)
+            if len(lot) >= chunk_size:
+                _rendre_lot(lot, force, pool, total, durees)
+                lot = []
+        if lot:
+            _rendre_lot(lot, force, pool, total, durees)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    total['rendu_ms'] = render_stats(durees)
+    return total
+
+
+def _rendre_lot(factures, force, pool, total, durees):
+    rendues, erreurs, inchangees, durees_lot = render_invoices(factures, force=force, pool=pool)
+    durees.extend(durees_lot)
+    TacheFacturePDF.objects.filter(
+        facture_id__in=rendues + inchangees, status='en_attente'
+    ).update(status='terminee', date_traitement=timezone.now())
+    total['rendues'] += len(rendues)
+    total['inchangees'] += len(inchangees)
+    total['echecs'] += len(erreurs)
+
+
+def render_stats(durees):
+    """Temps de rendu par facture en ms : moyenne, p50, p95, max."""
+    if not durees:
+        return {'moyenne': None, 'p50': None, 'p95': None, 'max': None}
+    ms = [duree * 1000 for duree in durees]
+    return {
+        'moyenne': round(sum(ms) / len(ms), 3),
+        'p50': round(percentile(ms, 50), 3),
+        'p95': round(percentile(ms, 95), 3),
+        'max': round(max(ms), 3),
+    }
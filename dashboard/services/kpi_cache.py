@@ -0,0 +1,137 @@
+# dashboard/services/kpi_cache.py
+
+import functools
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from dashboard.models import (
+    User, Livreur, Commercant, Prestataire, Livraison, Paiement,
+    StatPaiementJour, StatLivraisonJour
+)
+
+KPI_CACHE_PREFIX = 'dashboard:kpi'
+
+# Sections du tableau de bord mises en cache séparément
+SECTION_STATS = 'stats'
+SECTION_LIVRAISONS = 'livraisons_recentes'
+SECTION_PAIEMENTS = 'paiements_recents'
+SECTIONS = (SECTION_STATS, SECTION_LIVRAISONS, SECTION_PAIEMENTS)
+
+
+def _cache():
+    """Retourne le cache configuré pour les KPI (pluggable via KPI_CACHE_ALIAS)."""
+    return caches[getattr(settings, 'KPI_CACHE_ALIAS', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'KPI_CACHE_TIMEOUT', 300)
+
+
+def _key(name):
+    return f"{KPI_CACHE_PREFIX}:{name}"
+
+
+def _incr(name):
+    """Incrémente un compteur du cache, en le créant au besoin."""
+    cache = _cache()
+    key = _key(f"compteur:{name}")
+    if cache.add(key, 1, timeout=None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Clé expulsée entre add() et incr()
+        cache.set(key, 1, timeout=None)
+
+
+def _compute_stats():
+    today = timezone.localdate()
+    return {
+        'total_livreurs': Livreur.objects.count(),
+        'total_commercants': Commercant.objects.count(),
+        'total_clients': User.objects.filter(user_type='client').count(),
+        'total_prestataires': Prestataire.objects.count(),
+        'livraisons_en_cours': StatLivraisonJour.objects.filter(
+            status='en_cours'
+        ).aggregate(Sum('nombre'))['nombre__sum'] or 0,
+        'paiements_aujourd_hui': StatPaiementJour.objects.filter(
+            jour=today
+        ).aggregate(Sum('nombre'))['nombre__sum'] or 0,
+        'chiffre_affaires_mois': StatPaiementJour.objects.filter(
+            status='reussi',
+            jour__gte=today.replace(day=1),
+            jour__lte=today
+        ).aggregate(Sum('montant_total'))['montant_total__sum'] or 0,
+    }
+
+
+def _compute_livraisons_recentes():
+    return list(Livraison.objects.all().order_by('-created_at')[:5])
+
+
+def _compute_paiements_recents():
+    return list(Paiement.objects.all().order_by('-date_paiement')[:5])
+
+
+CALCULS = {
+    SECTION_STATS: _compute_stats,
+    SECTION_LIVRAISONS: _compute_livraisons_recentes,
+    SECTION_PAIEMENTS: _compute_paiements_recents,
+}
+
+
+def get_home_kpis():
+    """
+    Retourne les KPI de la page d'accueil, depuis le cache si possible.
+
+    Chaque section est recalculée indépendamment lorsqu'elle a été invalidée.
+    """
+    cache = _cache()
+    cached = cache.get_many([_key(section) for section in SECTIONS])
+    
+    kpis = {}
+    for section in SECTIONS:
+        key = _key(section)
+        if key in cached:
+            _incr('hits')
+            kpis[section] = cached[key]
+        else:
+            _incr('misses')
+            kpis[section] = CALCULS[section]()
+            cache.set(key, kpis[section], _timeout())
+    
+    return kpis
+
+
+def invalidate_home_kpis(*sections):
+    """Invalide les sections données (toutes par défaut)."""
+    sections = sections or SECTIONS
+    _cache().delete_many([_key(section) for section in sections])
+    _incr('invalidations')
+
+
+def invalidate_home_kpis_on_commit(*sections):
+    """
+    Invalide les sections une fois la transaction en cours validée : une page
+    d'accueil servie entre l'invalidation et le COMMIT remettrait en cache les
+    anciens chiffres pour KPI_CACHE_TIMEOUT.
+    """
+    transaction.on_commit(functools.partial(invalidate_home_kpis, *sections))
+
+
+def get_kpi_cache_stats():
+    """Retourne les compteurs de hits, misses et invalidations du cache KPI."""
+    names = ('hits', 'misses', 'invalidations')
+    values = _cache().get_many([_key(f"compteur:{name}") for name in names])
+    stats = {name: values.get(_key(f"compteur:{name}"), 0) for name in names}
+    total = stats['hits'] + stats['misses']
+    stats['hit_ratio'] = round(stats['hits'] / total, 3) if total else 0
+    return stats
+
+
+def reset_kpi_cache_stats():
+    """Remet les compteurs à zéro."""
+    _cache().delete_many([_key(f"compteur:{name}") for name in ('hits', 'misses', 'invalidations')])
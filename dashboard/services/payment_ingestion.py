@@ -0,0 +1,254 @@
+# dashboard/services/payment_ingestion.py
+
+import csv
+import io
+import json
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from dashboard.models import (
+    User, Livraison, Service, Paiement, Facture, StatPaiementJour, TacheFacturePDF,
+    date_locale, generate_unique_reference
+)
+from dashboard.services.kpi_cache import SECTION_PAIEMENTS, SECTION_STATS, invalidate_home_kpis
+from dashboard.services.wallet_service import crediter_paiements_en_masse
+
+STATUTS = {code for code, _ in Paiement.STATUS_CHOICES}
+MODES = {code for code, _ in Paiement.MODE_CHOICES}
+CHAMPS = (
+    'reference', 'montant', 'payeur', 'beneficiaire', 'status', 'mode_paiement',
+    'livraison', 'service', 'stripe_payment_id', 'date_paiement',
+)
+SCALAIRES = (str, int, float, Decimal, type(None))
+
+
+class IngestionError(ValueError):
+    """Fichier de paiements invalide ; `errors` liste les erreurs par ligne."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} ligne(s) invalide(s)")
+
+
+def read_payment_rows(fichier, format=None):
+    """
+    Lit des lignes de paiement depuis un fichier CSV (en-têtes) ou JSONL.
+
+    `fichier` peut être ouvert en binaire (upload) ou en texte. Le format est
+    déduit du nom du fichier à défaut d'être indiqué.
+    """
+    if format is None:
+        nom = getattr(fichier, 'name', '') or ''
+        format = 'jsonl' if nom.endswith(('.jsonl', '.json', '.ndjson')) else 'csv'
+    if isinstance(fichier.read(0), bytes):
+        fichier = io.TextIOWrapper(fichier, encoding='utf-8-sig')
+
+    if format == 'csv':
+        for row in csv.DictReader(fichier):
+            yield {k.strip(): (v.strip() if isinstance(v, str) else v) for k, v in row.items() if k}
+    elif format == 'jsonl':
+        for ligne in fichier:
+            if ligne.strip():
+                yield json.loads(ligne)
+    else:
+        raise ValueError(f"Format inconnu : {format}")
+
+
+def _entier(valeur):
+    """Id entier positif écrit en chiffres ASCII, ou None (« ² » passe isdigit() mais pas int())."""
+    texte = str(valeur)
+    return int(texte) if texte.isascii() and texte.isdigit() else None
+
+
+def _structure(row):
+    """Erreurs de forme d'une ligne : objet attendu, champs connus à valeur simple."""
+    if not isinstance(row, dict):
+        return [f"ligne invalide : objet attendu, {type(row).__name__} reçu"]
+    return [
+        f"{champ} invalide : valeur simple attendue, {row[champ]!r} reçu"
+        for champ in CHAMPS if not isinstance(row.get(champ), SCALAIRES)
+    ]
+
+
+def _resoudre_users(identifiants):
+    """Associe chaque identifiant (id, username ou email) à un id utilisateur."""
+    ids = {i for i in identifiants if _entier(i) is not None}
+    emails = {i for i in identifiants if '@' in str(i)}
+    usernames = set(identifiants) - ids - emails
+    users = User.objects.filter(
+        Q(pk__in=[_entier(i) for i in ids]) | Q(username__in=usernames) | Q(email__in=emails)
+    ).values_list('pk', 'username', 'email')
+    resolus = {}
+    for pk, username, email in users:
+        resolus[str(pk)] = pk
+        resolus[username] = pk
+        resolus[email] = pk
+    return resolus
+
+
+def _valider(rows):
+    """
+    Valide les lignes et résout les références en un nombre fixe de requêtes.
+    Les lignes mal formées (pas un objet, champ liste ou objet) sont signalées
+    comme les autres erreurs et écartées des résolutions.
+    """
+    rows = list(rows)
+    formes = {numero: _structure(row) for numero, row in enumerate(rows, start=1)}
+    valides = [row for numero, row in enumerate(rows, start=1) if not formes[numero]]
+    users = _resoudre_users({
+        str(row.get(champ)) for row in valides for champ in ('payeur', 'beneficiaire') if row.get(champ)
+    })
+    livraisons = dict(Livraison.objects.filter(
+        reference__in={str(row['livraison']) for row in valides if row.get('livraison')}
+    ).values_list('reference', 'pk'))
+    services = set(Service.objects.filter(
+        pk__in={_entier(row['service']) for row in valides if row.get('service')} - {None}
+    ).values_list('pk', flat=True))
+    existantes = set(Paiement.objects.filter(
+        reference__in={str(row['reference']) for row in valides if row.get('reference')}
+    ).values_list('reference', flat=True))
+
+    paiements, errors, ignores, references = [], [], 0, set()
+    for numero, row in enumerate(rows, start=1):
+        if formes[numero]:
+            errors.append({'ligne': numero, 'erreurs': formes[numero]})
+            continue
+        erreurs = []
+        reference = str(row['reference']) if row.get('reference') else None
+        if reference in existantes:
+            # Déjà importé : l'ingestion est idempotente sur la référence
+            ignores += 1
+            continue
+        if reference is not None:
+            if reference in references:
+                erreurs.append(f"référence {reference} en double dans le fichier")
+            references.add(reference)
+
+        try:
+            montant = Decimal(str(row.get('montant'))).quantize(Decimal('0.01'))
+            if montant <= 0:
+                raise InvalidOperation
+        except (InvalidOperation, ValueError):
+            erreurs.append(f"montant invalide : {row.get('montant')!r}")
+            montant = None
+
+        payeur = users.get(str(row.get('payeur')))
+        beneficiaire = users.get(str(row.get('beneficiaire')))
+        if payeur is None:
+            erreurs.append(f"payeur inconnu : {row.get('payeur')!r}")
+        if beneficiaire is None:
+            erreurs.append(f"bénéficiaire inconnu : {row.get('beneficiaire')!r}")
+
+        status = row.get('status') or 'reussi'
+        mode = row.get('mode_paiement') or 'carte'
+        if status not in STATUTS:
+            erreurs.append(f"statut inconnu : {status!r}")
+        if mode not in MODES:
+            erreurs.append(f"mode de paiement inconnu : {mode!r}")
+
+        livraison = None
+        if row.get('livraison'):
+            livraison = livraisons.get(str(row['livraison']))
+            if livraison is None:
+                erreurs.append(f"livraison inconnue : {row['livraison']!r}")
+        service = None
+        if row.get('service'):
+            service = _entier(row['service'])
+            if service not in services:
+                erreurs.append(f"service inconnu : {row['service']!r}")
+
+        date_paiement = None
+        if row.get('date_paiement'):
+            try:
+                date_paiement = parse_datetime(str(row['date_paiement']))
+            except ValueError:
+                # Format reconnu mais date impossible (2026-02-30)
+                date_paiement = None
+            if date_paiement is None:
+                erreurs.append(f"date invalide : {row['date_paiement']!r}")
+            elif timezone.is_naive(date_paiement):
+                date_paiement = timezone.make_aware(date_paiement)
+
+        if erreurs:
+            errors.append({'ligne': numero, 'erreurs': erreurs})
+            continue
+        paiements.append(Paiement(
+            reference=reference or generate_unique_reference('PAY', 12),
+            livraison_id=livraison,
+            service_id=service,
+            montant=montant,
+            payeur_id=payeur,
+            beneficiaire_id=beneficiaire,
+            status=status,
+            mode_paiement=mode,
+            stripe_payment_id=row.get('stripe_payment_id') or None,
+            date_paiement=date_paiement,
+        ))
+    return paiements, errors, ignores
+
+
+def ingest_payments(rows, batch_size=1000, dry_run=False):
+    """
+    Importe des paiements en masse dans une seule transaction.
+
+    Toutes les lignes sont validées avant écriture ; la moindre erreur lève
+    IngestionError et rien n'est inséré. Les références déjà présentes sont
+    ignorées. Pour les paiements réussis, les factures sont créées et les
+    portefeuilles crédités par UPDATE agrégés et écritures au journal ; les cumuls journaliers sont
+    incrémentés par (jour, statut, mode).
+    """
+    paiements, errors, ignores = _valider(rows)
+    if errors:
+        raise IngestionError(errors)
+
+    resultat = {'crees': len(paiements), 'ignores': ignores, 'factures': 0, 'beneficiaires_credites': 0}
+    reussis = [p for p in paiements if p.status == 'reussi']
+    resultat['factures'] = len(reussis)
+    resultat['beneficiaires_credites'] = len({p.beneficiaire_id for p in reussis})
+    if dry_run or not paiements:
+        return resultat
+
+    dates = [p.date_paiement for p in paiements]
+    with transaction.atomic():
+        paiements = Paiement.objects.bulk_create(paiements, batch_size=batch_size)
+        # bulk_create impose date_paiement = maintenant (auto_now_add)
+        dates_fournies = []
+        for paiement, date in zip(paiements, dates):
+            if date is not None:
+                paiement.date_paiement = date
+                dates_fournies.append(paiement)
+        Paiement.objects.bulk_update(dates_fournies, ['date_paiement'], batch_size=batch_size)
+
+        reussis = [p for p in paiements if p.status == 'reussi']
+        factures = Facture.objects.bulk_create([
+            Facture(
+                reference=generate_unique_reference('FAC', 12),
+                paiement=p,
+                montant_total=p.montant,
+                status_paiement='reussi'
+            )
+            for p in reussis
+        ], batch_size=batch_size)
+        # bulk_create n'émet pas post_save : mise en file explicite des PDF
+        TacheFacturePDF.planifier(f.pk for f in factures)
+
+        crediter_paiements_en_masse(reussis, batch_size)
+
+        cumuls = defaultdict(lambda: [0, Decimal('0')])
+        for p in paiements:
+            cumul = cumuls[(date_locale(p.date_paiement), p.status, p.mode_paiement)]
+            cumul[0] += 1
+            cumul[1] += p.montant
+        for (jour, status, mode), (nombre, montant) in cumuls.items():
+            StatPaiementJour.incrementer(
+                jour, nombre=nombre, montant_total=montant, status=status, mode_paiement=mode
+            )
+
+        # bulk_create n'émet pas post_save : invalidation explicite du cache KPI
+        transaction.on_commit(lambda: invalidate_home_kpis(SECTION_STATS, SECTION_PAIEMENTS))
+
+    return resultat
@@ -0,0 +1,134 @@
+# dashboard/services/profiling.py
+
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+
+# Mesures relevées pour chaque requête échantillonnée
+METRIQUES = ('queries', 'sql_ms', 'duplicates', 'python_ms', 'size')
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, p):
+    """Percentile par rang le plus proche d'une liste de valeurs."""
+    if not values:
+        return None
+    ordonnees = sorted(values)
+    rang = max(1, math.ceil(p / 100 * len(ordonnees)))
+    return ordonnees[rang - 1]
+
+
+class QueryRecorder:
+    """
+    Wrapper d'exécution SQL (connection.execute_wrapper) qui compte les
+    requêtes, leur durée cumulée et les doublons (même SQL, mêmes paramètres).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self._vues = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self._vues[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(n - 1 for n in self._vues.values() if n > 1)
+
+
+class ProfileStore:
+    """Fenêtres glissantes de mesures par nom d'URL, partagées entre threads."""
+
+    def __init__(self, window=None):
+        self.window = window or getattr(settings, 'REQUEST_PROFILING_WINDOW', 1000)
+        self._lock = threading.Lock()
+        self._series = {}
+        self._requests = Counter()
+
+    def _serie(self, name):
+        serie = self._series.get(name)
+        if serie is None:
+            serie = self._series[name] = {m: deque(maxlen=self.window) for m in METRIQUES}
+        return serie
+
+    def record(self, name, sample):
+        with self._lock:
+            serie = self._serie(name)
+            for metrique in METRIQUES:
+                serie[metrique].append(sample[metrique])
+            self._requests[name] += 1
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+            self._requests.clear()
+
+    def snapshot(self):
+        """Copie brute des fenêtres, sérialisable en JSON."""
+        with self._lock:
+            return {
+                name: {
+                    'requests': self._requests[name],
+                    'samples': {m: list(values) for m, values in serie.items()},
+                }
+                for name, serie in self._series.items()
+            }
+
+    def merge(self, snapshot):
+        """Ajoute les mesures d'un instantané (autre processus, fichier)."""
+        with self._lock:
+            for name, data in snapshot.items():
+                serie = self._serie(name)
+                for metrique in METRIQUES:
+                    serie[metrique].extend(data['samples'].get(metrique, []))
+                self._requests[name] += data['requests']
+
+    def summary(self):
+        """Percentiles par nom d'URL : {name: {'requests': n, metrique: {...}}}."""
+        resultat = {}
+        for name, data in sorted(self.snapshot().items()):
+            resultat[name] = {'requests': data['requests']}
+            for metrique, values in data['samples'].items():
+                stats = {f"p{p}": percentile(values, p) for p in PERCENTILES}
+                stats['max'] = max(values) if values else None
+                resultat[name][metrique] = stats
+        return resultat
+
+    def dump(self, path):
+        """Écrit l'instantané de manière atomique (fichier temporaire puis rename)."""
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as fichier:
+            json.dump(self.snapshot(), fichier)
+        os.replace(tmp, path)
+
+
+# Magasin du processus courant, alimenté par RequestProfilingMiddleware
+store = ProfileStore()
+
+
+def snapshot_path(directory, pid=None):
+    return os.path.join(directory, f"profile-{pid or os.getpid()}.json")
+
+
+def load_snapshots(directory):
+    """Fusionne les instantanés écrits par les processus serveur dans `directory`."""
+    fusion = ProfileStore()
+    if not os.path.isdir(directory):
+        return fusion
+    for nom in sorted(os.listdir(directory)):
+        if nom.startswith('profile-') and nom.endswith('.json'):
+            with open(os.path.join(directory, nom), encoding='utf-8') as fichier:
+                fusion.merge(json.load(fichier))
+    return fusion
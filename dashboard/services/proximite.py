@@ -0,0 +1,131 @@
+# dashboard/services/proximite.py
+
+import heapq
+import math
+
+from django.conf import settings
+from django.db.models import ExpressionWrapper, F, FloatField, Min, Q
+from django.utils import timezone
+from dashboard.models import Annonce, Livreur, ZoneLivreur
+from dashboard.services.geo import boite, gazetteer, haversine, plages_cellules
+
+
+def lire_nombre(params, nom, defaut, maximum, entier=False):
+    """Paramètre numérique positif, `defaut` s'il est absent, plafonné à `maximum`."""
+    valeur = params.get(nom)
+    if valeur in (None, ''):
+        return defaut
+    try:
+        nombre = int(valeur) if entier else float(valeur)
+    except ValueError:
+        raise ValueError(f"`{nom}` invalide : {valeur!r}")
+    if not nombre > 0:
+        raise ValueError(f"`{nom}` doit être positif")
+    return min(nombre, maximum)
+
+
+def lire_point(params):
+    """Point (lat, lon) donné par `lat` et `lon`, ou par un lieu `ville` (nom ou code postal)."""
+    if params.get('ville'):
+        point = gazetteer().localiser(params['ville'])
+        if point is None:
+            raise ValueError(f"Lieu inconnu : {params['ville']!r}")
+        return point
+    try:
+        lat, lon = float(params['lat']), float(params['lon'])
+    except KeyError:
+        raise ValueError("Indiquer `lat` et `lon`, ou `ville`")
+    except ValueError:
+        raise ValueError("`lat` et `lon` doivent être des nombres")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Coordonnées hors limites")
+    return lat, lon
+
+
+def pres_de(lat, lon, rayon_km, cellule='cellule', latitude='latitude', longitude='longitude'):
+    """
+    Préfiltre des lignes proches du point : cases de grille couvrant le cercle
+    (un intervalle indexé par ligne de grille), puis rectangle englobant.
+    """
+    cases = Q()
+    for premiere, derniere in plages_cellules(lat, lon, rayon_km):
+        cases |= Q(**{f'{cellule}__range': (premiere, derniere)})
+    lat_min, lat_max, lon_min, lon_max = boite(lat, lon, rayon_km)
+    return cases & Q(**{f'{latitude}__range': (lat_min, lat_max), f'{longitude}__range': (lon_min, lon_max)})
+
+
+def distance_approchee(lat, lon, latitude='latitude', longitude='longitude'):
+    """
+    Carré de la distance équirectangulaire au point (degrés², sans trigonométrie
+    en SQL) : pré-classement en base, la distance exacte est calculée ensuite.
+    """
+    echelle = math.cos(math.radians(lat))
+    dlat = F(latitude) - lat
+    dlon = (F(longitude) - lon) * echelle
+    return ExpressionWrapper(dlat * dlat + dlon * dlon, output_field=FloatField())
+
+
+def _marge(limite):
+    # Le pré-classement approché peut intervertir des points presque équidistants
+    return 2 * limite + 10
+
+
+def annonces_proches(lat, lon, rayon_km, limite=50, maintenant=None):
+    """
+    Annonces actives à venir dont le départ est à moins de `rayon_km` du point,
+    les plus proches d'abord, avec leur `distance_km`. La base pré-classe les
+    candidates sur l'index couvrant ; seules les premières sont classées par
+    distance haversine puis chargées.
+    """
+    lignes = Annonce.objects.filter(
+        pres_de(lat, lon, rayon_km, 'depart_cellule', 'depart_latitude', 'depart_longitude'),
+        status='active', date_depart__gte=maintenant or timezone.now(),
+    ).annotate(
+        proximite=distance_approchee(lat, lon, 'depart_latitude', 'depart_longitude'),
+    ).order_by('proximite', 'pk').values_list('pk', 'depart_latitude', 'depart_longitude')[:_marge(limite)]
+    distances = ((haversine(lat, lon, depart_lat, depart_lon), pk) for pk, depart_lat, depart_lon in lignes)
+    retenues = heapq.nsmallest(limite, ((distance, pk) for distance, pk in distances if distance <= rayon_km))
+
+    annonces = Annonce.objects.select_related('created_by').in_bulk([pk for _, pk in retenues])
+    resultat = []
+    for distance, pk in retenues:
+        if pk in annonces:
+            annonces[pk].distance_km = round(distance, 2)
+            resultat.append(annonces[pk])
+    return resultat
+
+
+def livreurs_candidats(annonce, rayon_km=None, limite=20):
+    """
+    Livreurs vérifiés et disponibles dont une zone de livraison est à moins de
+    `rayon_km` (GEO_RAYON_ZONE par défaut) du départ de l'annonce, classés par
+    distance puis par note, avec `distance_km` et la `zone` la plus proche.
+    Lève ValueError si le départ de l'annonce n'est pas localisé.
+    """
+    if annonce.depart_latitude is None:
+        raise ValueError("Le lieu de départ de l'annonce n'a pas pu être localisé")
+    lat, lon = annonce.depart_latitude, annonce.depart_longitude
+    rayon_km = rayon_km or settings.GEO_RAYON_ZONE
+    proches = ZoneLivreur.objects.filter(pres_de(lat, lon, rayon_km))
+    # Zone la plus proche de chaque livreur, pré-classée en base
+    ids = list(proches.filter(livreur__verified=True, livreur__disponible=True).values('livreur_id').annotate(
+        proximite=Min(distance_approchee(lat, lon)),
+    ).order_by('proximite', '-livreur__rating', 'livreur_id').values_list('livreur_id', flat=True)[:_marge(limite)])
+
+    livreurs = Livreur.objects.select_related('user').in_bulk(ids)
+    meilleures = {}
+    for livreur_id, zone_lat, zone_lon, libelle in proches.filter(livreur_id__in=ids).values_list(
+            'livreur_id', 'latitude', 'longitude', 'libelle'):
+        distance = haversine(lat, lon, zone_lat, zone_lon)
+        if livreur_id not in livreurs or distance > rayon_km:
+            continue
+        if livreur_id not in meilleures or distance < meilleures[livreur_id][0]:
+            meilleures[livreur_id] = (distance, -livreurs[livreur_id].rating, livreur_id, libelle)
+
+    resultat = []
+    for distance, _, livreur_id, libelle in heapq.nsmallest(limite, meilleures.values()):
+        livreur = livreurs[livreur_id]
+        livreur.distance_km = round(distance, 2)
+        livreur.zone = libelle
+        resultat.append(livreur)
+    return resultat
@@ -0,0 +1,116 @@
+# dashboard/services/push_backends.py
+
+import asyncio
+
+import requests
+from django.conf import settings
+from django.utils.module_loading import import_string
+from requests.adapters import HTTPAdapter
+
+# Pushes « envoyés » par MemoryPushBackend (équivalent de django.core.mail.outbox)
+outbox = []
+
+
+class PushError(Exception):
+    """Échec d'envoi ; `retry=False` pour une erreur définitive (requête refusée)."""
+
+    def __init__(self, message, retry=True):
+        super().__init__(message)
+        self.retry = retry
+
+
+class PushBackend:
+    """
+    Interface des fournisseurs de push. `send` reçoit un message et les ids
+    des destinataires (au plus `taille_lot`) et lève PushError en cas d'échec.
+    """
+    taille_lot = 100
+
+    async def open(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def send(self, titre, message, url, user_ids):
+        raise NotImplementedError
+
+
+class OneSignalBackend(PushBackend):
+    """
+    OneSignal, ciblage par tag user_id. Une session requests partagée garde un
+    pool de `pool_size` connexions ; les appels bloquants passent par un thread.
+    """
+    URL = "https://onesignal.com/api/v1/notifications"
+    # Limite de l'API OneSignal sur le nombre d'entrées de `filters`
+    taille_lot = 100
+
+    def __init__(self, app_id=None, api_key=None, pool_size=None, timeout=10):
+        self.app_id = app_id or settings.ONESIGNAL_APP_ID
+        self.api_key = api_key or settings.ONESIGNAL_REST_API_KEY
+        self.pool_size = pool_size or settings.PUSH_CONCURRENCE
+        self.timeout = timeout
+        self.session = None
+
+    async def open(self):
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size))
+        self.session.headers.update({
+            "Content-Type": "application/json; charset=utf-8",
+            "Authorization": f"Basic {self.api_key}",
+        })
+
+    async def close(self):
+        if self.session is not None:
+            self.session.close()
+            self.session = None
+
+    def payload(self, titre, message, url, user_ids):
+        filtres = []
+        for user_id in user_ids:
+            if filtres:
+                filtres.append({"operator": "OR"})
+            filtres.append({"field": "tag", "key": "user_id", "relation": "=", "value": str(user_id)})
+        payload = {
+            "app_id": self.app_id,
+            "contents": {"en": message},
+            "headings": {"en": titre},
+            "filters": filtres,
+        }
+        if url:
+            payload["url"] = url
+        return payload
+
+    async def send(self, titre, message, url, user_ids):
+        try:
+            response = await asyncio.to_thread(
+                self.session.post, self.URL, json=self.payload(titre, message, url, user_ids), timeout=self.timeout
+            )
+        except requests.RequestException as exc:
+            raise PushError(repr(exc))
+        if response.status_code == 429 or response.status_code >= 500:
+            raise PushError(f"HTTP {response.status_code}")
+        if response.status_code >= 400:
+            raise PushError(f"HTTP {response.status_code} : {response.text[:200]}", retry=False)
+
+
+class MemoryPushBackend(PushBackend):
+    """
+    Faux fournisseur en mémoire pour les tests et le développement : les
+    pushes sont ajoutés à `outbox`. Les `echecs` premiers envois échouent.
+    """
+
+    def __init__(self, echecs=0, retry=True):
+        self.echecs = echecs
+        self.retry = retry
+
+    async def send(self, titre, message, url, user_ids):
+        if self.echecs:
+            self.echecs -= 1
+            raise PushError("échec simulé", retry=self.retry)
+        outbox.append({'titre': titre, 'message': message, 'url': url, 'user_ids': list(user_ids)})
+
+
+def get_backend(path=None, **kwargs):
+    """Instancie le backend configuré (PUSH_BACKEND) ou celui indiqué."""
+    return import_string(path or settings.PUSH_BACKEND)(**kwargs)
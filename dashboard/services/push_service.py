@@ -0,0 +1,165 @@
+# dashboard/services/push_service.py
+
+import asyncio
+import datetime
+import random
+import uuid
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from dashboard.models import EnvoiPush
+from dashboard.services.push_backends import PushError, get_backend
+
+# Envoi resté « en cours » plus longtemps : dispatcher présumé arrêté
+DELAI_ENVOI_BLOQUE = datetime.timedelta(minutes=10)
+DELAI_MAX = datetime.timedelta(hours=6)
+
+
+def retry_delay(tentatives, base=None):
+    """Backoff exponentiel avec gigue : base × 2^(tentatives-1) × [0.5, 1], plafonné."""
+    base = base if base is not None else settings.PUSH_DELAI_BASE
+    delai = datetime.timedelta(seconds=base * 2 ** max(tentatives - 1, 0))
+    return min(delai, DELAI_MAX) * random.uniform(0.5, 1.0)
+
+
+def _reserver(limit):
+    """
+    Passe au plus `limit` envois dus à « en cours » et retourne ceux que cet
+    appel a effectivement réservés. Sans SKIP LOCKED (SQLite), deux
+    dispatchers peuvent sélectionner les mêmes envois : seul celui dont
+    l'UPDATE les a passés « en cours » y a posé son jeton.
+    """
+    maintenant = timezone.now()
+    jeton = uuid.uuid4().hex
+    with transaction.atomic():
+        envois = EnvoiPush.objects.filter(status='en_attente', prochaine_tentative__lte=maintenant)
+        if connection.features.has_select_for_update_skip_locked:
+            envois = envois.select_for_update(skip_locked=True)
+        ids = list(envois.order_by('prochaine_tentative').values_list('pk', flat=True)[:limit])
+        EnvoiPush.objects.filter(pk__in=ids, status='en_attente').update(
+            status='en_cours', jeton=jeton, tentatives=F('tentatives') + 1, date_traitement=maintenant
+        )
+        return list(EnvoiPush.objects.filter(pk__in=ids, status='en_cours', jeton=jeton).values(
+            'pk', 'user_id', 'titre', 'message', 'url', 'tentatives'
+        ))
+
+
+def requeue_stale_pushes(max_tentatives=None):
+    """
+    Remet en attente les envois restés « en cours » trop longtemps. La
+    réservation a compté la tentative : ceux qui ont épuisé `max_tentatives`
+    sont abandonnés plutôt que remis en file indéfiniment.
+    """
+    max_tentatives = max_tentatives or settings.PUSH_MAX_TENTATIVES
+    bloques = EnvoiPush.objects.filter(
+        status='en_cours', date_traitement__lt=timezone.now() - DELAI_ENVOI_BLOQUE
+    )
+    bloques.filter(tentatives__gte=max_tentatives).update(
+        status='abandonne', jeton='', derniere_erreur="Envoi bloqué (dispatcher arrêté)"
+    )
+    return bloques.update(status='en_attente', jeton='')
+
+
+def _grouper(envois, taille_lot):
+    """Regroupe les envois d'un même message en lots d'au plus `taille_lot` destinataires."""
+    par_message = defaultdict(list)
+    for envoi in envois:
+        par_message[(envoi['titre'], envoi['message'], envoi['url'])].append(envoi)
+    for (titre, message, url), groupe in par_message.items():
+        for i in range(0, len(groupe), taille_lot):
+            yield titre, message, url, groupe[i:i + taille_lot]
+
+
+class PushDispatcher:
+    """
+    Vide la file EnvoiPush : réservation par lots, regroupement par message,
+    envois concurrents (au plus `concurrence` en vol) sur un backend partagé,
+    backoff exponentiel puis abandon (dead-letter) après `max_tentatives`.
+    """
+
+    def __init__(self, backend=None, concurrence=None, batch_size=500, max_tentatives=None, delai_base=None):
+        self.backend = backend or get_backend()
+        self.concurrence = concurrence or settings.PUSH_CONCURRENCE
+        self.batch_size = batch_size
+        self.max_tentatives = max_tentatives or settings.PUSH_MAX_TENTATIVES
+        self.delai_base = delai_base if delai_base is not None else settings.PUSH_DELAI_BASE
+
+    async def run_once(self):
+        """Traite un lot. Retourne {'traites', 'envoyes', 'reportes', 'abandonnes'}."""
+        envois = await sync_to_async(_reserver)(self.batch_size)
+        if not envois:
+            return {'traites': 0, 'envoyes': 0, 'reportes': 0, 'abandonnes': 0}
+
+        semaphore = asyncio.Semaphore(self.concurrence)
+
+        async def envoyer(titre, message, url, groupe):
+            async with semaphore:
+                try:
+                    await self.backend.send(titre, message, url, [envoi['user_id'] for envoi in groupe])
+                    return groupe, None
+                except PushError as exc:
+                    return groupe, exc
+                except Exception as exc:
+                    return groupe, PushError(repr(exc))
+
+        resultats = await asyncio.gather(*(
+            envoyer(*lot) for lot in _grouper(envois, self.backend.taille_lot)
+        ))
+        return await sync_to_async(self._enregistrer)(len(envois), resultats)
+
+    def _enregistrer(self, traites, resultats):
+        maintenant = timezone.now()
+        envoyes, abandonnes, reportes = [], defaultdict(list), defaultdict(list)
+        for groupe, erreur in resultats:
+            for envoi in groupe:
+                if erreur is None:
+                    envoyes.append(envoi['pk'])
+                elif not erreur.retry or envoi['tentatives'] >= self.max_tentatives:
+                    abandonnes[str(erreur)].append(envoi['pk'])
+                else:
+                    reportes[(str(erreur), envoi['tentatives'])].append(envoi['pk'])
+
+        with transaction.atomic():
+            EnvoiPush.objects.filter(pk__in=envoyes).update(
+                status='envoye', date_envoi=maintenant, derniere_erreur=''
+            )
+            for erreur, ids in abandonnes.items():
+                EnvoiPush.objects.filter(pk__in=ids).update(status='abandonne', derniere_erreur=erreur)
+            for (erreur, tentatives), ids in reportes.items():
+                EnvoiPush.objects.filter(pk__in=ids).update(
+                    status='en_attente', derniere_erreur=erreur,
+                    prochaine_tentative=maintenant + retry_delay(tentatives, self.delai_base)
+                )
+        return {
+            'traites': traites,
+            'envoyes': len(envoyes),
+            'reportes': sum(len(ids) for ids in reportes.values()),
+            'abandonnes': sum(len(ids) for ids in abandonnes.values()),
+        }
+
+    async def run(self, loop=False, interval=2.0, on_batch=None):
+        """
+        Vide la file (lots successifs jusqu'à épuisement), puis, avec loop=True,
+        attend `interval` secondes entre deux passages. `on_batch` reçoit le
+        bilan de chaque lot. Retourne le cumul.
+        """
+        total = {'traites': 0, 'envoyes': 0, 'reportes': 0, 'abandonnes': 0}
+        await self.backend.open()
+        try:
+            while True:
+                await sync_to_async(requeue_stale_pushes)(self.max_tentatives)
+                resultat = await self.run_once()
+                for cle, valeur in resultat.items():
+                    total[cle] += valeur
+                if resultat['traites'] and on_batch is not None:
+                    on_batch(resultat)
+                if not resultat['traites']:
+                    if not loop:
+                        return total
+                    await asyncio.sleep(interval)
+        finally:
+            await self.backend.close()
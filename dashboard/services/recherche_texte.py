@@ -0,0 +1,264 @@
+# dashboard/services/recherche_texte.py
+
+import functools
+import re
+import unicodedata
+
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from dashboard.models import Annonce, Service, User
+
+# Au-delà, les termes d'une requête sont ignorés
+TERMES_MAX = 8
+
+
+def normaliser_texte(texte):
+    """Texte indexé ou recherché : minuscules sans accents, ponctuation remplacée par des espaces."""
+    if not texte:
+        return ''
+    texte = unicodedata.normalize('NFKD', str(texte)).encode('ascii', 'ignore').decode().lower()
+    return ' '.join(re.findall(r'[a-z0-9]+', texte))
+
+
+def termes(texte):
+    """Termes d'une requête, recherchés comme préfixes (« livr » trouve « livraison »)."""
+    return normaliser_texte(texte).split()[:TERMES_MAX]
+
+
+class Index:
+    """
+    Index plein texte d'un modèle : une table annexe par index, une ligne par
+    objet (clé = pk). Le premier champ pèse plus dans le classement.
+    `relations` : clés étrangères dont l'index cible est aussi interrogé par
+    `filtre` (une annonce est trouvée par le nom de son auteur).
+    """
+
+    def __init__(self, nom, modele, champs, relations=None):
+        self.nom = nom
+        self.modele = modele
+        self.champs = tuple(champs)
+        self.relations = relations or {}
+        self.table = f"dashboard_recherche_{nom}"
+
+    def __repr__(self):
+        return f"<Index {self.nom} : {', '.join(self.champs)}>"
+
+    def document(self, valeurs):
+        return [normaliser_texte(valeur) for valeur in valeurs]
+
+    def concerne(self, update_fields):
+        """Un enregistrement partiel ne réindexe que s'il touche un champ indexé."""
+        return update_fields is None or bool(set(update_fields) & set(self.champs))
+
+
+INDEX = {
+    'annonce': Index('annonce', Annonce, ('titre', 'description', 'depart', 'arrivee'), {'created_by': 'user'}),
+    'service': Index('service', Service, ('nom', 'description', 'zone_intervention'), {'prestataire': 'user'}),
+    'user': Index('user', User, ('username', 'last_name', 'first_name', 'email', 'phone')),
+}
+INDEX_PAR_MODELE = {index.modele: index for index in INDEX.values()}
+
+
+class BackendRecherche:
+    """
+    Stockage et interrogation des index pour un moteur de base de données.
+
+    Les tables sont créées par la migration 0016. Chaque backend fournit
+    indexer (documents : couples (pk, [valeurs normalisées])), retirer (pks),
+    sous_requete(index, termes) et classement(index, termes, limite,
+    restriction) ; ces deux dernières retournent (sql, params) sélectionnant
+    des pk, les plus pertinents d'abord pour le classement. `restriction`
+    (sql, params) est une sous-requête des pk admis.
+    """
+
+    def vider(self, cursor, index):
+        cursor.execute(f"DELETE FROM {index.table}")
+
+    def _restreindre(self, colonne, restriction):
+        if restriction is None:
+            return '', []
+        sql, params = restriction
+        return f" AND {colonne} IN ({sql})", list(params)
+
+
+class SQLiteFTS5(BackendRecherche):
+    """Tables virtuelles FTS5 (rowid = pk), classement bm25."""
+
+    def indexer(self, cursor, index, documents):
+        colonnes = ', '.join(index.champs)
+        marques = ', '.join(['%s'] * (len(index.champs) + 1))
+        cursor.executemany(
+            f"INSERT OR REPLACE INTO {index.table} (rowid, {colonnes}) VALUES ({marques})",
+            [[pk, *valeurs] for pk, valeurs in documents],
+        )
+
+    def retirer(self, cursor, index, pks):
+        pks = list(pks)
+        for debut in range(0, len(pks), 500):
+            lot = pks[debut:debut + 500]
+            cursor.execute(f"DELETE FROM {index.table} WHERE rowid IN ({', '.join(['%s'] * len(lot))})", lot)
+
+    def _requete(self, termes):
+        # Termes réduits à [a-z0-9]+ : les guillemets ne peuvent pas être rompus
+        return ' '.join(f'"{terme}"*' for terme in termes)
+
+    def sous_requete(self, index, termes):
+        return f"SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s", [self._requete(termes)]
+
+    def classement(self, index, termes, limite, restriction=None):
+        poids = ', '.join(['4.0'] + ['1.0'] * (len(index.champs) - 1))
+        # « +rowid » : la restriction ne doit pas devenir le point d'entrée de la
+        # table virtuelle (un MATCH par pk admis, plusieurs secondes sur 60 000 lignes)
+        condition, params = self._restreindre('+rowid', restriction)
+        return (
+            f"SELECT rowid FROM {index.table} WHERE {index.table} MATCH %s{condition} "
+            f"ORDER BY bm25({index.table}, {poids}), rowid LIMIT %s",
+            [self._requete(termes), *params, limite],
+        )
+
+
+class PostgresTsvector(BackendRecherche):
+    """
+    Tables (id, document tsvector) indexées en GIN, configuration 'simple' :
+    le texte est déjà désaccentué par normaliser_texte, sans extension unaccent.
+    """
+
+    def indexer(self, cursor, index, documents):
+        vecteur = ' || '.join(
+            f"setweight(to_tsvector('simple', %s), '{'A' if rang == 0 else 'B'}')" for rang in range(len(index.champs))
+        )
+        cursor.executemany(
+            f"INSERT INTO {index.table} (id, document) VALUES (%s, {vecteur}) "
+            f"ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document",
+            [[pk, *valeurs] for pk, valeurs in documents],
+        )
+
+    def retirer(self, cursor, index, pks):
+        cursor.execute(f"DELETE FROM {index.table} WHERE id = ANY(%s)", [list(pks)])
+
+    def _requete(self, termes):
+        return ' & '.join(f"{terme}:*" for terme in termes)
+
+    def sous_requete(self, index, termes):
+        return f"SELECT id FROM {index.table} WHERE document @@ to_tsquery('simple', %s)", [self._requete(termes)]
+
+    def classement(self, index, termes, limite, restriction=None):
+        requete = self._requete(termes)
+        condition, params = self._restreindre('id', restriction)
+        return (
+            f"SELECT id FROM {index.table} WHERE document @@ to_tsquery('simple', %s){condition} "
+            f"ORDER BY ts_rank(document, to_tsquery('simple', %s)) DESC, id LIMIT %s",
+            [requete, *params, requete, limite],
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTS5,
+    'postgresql': PostgresTsvector,
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _backend(vendor):
+    return BACKENDS[vendor]() if vendor in BACKENDS else None
+
+
+def backend(connexion=None):
+    """Backend du moteur de la connexion, ou None (recherche par icontains, sans index)."""
+    return _backend((connexion or connection).vendor)
+
+
+def filtre(nom, texte, prefixe=''):
+    """
+    Q restreignant un queryset du modèle de l'index `nom` (ou, avec `prefixe`,
+    d'un modèle qui y mène) aux objets dont un document contient tous les termes.
+    """
+    index = INDEX[nom]
+    recherches = termes(texte)
+    if not recherches:
+        return Q()
+    moteur = backend()
+    if moteur is None:
+        condition = Q()
+        for terme in recherches:
+            condition &= functools.reduce(
+                Q.__or__, (Q(**{f'{prefixe}{champ}__icontains': terme}) for champ in index.champs)
+            )
+    else:
+        condition = Q(**{f'{prefixe}pk__in': RawSQL(*moteur.sous_requete(index, recherches))})
+    for relation, cible in index.relations.items():
+        condition |= filtre(cible, texte, prefixe=f'{prefixe}{relation}__')
+    return condition
+
+
+def rechercher(nom, texte, limite=20, queryset=None):
+    """
+    Objets de l'index `nom` correspondant à `texte`, les plus pertinents
+    d'abord, parmi ceux de `queryset` (filtré en base avant la limite).
+    Les relations de l'index ne sont pas parcourues.
+    """
+    index = INDEX[nom]
+    recherches = termes(texte)
+    if not recherches:
+        return []
+    restriction = None
+    if queryset is None:
+        queryset = index.modele._default_manager.all()
+    elif queryset.query.where:
+        restriction = queryset.order_by().values('pk').query.sql_with_params()
+    moteur = backend()
+    if moteur is None:
+        return list(queryset.filter(filtre(nom, texte)).order_by('-pk')[:limite])
+    with connection.cursor() as cursor:
+        cursor.execute(*moteur.classement(index, recherches, limite, restriction))
+        pks = [ligne[0] for ligne in cursor.fetchall()]
+    objets = queryset.in_bulk(pks)
+    return [objets[pk] for pk in pks if pk in objets]
+
+
+def indexer_objets(objets, index=None):
+    """(Ré)indexe des instances d'un même modèle indexé."""
+    objets = list(objets)
+    moteur = backend()
+    if not objets or moteur is None:
+        return
+    index = index or INDEX_PAR_MODELE[type(objets[0])]
+    with connection.cursor() as cursor:
+        moteur.indexer(cursor, index, [
+            (objet.pk, index.document(getattr(objet, champ) for champ in index.champs)) for objet in objets
+        ])
+
+
+def retirer_objets(modele, pks):
+    moteur = backend()
+    if moteur is not None:
+        with connection.cursor() as cursor:
+            moteur.retirer(cursor, INDEX_PAR_MODELE[modele], pks)
+
+
+def reconstruire(noms=None, connexion=None, batch_size=1000):
+    """
+    Vide et remplit les index `noms` (tous par défaut) par lots sur la clé
+    primaire, après un import ou des mises à jour en masse qui n'émettent pas
+    de signaux. Retourne {index: documents indexés}.
+    """
+    connexion = connexion or connection
+    moteur = backend(connexion)
+    resultat = {}
+    for nom, index in INDEX.items():
+        if moteur is None or (noms and nom not in noms):
+            continue
+        lignes = index.modele._base_manager.using(connexion.alias).order_by('pk').values_list('pk', *index.champs)
+        total, dernier = 0, None
+        with connexion.cursor() as cursor:
+            moteur.vider(cursor, index)
+            while True:
+                lot = list((lignes if dernier is None else lignes.filter(pk__gt=dernier))[:batch_size])
+                moteur.indexer(cursor, index, [(ligne[0], index.document(ligne[1:])) for ligne in lot])
+                total += len(lot)
+                if len(lot) < batch_size:
+                    break
+                dernier = lot[-1][0]
+        resultat[nom] = total
+    return resultat
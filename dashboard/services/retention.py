@@ -0,0 +1,184 @@
+# dashboard/services/retention.py
+
+import datetime
+import functools
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+from dashboard.models import LogConnexion, Notification
+
+# Tables soumises à rétention : (modèle, champ date, champ portant le type ou None)
+MODELES = {
+    'notification': (Notification, 'date_creation', 'type_notification'),
+    'logconnexion': (LogConnexion, 'date_connexion', None),
+}
+ACTIONS = ('supprimer', 'archiver')
+TOUS_TYPES = '*'
+
+
+class Politique:
+    """Règle de rétention : les lignes de `modele` plus vieilles que `jours` sont supprimées ou archivées."""
+
+    def __init__(self, nom, modele, champ_date, jours, action='supprimer', filtre=None, lues_seulement=False):
+        if action not in ACTIONS:
+            raise ValueError(f"{nom} : action inconnue {action!r} (attendu : {', '.join(ACTIONS)})")
+        if not isinstance(jours, int) or jours < 0:
+            raise ValueError(f"{nom} : `jours` doit être un entier positif")
+        for relation in modele._meta.related_objects:
+            # Une cascade supprimerait des lignes liées sans les archiver
+            if relation.on_delete not in (models.SET_NULL, models.DO_NOTHING):
+                raise ValueError(f"{nom} : relation {relation.name} non gérée ({relation.on_delete.__name__})")
+        self.nom = nom
+        self.modele = modele
+        self.champ_date = champ_date
+        self.jours = jours
+        self.action = action
+        self.filtre = filtre or Q()
+        self.lues_seulement = lues_seulement
+
+    def __repr__(self):
+        return f"<Politique {self.nom} : {self.action} après {self.jours} j>"
+
+    def queryset(self, maintenant=None):
+        limite = (maintenant or timezone.now()) - datetime.timedelta(days=self.jours)
+        lignes = self.modele._base_manager.filter(self.filtre, **{f'{self.champ_date}__lt': limite})
+        if self.lues_seulement:
+            lignes = lignes.filter(lue=True)
+        return lignes
+
+
+def politiques(config=None, noms=None):
+    """
+    Politiques décrites par RETENTION (ou `config`), restreintes aux modèles
+    `noms`. Pour les notifications, une règle par type_notification ; la règle
+    '*' couvre les types sans règle propre. Lève ValueError si la configuration
+    est invalide.
+    """
+    config = settings.RETENTION if config is None else config
+    resultat = []
+    for nom, regles in config.items():
+        if nom not in MODELES:
+            raise ValueError(f"Modèle sans rétention : {nom!r} (attendu : {', '.join(MODELES)})")
+        if noms and nom not in noms:
+            continue
+        modele, champ_date, champ_type = MODELES[nom]
+        types = [cle for cle in regles if cle != TOUS_TYPES]
+        if types and champ_type is None:
+            raise ValueError(f"{nom} : seule la règle '{TOUS_TYPES}' est possible")
+        for cle, regle in regles.items():
+            if cle == TOUS_TYPES:
+                filtre = ~Q(**{f'{champ_type}__in': types}) if types else Q()
+            else:
+                filtre = Q(**{champ_type: cle})
+            inconnues = set(regle) - {'jours', 'action', 'lues_seulement'}
+            if inconnues:
+                raise ValueError(f"{nom}.{cle} : paramètres inconnus {sorted(inconnues)}")
+            if regle.get('lues_seulement') and modele is not Notification:
+                raise ValueError(f"{nom}.{cle} : `lues_seulement` ne concerne que les notifications")
+            if regle.get('jours') is None:
+                continue  # Conservation illimitée
+            resultat.append(Politique(f"{nom}.{cle}", modele, champ_date, filtre=filtre, **regle))
+    return resultat
+
+
+def archive_path(politique, maintenant, archive_dir=None):
+    dossier = archive_dir or settings.RETENTION_ARCHIVE_DIR
+    return os.path.join(dossier, f"{politique.nom.replace('*', 'defaut')}_{maintenant:%Y%m%d_%H%M%S}.jsonl.gz")
+
+
+def _preparer_archive(chemin, lot):
+    """
+    Écrit le lot dans un membre gzip complet, dans un fichier temporaire à
+    côté de l'archive. Retourne son chemin ; il n'est ajouté à l'archive
+    qu'une fois la suppression validée (_ajouter_archive).
+    """
+    dossier = os.path.dirname(chemin)
+    os.makedirs(dossier, exist_ok=True)
+    descripteur, membre = tempfile.mkstemp(dir=dossier, suffix='.tmp')
+    with os.fdopen(descripteur, 'wb') as brut, gzip.open(brut, 'wt', encoding='utf-8') as archive:
+        for ligne in lot:
+            archive.write(json.dumps(ligne, cls=DjangoJSONEncoder, ensure_ascii=False) + '\n')
+    return membre
+
+
+def _ajouter_archive(chemin, membre):
+    """Ajoute le membre à l'archive (des membres gzip concaténés restent un fichier gzip lisible)."""
+    with open(membre, 'rb') as source, open(chemin, 'ab') as archive:
+        shutil.copyfileobj(source, archive)
+    os.remove(membre)
+
+
+def _supprimer(modele, lot):
+    """
+    Supprime les lignes du lot par le collecteur de Django : une mise à NULL
+    par relation SET_NULL puis un DELETE ; les signaux post_delete (compteur
+    de notifications non lues) sont émis.
+    """
+    modele._base_manager.filter(pk__in=[ligne[modele._meta.pk.attname] for ligne in lot]).delete()
+
+
+def appliquer(politique, maintenant=None, batch_size=500, pause=0, dry_run=False, archive_dir=None):
+    """
+    Applique une politique par lots de `batch_size` lignes, chacun dans sa
+    propre transaction courte (verrous brefs), avec `pause` secondes entre deux
+    lots. Retourne {'politique', 'lignes', 'secondes', 'lignes_par_seconde', 'fichier'}.
+    """
+    maintenant = maintenant or timezone.now()
+    lignes = politique.queryset(maintenant)
+    modele = politique.modele
+    fichier = archive_path(politique, maintenant, archive_dir) if politique.action == 'archiver' else None
+    champs = [champ.attname for champ in modele._meta.concrete_fields]
+    cle = modele._meta.pk.attname
+
+    debut = time.perf_counter()
+    total = 0
+    if dry_run:
+        total = lignes.count()
+    else:
+        dernier = None
+        while True:
+            membre = None
+            try:
+                with transaction.atomic():
+                    lot = lignes if dernier is None else lignes.filter(pk__gt=dernier)
+                    lot = list(lot.select_for_update().order_by('pk').values(*champs)[:batch_size])
+                    if lot:
+                        if fichier:
+                            # Archivé après validation : un lot annulé n'y entre pas
+                            membre = _preparer_archive(fichier, lot)
+                            transaction.on_commit(functools.partial(_ajouter_archive, fichier, membre))
+                        _supprimer(modele, lot)
+            except BaseException:
+                if membre and os.path.exists(membre):
+                    os.remove(membre)
+                raise
+            total += len(lot)
+            if len(lot) < batch_size:
+                break
+            dernier = lot[-1][cle]
+            if pause:
+                time.sleep(pause)
+    secondes = time.perf_counter() - debut
+
+    return {
+        'politique': politique.nom,
+        'lignes': total,
+        'secondes': secondes,
+        'lignes_par_seconde': total / secondes if secondes else 0,
+        'fichier': fichier if fichier and total and not dry_run else None,
+    }
+
+
+def appliquer_retention(noms=None, config=None, **options):
+    """Applique toutes les politiques configurées (ou celles des modèles `noms`)."""
+    maintenant = options.pop('maintenant', None) or timezone.now()
+    return [appliquer(politique, maintenant, **options) for politique in politiques(config, noms)]
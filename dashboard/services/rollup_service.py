@@ -0,0 +1,54 @@
+# dashboard/services/rollup_service.py
+
+from django.db import transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from dashboard.models import (
+    User, Livraison, Paiement,
+    StatPaiementJour, StatLivraisonJour, StatInscriptionJour
+)
+
+# Sources des cumuls : (modèle cumul, modèle source, champ date, dimensions, agrégats)
+CUMULS = {
+    'paiements': (
+        StatPaiementJour, Paiement, 'date_paiement',
+        ('status', 'mode_paiement'),
+        {'nombre': Count('id'), 'montant_total': Sum('montant')},
+    ),
+    'livraisons': (
+        StatLivraisonJour, Livraison, 'created_at',
+        ('status',),
+        {'nombre': Count('id')},
+    ),
+    'inscriptions': (
+        StatInscriptionJour, User, 'date_joined',
+        ('user_type',),
+        {'nombre': Count('id')},
+    ),
+}
+
+
+def rebuild_daily_rollups(names=None, batch_size=1000):
+    """
+    Reconstruit entièrement les tables de cumuls journaliers depuis les tables sources.
+
+    Retourne le nombre de lignes de cumul créées par table.
+    """
+    resultats = {}
+    for name in names or CUMULS:
+        stat_model, source_model, date_field, dimensions, aggregats = CUMULS[name]
+        
+        # Une seule requête groupée par table source (jour local x dimensions)
+        rows = source_model.objects.annotate(
+            jour=TruncDate(date_field)
+        ).values('jour', *dimensions).annotate(**aggregats).order_by()
+        
+        cumuls = [stat_model(**row) for row in rows]
+        
+        with transaction.atomic():
+            stat_model.objects.all().delete()
+            stat_model.objects.bulk_create(cumuls, batch_size=batch_size)
+        
+        resultats[name] = len(cumuls)
+    
+    return resultats
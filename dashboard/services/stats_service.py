@@ -1,9 +1,137 @@
 # dashboard/services/stats_service.py
 
 from django.db.models import Count, Sum, Avg
+from django.db.models.functions import TruncDay, TruncWeek, TruncMonth, TruncYear
 from django.utils import timezone
-from datetime import timedelta
-from dashboard.models import Livraison, User, Paiement, Annonce
+from datetime import date, datetime, time, timedelta
+from dashboard.models import (
+    Livraison, User, Paiement, Annonce,
+    StatPaiementJour, StatLivraisonJour, StatInscriptionJour
+)
+
+# Fonctions de troncature disponibles pour le découpage temporel
+PERIODES = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+    'year': TruncYear,
+}
+
+# Métriques agrégeables : (modèle, champ date, agrégat, filtres par défaut)
+METRIQUES = {
+    'revenue': (Paiement, 'date_paiement', Sum('montant'), {'status': 'reussi'}),
+    'paiements': (Paiement, 'date_paiement', Count('id'), {}),
+    'inscriptions': (User, 'date_joined', Count('id'), {}),
+    'livraisons': (Livraison, 'created_at', Count('id'), {}),
+    'annonces': (Annonce, 'created_at', Count('id'), {}),
+}
+
+# Métriques servies par les cumuls journaliers : (modèle cumul, agrégat, filtres par défaut)
+# Les dimensions des cumuls portent le même nom que les champs sources,
+# les filtres peuvent donc être passés indifféremment aux deux.
+METRIQUES_CUMULS = {
+    'revenue': (StatPaiementJour, Sum('montant_total'), {'status': 'reussi'}),
+    'paiements': (StatPaiementJour, Sum('nombre'), {}),
+    'inscriptions': (StatInscriptionJour, Sum('nombre'), {}),
+    'livraisons': (StatLivraisonJour, Sum('nombre'), {}),
+}
+
+
+def _debut_periode(jour, period):
+    """Ramène une date au premier jour de sa période."""
+    if period == 'week':
+        return jour - timedelta(days=jour.weekday())
+    if period == 'month':
+        return jour.replace(day=1)
+    if period == 'year':
+        return jour.replace(month=1, day=1)
+    return jour
+
+
+def _periode_suivante(jour, period):
+    """Retourne le premier jour de la période suivante."""
+    if period == 'day':
+        return jour + timedelta(days=1)
+    if period == 'week':
+        return jour + timedelta(weeks=1)
+    if period == 'month':
+        if jour.month == 12:
+            return jour.replace(year=jour.year + 1, month=1)
+        return jour.replace(month=jour.month + 1)
+    return jour.replace(year=jour.year + 1)
+
+
+def iter_periodes(start, end, period='month'):
+    """Itère sur le premier jour de chaque période entre start et end (inclus)."""
+    jour = _debut_periode(start, period)
+    while jour <= end:
+        yield jour
+        jour = _periode_suivante(jour, period)
+
+
+def get_time_series(metric, period='month', start=None, end=None, use_rollups=True, **filters):
+    """
+    Agrège une métrique par période en une seule requête groupée.
+
+    Retourne une liste de dicts {'periode': date, 'valeur': ...} couvrant
+    toutes les périodes entre start et end, les périodes vides valant 0.
+    Les filtres supplémentaires sont appliqués tels quels au queryset.
+    Lorsque la métrique dispose de cumuls journaliers, ceux-ci sont lus
+    à la place de la table source (sauf use_rollups=False).
+    """
+    if metric not in METRIQUES:
+        raise ValueError(f"Métrique inconnue: {metric}")
+    if period not in PERIODES:
+        raise ValueError(f"Période inconnue: {period}")
+
+    today = timezone.localdate()
+    end = end or today
+    start = start or _debut_periode(end, period)
+    tz = timezone.get_current_timezone()
+
+    if use_rollups and metric in METRIQUES_CUMULS:
+        model, aggregate, default_filters = METRIQUES_CUMULS[metric]
+        date_field = 'jour'
+        queryset = model.objects.filter(
+            jour__gte=start, jour__lte=end,
+            **default_filters,
+            **filters
+        )
+    else:
+        model, date_field, aggregate, default_filters = METRIQUES[metric]
+        # Bornes en datetimes conscients pour profiter des index sur le champ date
+        lower = timezone.make_aware(datetime.combine(start, time.min), tz)
+        upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min), tz)
+        queryset = model.objects.filter(
+            **{f'{date_field}__gte': lower, f'{date_field}__lt': upper},
+            **default_filters,
+            **filters
+        )
+    rows = queryset.annotate(
+        periode=PERIODES[period](date_field)
+    ).values('periode').annotate(valeur=aggregate).order_by('periode')
+
+    valeurs = {}
+    for row in rows:
+        periode = row['periode']
+        if isinstance(periode, datetime):
+            periode = timezone.localtime(periode, tz).date() if timezone.is_aware(periode) else periode.date()
+        valeurs[periode] = row['valeur'] or 0
+
+    return [
+        {'periode': periode, 'valeur': valeurs.get(periode, 0)}
+        for periode in iter_periodes(start, end, period)
+    ]
+
+
+def get_yearly_series(metric, year, period='month', **filters):
+    """Raccourci : série d'une métrique sur une année civile complète."""
+    return get_time_series(
+        metric, period,
+        start=date(year, 1, 1),
+        end=date(year, 12, 31),
+        **filters
+    )
 
 def get_monthly_revenue(year=None, month=None):
     """Calcule le chiffre d'affaires du mois spécifié ou du mois en cours."""
@@ -12,15 +140,37 @@ def get_monthly_revenue(year=None, month=None):
         year = today.year
         month = today.month
     
-    # Revenus totaux du mois (paiements réussis)
-    revenue = Paiement.objects.filter(
+    # Revenus totaux du mois (paiements réussis), lus depuis les cumuls journaliers
+    revenue = StatPaiementJour.objects.filter(
         status='reussi',
-        date_paiement__year=year,
-        date_paiement__month=month
-    ).aggregate(total=Sum('montant'))['total'] or 0
+        jour__year=year,
+        jour__month=month
+    ).aggregate(total=Sum('montant_total'))['total'] or 0
     
     return revenue
 
+
+def get_rollup_totals(model, group_by, start=None, end=None, **filters):
+    """
+    Totalise un cumul journalier par dimension sur une plage de dates.
+
+    Retourne un dict {valeur_dimension: {'nombre': ..., 'montant_total': ...}}.
+    """
+    queryset = model.objects.filter(**filters)
+    if start:
+        queryset = queryset.filter(jour__gte=start)
+    if end:
+        queryset = queryset.filter(jour__lte=end)
+    
+    aggregats = {'nombre': Sum('nombre')}
+    if model is StatPaiementJour:
+        aggregats['montant_total'] = Sum('montant_total')
+    
+    return {
+        row.pop(group_by): {k: v or 0 for k, v in row.items()}
+        for row in queryset.values(group_by).annotate(**aggregats).order_by()
+    }
+
 def get_livreur_stats(livreur_id, period=30):
     """Obtient les statistiques d'un livreur sur la période spécifiée (en jours)."""
     livreur = User.objects.get(id=livreur_id, user_type='livreur')
@@ -88,17 +238,24 @@ def get_platform_stats(days=30):
     """Obtient des statistiques globales de la plateforme."""
     start_date = timezone.now() - timedelta(days=days)
     
-    # Nombre total d'utilisateurs inscrits
-    users_count = User.objects.filter(date_joined__gte=start_date).count()
+    # Répartition des inscriptions par type d'utilisateur (cumuls journaliers)
+    user_types = [
+        {'user_type': user_type, 'count': totaux['nombre']}
+        for user_type, totaux in get_rollup_totals(
+            StatInscriptionJour, 'user_type', start=timezone.localdate(start_date)
+        ).items()
+    ]
     
-    # Répartition par type d'utilisateur
-    user_types = User.objects.filter(date_joined__gte=start_date).values('user_type').annotate(count=Count('id'))
+    # Nombre total d'utilisateurs inscrits
+    users_count = sum(item['count'] for item in user_types)
     
     # Nombre de livraisons effectuées
     livraisons_count = Livraison.objects.filter(date_livraison_reelle__gte=start_date, status='livree').count()
     
     # Chiffre d'affaires total
-    revenue = Paiement.objects.filter(status='reussi', date_paiement__gte=start_date).aggregate(total=Sum('montant'))['total'] or 0
+    revenue = StatPaiementJour.objects.filter(
+        status='reussi', jour__gte=timezone.localdate(start_date)
+    ).aggregate(total=Sum('montant_total'))['total'] or 0
     
     # Nombre d'annonces créées
     annonces_count = Annonce.objects.filter(created_at__gte=start_date).count()
@@ -0,0 +1,177 @@
+# dashboard/services/vues.py
+
+import atexit
+import functools
+import heapq
+import logging
+import threading
+import time
+from collections import Counter, defaultdict, deque
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+from django.utils.module_loading import import_string
+from dashboard.models import Annonce
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryCompteur:
+    """
+    Tampon des vues d'annonces (écriture différée), en mémoire du processus.
+
+    `enregistrer` compte une vue sans toucher la base ; `vider` retire du
+    tampon les incréments accumulés {annonce_id: delta} pour les écrire en un
+    lot ; `restituer` les y remet si l'écriture échoue ; `a_vider` dit quand
+    écrire (intervalle écoulé ou trop d'annonces en attente). `tendances`
+    classe les annonces par vues reçues sur une fenêtre glissante. Une classe
+    réglée dans VUES_COMPTEUR doit offrir ces mêmes méthodes.
+
+    Les vues récentes sont rangées par tranches de `pas` secondes ; le total
+    de la fenêtre est tenu à jour à l'ajout et à l'expiration d'une tranche,
+    sans resommer les tranches à chaque lecture. Les tendances ne reflètent
+    que les vues servies par ce processus.
+    """
+
+    def __init__(self, intervalle=None, maximum=None, fenetre=None, pas=None):
+        self.intervalle = intervalle if intervalle is not None else settings.VUES_FLUSH_INTERVAL
+        self.maximum = maximum or settings.VUES_FLUSH_MAX
+        self.fenetre = fenetre or settings.VUES_TENDANCE_FENETRE
+        self.pas = pas or settings.VUES_TENDANCE_PAS
+        self._verrou = threading.Lock()
+        self._attente = Counter()
+        self._dernier_vidage = time.monotonic()
+        self._tranches = deque()  # (début, Counter)
+        self._recentes = Counter()
+
+    def _expirer(self, instant):
+        limite = instant - self.fenetre
+        while self._tranches and self._tranches[0][0] + self.pas <= limite:
+            _, compte = self._tranches.popleft()
+            self._recentes.subtract(compte)
+            for annonce_id in compte:
+                if self._recentes[annonce_id] <= 0:
+                    del self._recentes[annonce_id]
+
+    def enregistrer(self, annonce_id, instant=None):
+        instant = time.monotonic() if instant is None else instant
+        debut = instant - instant % self.pas
+        with self._verrou:
+            self._attente[annonce_id] += 1
+            if not self._tranches or self._tranches[-1][0] != debut:
+                self._tranches.append((debut, Counter()))
+            self._tranches[-1][1][annonce_id] += 1
+            self._recentes[annonce_id] += 1
+            self._expirer(instant)
+
+    def en_attente(self, annonce_id):
+        with self._verrou:
+            return self._attente[annonce_id]
+
+    def a_vider(self, instant=None):
+        instant = time.monotonic() if instant is None else instant
+        with self._verrou:
+            return bool(self._attente) and (
+                instant - self._dernier_vidage >= self.intervalle or len(self._attente) >= self.maximum
+            )
+
+    def vider(self, instant=None):
+        with self._verrou:
+            deltas, self._attente = dict(self._attente), Counter()
+            self._dernier_vidage = time.monotonic() if instant is None else instant
+        return deltas
+
+    def restituer(self, deltas):
+        with self._verrou:
+            self._attente.update(deltas)
+
+    def tendances(self, limite, fenetre=None, instant=None):
+        """[(annonce_id, vues)] les plus vues sur `fenetre` secondes (au plus celle du compteur)."""
+        instant = time.monotonic() if instant is None else instant
+        with self._verrou:
+            self._expirer(instant)
+            if fenetre is None or fenetre >= self.fenetre:
+                comptes = self._recentes
+            else:
+                comptes = Counter()
+                for debut, compte in self._tranches:
+                    if debut + self.pas > instant - fenetre:
+                        comptes.update(compte)
+            return heapq.nlargest(limite, comptes.items(), key=lambda item: (item[1], item[0]))
+
+
+@functools.lru_cache(maxsize=None)
+def get_compteur():
+    """Compteur configuré (VUES_COMPTEUR), unique par processus ; vidé à l'arrêt du processus."""
+    compteur = import_string(settings.VUES_COMPTEUR)()
+    atexit.register(ecrire_vues, compteur)
+    return compteur
+
+
+_ecriture = threading.Lock()
+
+
+def ecrire_vues(compteur=None, batch_size=500):
+    """
+    Ajoute en base les vues en attente : un UPDATE par lot de `batch_size`
+    annonces, les annonces étant regroupées par incrément
+    (vues = vues + CASE WHEN id IN (…) THEN 1 WHEN id IN (…) THEN 2 … END).
+    Sans effet si un autre thread écrit déjà. Retourne le nombre d'annonces mises à jour.
+    """
+    compteur = compteur or get_compteur()
+    if not _ecriture.acquire(blocking=False):
+        return 0
+    try:
+        deltas = compteur.vider()
+        ids = sorted(deltas)
+        total = 0
+        try:
+            with transaction.atomic():
+                for debut in range(0, len(ids), batch_size):
+                    par_delta = defaultdict(list)
+                    for annonce_id in ids[debut:debut + batch_size]:
+                        par_delta[deltas[annonce_id]].append(annonce_id)
+                    increment = Case(
+                        *(When(pk__in=lot, then=Value(delta)) for delta, lot in par_delta.items()),
+                        output_field=IntegerField(),
+                    )
+                    total += Annonce.objects.filter(pk__in=ids[debut:debut + batch_size]).update(
+                        vues=F('vues') + increment
+                    )
+        except Exception:
+            compteur.restituer(deltas)
+            logger.exception("Écriture de %s compteurs de vues échouée, remis en attente", len(deltas))
+            return 0
+        return total
+    finally:
+        _ecriture.release()
+
+
+def compter_vue(annonce):
+    """Compte une vue de l'annonce ; écrit le tampon quand il est dû."""
+    compteur = get_compteur()
+    compteur.enregistrer(annonce.pk)
+    if compteur.a_vider():
+        ecrire_vues(compteur)
+
+
+def vues_totales(annonce):
+    """Vues enregistrées en base plus celles encore en attente dans ce processus."""
+    return annonce.vues + get_compteur().en_attente(annonce.pk)
+
+
+def annonces_tendance(limite=20, fenetre=None):
+    """Annonces actives les plus vues sur la fenêtre glissante, avec `vues_recentes`."""
+    # Marge pour les annonces retirées entre-temps (terminées, supprimées)
+    classement = get_compteur().tendances(2 * limite + 10, fenetre)
+    annonces = Annonce.objects.filter(status='active').select_related('created_by').in_bulk(
+        [annonce_id for annonce_id, _ in classement]
+    )
+    resultat = []
+    for annonce_id, nombre in classement:
+        if annonce_id in annonces and len(resultat) < limite:
+            annonce = annonces[annonce_id]
+            annonce.vues_recentes = nombre
+            resultat.append(annonce)
+    return resultat
@@ -0,0 +1,89 @@
+# dashboard/services/wallet_service.py
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+from django.db.models.functions import Coalesce
+from dashboard.models import User, MouvementPortefeuille
+
+CENTIMES = Decimal('0.01')
+
+
+def _case_par_user(valeurs):
+    return Case(
+        *[When(pk=pk, then=Value(valeur)) for pk, valeur in valeurs],
+        output_field=DecimalField(max_digits=10, decimal_places=2)
+    )
+
+
+def crediter_paiements_en_masse(paiements, batch_size=1000):
+    """
+    Crédite les bénéficiaires d'une liste de paiements réussis déjà insérés.
+
+    Un UPDATE solde = solde + CASE par lot de bénéficiaires, puis les
+    mouvements du journal en bulk_create avec leur solde après mouvement.
+    À appeler dans une transaction.
+    """
+    credits = defaultdict(Decimal)
+    for paiement in paiements:
+        credits[paiement.beneficiaire_id] += paiement.montant
+    if not credits:
+        return []
+
+    beneficiaires = list(credits.items())
+    for i in range(0, len(beneficiaires), batch_size):
+        lot = beneficiaires[i:i + batch_size]
+        User.objects.filter(pk__in=[pk for pk, _ in lot]).update(
+            portefeuille_solde=F('portefeuille_solde') + _case_par_user(lot)
+        )
+
+    # Soldes intermédiaires reconstruits à partir du solde final
+    soldes = dict(User.objects.filter(pk__in=credits).values_list('pk', 'portefeuille_solde'))
+    courant = {pk: Decimal(soldes[pk]) - total for pk, total in credits.items()}
+    mouvements = []
+    for paiement in paiements:
+        courant[paiement.beneficiaire_id] += paiement.montant
+        mouvements.append(MouvementPortefeuille(
+            user_id=paiement.beneficiaire_id,
+            sens='credit',
+            motif='paiement',
+            montant=paiement.montant,
+            paiement=paiement,
+            solde_apres=courant[paiement.beneficiaire_id],
+            libelle=f"Paiement {paiement.reference}",
+        ))
+    return MouvementPortefeuille.objects.bulk_create(mouvements, batch_size=batch_size)
+
+
+def reconcile_wallets(fix=False, batch_size=1000):
+    """
+    Compare chaque solde de portefeuille au cumul de son journal.
+
+    Retourne la liste des écarts ; avec fix=True, le journal fait foi et les
+    soldes divergents sont réalignés (UPDATE par lots).
+    """
+    signe = Case(
+        When(mouvements_portefeuille__sens='credit', then=F('mouvements_portefeuille__montant')),
+        default=-F('mouvements_portefeuille__montant'),
+        output_field=DecimalField(max_digits=14, decimal_places=2)
+    )
+    users = User.objects.annotate(
+        journal=Coalesce(Sum(signe), Value(Decimal('0')), output_field=DecimalField(max_digits=14, decimal_places=2))
+    ).values_list('pk', 'username', 'portefeuille_solde', 'journal').order_by('pk')
+
+    ecarts = []
+    for pk, username, solde, journal in users.iterator(chunk_size=batch_size):
+        solde = Decimal(solde or 0).quantize(CENTIMES)
+        journal = Decimal(journal or 0).quantize(CENTIMES)
+        if solde != journal:
+            ecarts.append({'user': pk, 'username': username, 'solde': solde,
+                           'journal': journal, 'ecart': solde - journal})
+
+    if fix and ecarts:
+        with transaction.atomic():
+            for i in range(0, len(ecarts), batch_size):
+                lot = [(e['user'], e['journal']) for e in ecarts[i:i + batch_size]]
+                User.objects.filter(pk__in=[pk for pk, _ in lot]).update(portefeuille_solde=_case_par_user(lot))
+    return ecarts
@@ -0,0 +1,111 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from dashboard.models import (
+    User, Livreur, Commercant, Prestataire, Livraison, Paiement, Facture, TacheFacturePDF, Notification, Message,
+    Annonce, Service
+)
+from dashboard.services.events import evenement_livraison, evenement_message, evenement_notification, publier
+from dashboard.services.recherche_texte import INDEX_PAR_MODELE, indexer_objets, retirer_objets
+from dashboard.services.kpi_cache import (
+    invalidate_home_kpis_on_commit, SECTION_STATS, SECTION_LIVRAISONS, SECTION_PAIEMENTS
+)
+
+
+# Invalidation du cache des KPI de la page d'accueil (après validation de la transaction)
+@receiver(post_save, sender=Livraison)
+@receiver(post_delete, sender=Livraison)
+def invalider_kpi_livraison(sender, instance, **kwargs):
+    invalidate_home_kpis_on_commit(SECTION_STATS, SECTION_LIVRAISONS)
+
+
+@receiver(post_save, sender=Paiement)
+@receiver(post_delete, sender=Paiement)
+def invalider_kpi_paiement(sender, instance, **kwargs):
+    invalidate_home_kpis_on_commit(SECTION_STATS, SECTION_PAIEMENTS)
+
+
+@receiver(post_save, sender=Livreur)
+@receiver(post_save, sender=Commercant)
+@receiver(post_save, sender=Prestataire)
+def invalider_kpi_profil(sender, instance, created, **kwargs):
+    # Seul le nombre de profils est affiché : une modification ne change rien
+    if created:
+        invalidate_home_kpis_on_commit(SECTION_STATS)
+
+
+@receiver(post_delete, sender=Livreur)
+@receiver(post_delete, sender=Commercant)
+@receiver(post_delete, sender=Prestataire)
+def invalider_kpi_profil_supprime(sender, instance, **kwargs):
+    invalidate_home_kpis_on_commit(SECTION_STATS)
+
+
+@receiver(post_save, sender=User)
+def invalider_kpi_utilisateur(sender, instance, created, **kwargs):
+    # Le nombre de clients ne dépend que de la création et du type d'utilisateur
+    if created or (instance.etat_connu() and instance.valeur_initiale('user_type') != instance.user_type):
+        invalidate_home_kpis_on_commit(SECTION_STATS)
+
+
+@receiver(post_delete, sender=User)
+def invalider_kpi_utilisateur_supprime(sender, instance, **kwargs):
+    invalidate_home_kpis_on_commit(SECTION_STATS)
+
+
+# Génération des PDF de factures après validation de la transaction
+@receiver(post_save, sender=Facture)
+def planifier_pdf_facture(sender, instance, **kwargs):
+    if getattr(settings, 'FACTURE_PDF_ASYNC', True):
+        transaction.on_commit(lambda: TacheFacturePDF.planifier([instance.pk]))
+    else:
+        transaction.on_commit(instance.generer_pdf)
+
+
+# Compteur de notifications non lues : la suppression d'une non lue le décrémente
+@receiver(post_delete, sender=Notification)
+def decrementer_non_lues(sender, instance, **kwargs):
+    if not instance.lue:
+        Notification.ajuster_compteurs({instance.user_id: -1})
+
+
+# Flux temps réel : nouvelles notifications, changements de statut des livraisons, messages
+@receiver(post_save, sender=Notification)
+def publier_notification(sender, instance, created, **kwargs):
+    if created:
+        publier([instance.user_id], 'notification', evenement_notification(instance))
+
+
+@receiver(post_save, sender=Livraison)
+def publier_livraison(sender, instance, created, **kwargs):
+    # Livraison.save mémorise son état après post_save : valeur_initiale est l'ancien statut
+    ancien_status = instance.valeur_initiale('status')
+    if created or (instance.etat_connu() and ancien_status != instance.status):
+        publier(
+            [instance.client_id, instance.livreur_id], 'livraison',
+            evenement_livraison(instance, None if created else ancien_status)
+        )
+
+
+@receiver(post_save, sender=Message)
+def publier_message(sender, instance, created, **kwargs):
+    if created:
+        publier([instance.receiver_id, instance.sender_id], 'message', evenement_message(instance))
+
+
+# Index plein texte tenu à jour dans la même transaction que l'objet
+@receiver(post_save, sender=Annonce)
+@receiver(post_save, sender=Service)
+@receiver(post_save, sender=User)
+def indexer_recherche(sender, instance, update_fields=None, **kwargs):
+    if INDEX_PAR_MODELE[sender].concerne(update_fields):
+        indexer_objets([instance])
+
+
+@receiver(post_delete, sender=Annonce)
+@receiver(post_delete, sender=Service)
+@receiver(post_delete, sender=User)
+def retirer_recherche(sender, instance, **kwargs):
+    retirer_objets(sender, [instance.pk])
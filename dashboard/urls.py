@@ -10,6 +10,7 @@ urlpatterns = [
     path('commercants/', views.commercants, name='commercants'),
     path('commercant/<int:commercant_id>/', views.commercant_detail, name='commercant_detail'),
     path('clients/', views.clients, name='clients'),
+    path('clients/recherche/', views.recherche_clients, name='recherche_clients'),
     path('client/<int:client_id>/', views.client_detail, name='client_detail'),
     path('prestataires/', views.prestataires, name='prestataires'),
     path('prestataire/<int:prestataire_id>/', views.prestataire_detail, name='prestataire_detail'),
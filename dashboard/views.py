@@ -1,6 +1,6 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Sum, Avg
+from django.db.models import Count, Sum, Avg, Q
 from django.utils import timezone
 from django.contrib import messages
 from rest_framework.decorators import api_view, permission_classes
@@ -11,8 +11,12 @@ from dashboard.models import (
     User, Livreur, Commercant, Prestataire, Annonce, Livraison, 
     Paiement, Facture, Service, Entrepot, BoxStockage, Abonnement,
     Notification, Evaluation, PieceJustificative, Contrat, LogConnexion,
-    DemandeValidationLivreur
+    DemandeValidationLivreur, StatPaiementJour, StatLivraisonJour
 )
+from dashboard.services.stats_service import get_yearly_series, get_rollup_totals
+from dashboard.services.kpi_cache import get_home_kpis
+from dashboard.pagination import paginate_keyset
+from dashboard.services.recherche_texte import filtre as filtre_recherche
 
 # Fonction utilitaire pour obtenir le chiffre d'affaires mensuel
 def get_monthly_revenue(year=None, month=None):
@@ -34,38 +38,16 @@ def get_monthly_revenue(year=None, month=None):
 
 @login_required
 def home(request):
-    # Statistiques pour le tableau de bord
-    stats = {
-        'total_livreurs': Livreur.objects.count(),
-        'total_commercants': Commercant.objects.count(),
-        'total_clients': User.objects.filter(user_type='client').count(),
-        'total_prestataires': Prestataire.objects.count(),
-        'livraisons_en_cours': Livraison.objects.filter(status='en_cours').count(),
-        'paiements_aujourd_hui': Paiement.objects.filter(
-            date_paiement__date=timezone.now().date()
-        ).count(),
-        'chiffre_affaires_mois': Paiement.objects.filter(
-            status='reussi',
-            date_paiement__month=timezone.now().month,
-            date_paiement__year=timezone.now().year
-        ).aggregate(Sum('montant'))['montant__sum'] or 0,
-    }
-    
-    # Dernières livraisons
-    livraisons_recentes = Livraison.objects.all().order_by('-created_at')[:5]
-    
-    # Derniers paiements
-    paiements_recents = Paiement.objects.all().order_by('-date_paiement')[:5]
-    
-    # Notifications non lues
-    notifications_non_lues = Notification.objects.filter(lue=False).count()
+    # Statistiques, dernières livraisons et derniers paiements (cache invalidé par signaux)
+    kpis = get_home_kpis()
     
+    # Notifications non lues : compteur dénormalisé, sans requête
     return render(request, 'dashboard/home.html', {
         'active_menu': 'accueil',
-        'stats': stats,
-        'livraisons_recentes': livraisons_recentes,
-        'paiements_recents': paiements_recents,
-        'notifications_non_lues': notifications_non_lues
+        'stats': kpis['stats'],
+        'livraisons_recentes': kpis['livraisons_recentes'],
+        'paiements_recents': kpis['paiements_recents'],
+        'notifications_non_lues': request.user.notifications_non_lues
     })
 
 @login_required
@@ -80,9 +62,16 @@ def livreurs(request):
         'note_moyenne': livreurs_list.aggregate(Avg('rating'))['rating__avg'] or 0,
     }
     
+    page = paginate_keyset(request, livreurs_list, ordering=['-id'], filters={
+        'disponible': 'disponible',
+        'verified': 'verified',
+        'vehicle_type': 'vehicle_type',
+    })
+    
     return render(request, 'dashboard/livreurs.html', {
         'active_menu': 'livreurs', 
-        'livreurs': livreurs_list,
+        'livreurs': page,
+        'page': page,
         'stats': stats
     })
 
@@ -168,9 +157,14 @@ def clients(request):
         ).exclude(type_abonnement='free').count(),
     }
     
+    page = paginate_keyset(request, clients_list, ordering=['-id'], filters={
+        'actif': 'is_active',
+    })
+    
     return render(request, 'dashboard/clients.html', {
         'active_menu': 'clients',
-        'clients': clients_list,
+        'clients': page,
+        'page': page,
         'stats': stats
     })
 
@@ -242,7 +236,7 @@ def prestataire_detail(request, prestataire_id):
 
 @login_required
 def annonces(request):
-    annonces_list = Annonce.objects.all().order_by('-created_at')
+    annonces_list = Annonce.objects.select_related('created_by').order_by('-created_at')
     
     # Statistiques des annonces
     stats = {
@@ -252,9 +246,16 @@ def annonces(request):
         'annonces_terminees': annonces_list.filter(status='terminee').count(),
     }
     
+    page = paginate_keyset(request, annonces_list, ordering=['-created_at', '-id'], filters={
+        'status': 'status',
+        'type': 'type_annonce',
+        'urgente': 'est_urgente',
+    })
+    
     return render(request, 'dashboard/annonces.html', {
         'active_menu': 'annonces',
-        'annonces': annonces_list,
+        'annonces': page,
+        'page': page,
         'stats': stats
     })
 
@@ -338,20 +339,28 @@ def entrepot_detail(request, entrepot_id):
 
 @login_required
 def livraisons(request):
-    livraisons_list = Livraison.objects.all().order_by('-created_at')
+    livraisons_list = Livraison.objects.select_related('livreur', 'client').order_by('-created_at')
     
-    # Statistiques des livraisons
+    # Statistiques des livraisons (une requête sur les cumuls journaliers)
+    par_statut = get_rollup_totals(StatLivraisonJour, 'status')
     stats = {
-        'total_livraisons': livraisons_list.count(),
-        'livraisons_en_attente': livraisons_list.filter(status='en_attente').count(),
-        'livraisons_en_cours': livraisons_list.filter(status='en_cours').count(),
-        'livraisons_livrees': livraisons_list.filter(status='livree').count(),
-        'livraisons_annulees': livraisons_list.filter(status='annulee').count(),
+        'total_livraisons': sum(totaux['nombre'] for totaux in par_statut.values()),
+        'livraisons_en_attente': par_statut.get('en_attente', {}).get('nombre', 0),
+        'livraisons_en_cours': par_statut.get('en_cours', {}).get('nombre', 0),
+        'livraisons_livrees': par_statut.get('livree', {}).get('nombre', 0),
+        'livraisons_annulees': par_statut.get('annulee', {}).get('nombre', 0),
     }
     
+    page = paginate_keyset(request, livraisons_list, ordering=['-created_at', '-id'], filters={
+        'status': 'status',
+        'livreur': 'livreur_id',
+        'client': 'client_id',
+    })
+    
     return render(request, 'dashboard/livraisons.html', {
         'active_menu': 'livraisons',
-        'livraisons': livraisons_list,
+        'livraisons': page,
+        'page': page,
         'stats': stats
     })
 
@@ -368,36 +377,48 @@ def livraison_detail(request, livraison_id):
 
 @login_required
 def notifications(request):
-    # Récupérer toutes les notifications
-    notifs = Notification.objects.all().order_by('-date_creation')
+    # Notifications de l'utilisateur connecté
+    notifs = Notification.objects.filter(user=request.user).order_by('-date_creation')
+    
+    page = paginate_keyset(request, notifs, ordering=['-date_creation', '-id'], filters={
+        'lue': 'lue',
+        'type': 'type_notification',
+    })
     
-    # Marquer les notifications comme lues
-    notifications_non_lues = notifs.filter(lue=False)
-    for notif in notifications_non_lues:
-        notif.lue = True
-        notif.save()
+    # Marquer les notifications comme lues (un seul UPDATE, compteur ajusté)
+    Notification.marquer_lues(request.user)
     
     return render(request, 'dashboard/notifications.html', {
         'active_menu': 'notifications',
-        'notifications': notifs
+        'notifications': page,
+        'page': page
     })
 
 @login_required
 def paiements(request):
-    paiements_list = Paiement.objects.all().order_by('-date_paiement')
+    paiements_list = Paiement.objects.select_related('payeur', 'beneficiaire').order_by('-date_paiement')
     
-    # Calcul des statistiques de paiements
+    # Calcul des statistiques de paiements (une requête sur les cumuls journaliers)
+    par_statut = get_rollup_totals(StatPaiementJour, 'status')
     stats = {
-        'total_paiements': paiements_list.count(),
-        'paiements_reussis': paiements_list.filter(status='reussi').count(),
-        'paiements_en_attente': paiements_list.filter(status='en_attente').count(),
-        'paiements_echoues': paiements_list.filter(status='echoue').count(),
-        'montant_total': paiements_list.filter(status='reussi').aggregate(Sum('montant'))['montant__sum'] or 0,
+        'total_paiements': sum(totaux['nombre'] for totaux in par_statut.values()),
+        'paiements_reussis': par_statut.get('reussi', {}).get('nombre', 0),
+        'paiements_en_attente': par_statut.get('en_attente', {}).get('nombre', 0),
+        'paiements_echoues': par_statut.get('echoue', {}).get('nombre', 0),
+        'montant_total': par_statut.get('reussi', {}).get('montant_total', 0),
     }
     
+    page = paginate_keyset(request, paiements_list, ordering=['-date_paiement', '-id'], filters={
+        'status': 'status',
+        'mode': 'mode_paiement',
+        'payeur': 'payeur_id',
+        'beneficiaire': 'beneficiaire_id',
+    })
+    
     return render(request, 'dashboard/paiements.html', {
         'active_menu': 'paiements',
-        'paiements': paiements_list,
+        'paiements': page,
+        'page': page,
         'stats': stats
     })
 
@@ -414,19 +435,25 @@ def paiement_detail(request, paiement_id):
 
 @login_required
 def facturation(request):
-    factures = Facture.objects.all().order_by('-date_emission')
+    factures = Facture.objects.select_related('paiement__payeur').order_by('-date_emission')
+    
+    # Statistiques des factures (un seul parcours de la table)
+    stats = factures.aggregate(
+        total_factures=Count('id'),
+        montant_total=Sum('montant_total'),
+        factures_payees=Count('id', filter=Q(status_paiement='reussi')),
+        factures_en_attente=Count('id', filter=Q(status_paiement='en_attente')),
+    )
+    stats['montant_total'] = stats['montant_total'] or 0
     
-    # Statistiques des factures
-    stats = {
-        'total_factures': factures.count(),
-        'montant_total': factures.aggregate(Sum('montant_total'))['montant_total__sum'] or 0,
-        'factures_payees': factures.filter(status_paiement='reussi').count(),
-        'factures_en_attente': factures.filter(status_paiement='en_attente').count(),
-    }
+    page = paginate_keyset(request, factures, ordering=['-date_emission', '-id'], filters={
+        'status': 'status_paiement',
+    })
     
     return render(request, 'dashboard/facturation.html', {
         'active_menu': 'facturation',
-        'factures': factures,
+        'factures': page,
+        'page': page,
         'stats': stats
     })
 
@@ -444,9 +471,15 @@ def abonnements(request):
         'revenus_mensuels': abonnements_list.filter(actif=True).exclude(type_abonnement='free').aggregate(Sum('prix_mensuel'))['prix_mensuel__sum'] or 0,
     }
     
+    page = paginate_keyset(request, abonnements_list.select_related('user'), ordering=['-date_debut', '-id'], filters={
+        'type': 'type_abonnement',
+        'actif': 'actif',
+    })
+    
     return render(request, 'dashboard/abonnements.html', {
         'active_menu': 'abonnements',
-        'abonnements': abonnements_list,
+        'abonnements': page,
+        'page': page,
         'stats': stats
     })
 
@@ -463,9 +496,14 @@ def contrats(request):
         'contrats_resilies': contrats_list.filter(status='resilie').count(),
     }
     
+    page = paginate_keyset(request, contrats_list.select_related('user'), ordering=['-date_debut', '-id'], filters={
+        'status': 'status',
+    })
+    
     return render(request, 'dashboard/contrats.html', {
         'active_menu': 'contrats',
-        'contrats': contrats_list,
+        'contrats': page,
+        'page': page,
         'stats': stats
     })
 
@@ -481,32 +519,26 @@ def statistiques(request):
         'total_annonces': Annonce.objects.count(),
         'total_livraisons': Livraison.objects.count(),
         'total_services': Service.objects.count(),
-        'total_paiements': Paiement.objects.filter(status='reussi').count(),
-        'montant_total': Paiement.objects.filter(status='reussi').aggregate(Sum('montant'))['montant__sum'] or 0,
     }
     
+    # Totaux des paiements réussis lus depuis les cumuls journaliers
+    paiements_reussis = get_rollup_totals(StatPaiementJour, 'status', status='reussi').get('reussi', {})
+    stats['total_paiements'] = paiements_reussis.get('nombre', 0)
+    stats['montant_total'] = paiements_reussis.get('montant_total', 0)
+    
     # Statistiques par mois (pour les graphiques)
     mois_actuel = timezone.now().month
     annee_actuelle = timezone.now().year
     
-    # Données pour le graphique des revenus par mois
-    revenus_mensuels = []
-    for mois in range(1, 13):
-        montant = Paiement.objects.filter(
-            status='reussi',
-            date_paiement__month=mois,
-            date_paiement__year=annee_actuelle
-        ).aggregate(Sum('montant'))['montant__sum'] or 0
-        revenus_mensuels.append(montant)
+    # Données pour le graphique des revenus par mois (une seule requête groupée)
+    revenus_mensuels = [
+        point['valeur'] for point in get_yearly_series('revenue', annee_actuelle)
+    ]
     
     # Données pour le graphique des nouvelles inscriptions par mois
-    inscriptions_mensuelles = []
-    for mois in range(1, 13):
-        count = User.objects.filter(
-            date_joined__month=mois,
-            date_joined__year=annee_actuelle
-        ).count()
-        inscriptions_mensuelles.append(count)
+    inscriptions_mensuelles = [
+        point['valeur'] for point in get_yearly_series('inscriptions', annee_actuelle)
+    ]
     
     return render(request, 'dashboard/statistiques.html', {
         'active_menu': 'statistiques',
@@ -531,11 +563,18 @@ def support(request):
 
 @login_required
 def logs(request):
-    logs_list = LogConnexion.objects.all().order_by('-date_connexion')
+    logs_list = LogConnexion.objects.select_related('user').order_by('-date_connexion')
+    
+    page = paginate_keyset(request, logs_list, ordering=['-date_connexion', '-id'], filters={
+        'reussi': 'reussi',
+        'user': 'user_id',
+        'ip': 'adresse_ip',
+    })
     
     return render(request, 'dashboard/logs.html', {
         'active_menu': 'logs',
-        'logs': logs_list
+        'logs': page,
+        'page': page
     })
 
 # Endpoint API pour obtenir le chiffre d'affaires mensuel
@@ -845,13 +884,9 @@ def recherche_clients(request):
     # Démarrer avec tous les clients
     clients_query = User.objects.filter(user_type='client')
     
-    # Appliquer les filtres si fournis
+    # Appliquer les filtres si fournis (nom, prénom, identifiant, email ou téléphone, via l'index plein texte)
     if nom:
-        clients_query = clients_query.filter(
-            Q(first_name__icontains=nom) | 
-            Q(last_name__icontains=nom) | 
-            Q(email__icontains=nom)
-        )
+        clients_query = clients_query.filter(filtre_recherche('user', nom))
     
     if statut == 'actif':
         clients_query = clients_query.filter(is_active=True)
@@ -869,9 +904,12 @@ def recherche_clients(request):
         ).exclude(type_abonnement='free').count(),
     }
     
+    page = paginate_keyset(request, clients_query, ordering=['-id'])
+    
     return render(request, 'dashboard/clients.html', {
         'active_menu': 'clients',
-        'clients': clients_query,
+        'clients': page,
+        'page': page,
         'stats': stats,
         'search_params': {
             'nom': nom,